@@ -0,0 +1,80 @@
+"""catalogo de ejercicios
+
+Revision ID: a1c3e5f7b9d2
+Revises: 7833655356e2
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+import re
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c3e5f7b9d2'
+down_revision: Union[str, None] = '7833655356e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _slug(nombre: str) -> str:
+    # Igual que app.catalogo.slug_ejercicio (copiado: las migraciones no importan código de la app)
+    s = unicodedata.normalize("NFKD", nombre or "")
+    s = " ".join("".join(c for c in s if not unicodedata.combining(c)).lower().split())
+    s = re.sub(r"[^\w\s-]", "", s, flags=re.UNICODE).strip()
+    return re.sub(r"[-\s]+", "_", s)[:160]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('exercises', sa.Column('slug', sa.String(length=160), nullable=True))
+    op.add_column('exercises', sa.Column('grupo_muscular', sa.String(length=60), nullable=True))
+    op.add_column('exercises', sa.Column('equipo', sa.String(length=120), nullable=True))
+    op.add_column('exercises', sa.Column('imagen_url', sa.Text(), nullable=True))
+    op.add_column('exercises', sa.Column('creado_en', sa.DateTime(timezone=True),
+                                         server_default=sa.text('now()'), nullable=False))
+
+    conn = op.get_bind()
+    filas = conn.execute(sa.text("SELECT id, name FROM exercises ORDER BY id")).fetchall()
+    vistos = set()
+    for id_, nombre in filas:
+        slug = _slug(nombre)
+        if not slug or slug in vistos:  # duplicados tras normalizar: se quedan sin slug (se resuelven al primero)
+            continue
+        vistos.add(slug)
+        conn.execute(sa.text("UPDATE exercises SET slug = :s WHERE id = :i"), {"s": slug, "i": id_})
+    op.create_index(op.f('ix_exercises_slug'), 'exercises', ['slug'], unique=True)
+
+    if not sa.inspect(conn).has_table('exercise_aliases'):
+        op.create_table('exercise_aliases',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('exercise_id', sa.Integer(), nullable=False),
+        sa.Column('alias', sa.String(length=200), nullable=False),
+        sa.Column('alias_slug', sa.String(length=160), nullable=False),
+        sa.ForeignKeyConstraint(['exercise_id'], ['exercises.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_exercise_aliases_exercise_id'), 'exercise_aliases', ['exercise_id'], unique=False)
+        op.create_index(op.f('ix_exercise_aliases_alias_slug'), 'exercise_aliases', ['alias_slug'], unique=True)
+    # el propio nombre canónico también es un alias: la resolución es un único lookup por alias_slug
+    op.execute(
+        "INSERT INTO exercise_aliases (exercise_id, alias, alias_slug) "
+        "SELECT id, name, slug FROM exercises WHERE slug IS NOT NULL "
+        "ON CONFLICT (alias_slug) DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_exercise_aliases_alias_slug'), table_name='exercise_aliases')
+    op.drop_index(op.f('ix_exercise_aliases_exercise_id'), table_name='exercise_aliases')
+    op.drop_table('exercise_aliases')
+    op.drop_index(op.f('ix_exercises_slug'), table_name='exercises')
+    op.drop_column('exercises', 'creado_en')
+    op.drop_column('exercises', 'imagen_url')
+    op.drop_column('exercises', 'equipo')
+    op.drop_column('exercises', 'grupo_muscular')
+    op.drop_column('exercises', 'slug')
@@ -0,0 +1,53 @@
+"""cola de trabajos ia
+
+Revision ID: a7c9e1b3d5f6
+Revises: f6b8d0a2c4e5
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c9e1b3d5f6'
+down_revision: Union[str, None] = 'f6b8d0a2c4e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_all del arranque puede haberla creado ya
+    if sa.inspect(op.get_bind()).has_table('trabajos_ia'):
+        return
+    op.create_table('trabajos_ia',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=20), nullable=False),
+    sa.Column('estado', sa.String(length=20), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('resultado', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('progreso', sa.Integer(), nullable=False),
+    sa.Column('fase', sa.String(length=100), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('intentos', sa.Integer(), nullable=False),
+    sa.Column('creado_en', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('iniciado_en', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('actualizado_en', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('terminado_en', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_trabajos_ia_usuario_id'), 'trabajos_ia', ['usuario_id'], unique=False)
+    op.create_index(op.f('ix_trabajos_ia_estado'), 'trabajos_ia', ['estado'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_trabajos_ia_estado'), table_name='trabajos_ia')
+    op.drop_index(op.f('ix_trabajos_ia_usuario_id'), table_name='trabajos_ia')
+    op.drop_table('trabajos_ia')
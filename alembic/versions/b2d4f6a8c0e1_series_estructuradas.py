@@ -0,0 +1,188 @@
+"""series estructuradas
+
+Revision ID: b2d4f6a8c0e1
+Revises: a1c3e5f7b9d2
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+import json
+import re
+import unicodedata
+from datetime import timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d4f6a8c0e1'
+down_revision: Union[str, None] = 'a1c3e5f7b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LOTE = 500
+
+
+def _slug(nombre: str) -> str:
+    # Igual que app.catalogo.slug_ejercicio (copiado: las migraciones no importan código de la app)
+    s = unicodedata.normalize("NFKD", nombre or "")
+    s = " ".join("".join(c for c in s if not unicodedata.combining(c)).lower().split())
+    s = re.sub(r"[^\w\s-]", "", s, flags=re.UNICODE).strip()
+    return re.sub(r"[-\s]+", "_", s)[:160]
+
+
+def _num(valor, tipo=float):
+    try:
+        return tipo(valor) if valor not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _rir(serie: dict) -> int:
+    rir = _num(serie.get("rir"), int)
+    if rir is not None:
+        return max(0, rir)
+    rpe = _num(serie.get("rpe"))
+    return max(0, round(10 - rpe)) if rpe else 2
+
+
+def _series(detalle: dict) -> list:
+    # Igual que app.series.extraer_series
+    salida, con_series = [], set()
+    for ej in (detalle.get("exercises") or []) + (detalle.get("ejercicios_realizados") or []):
+        nombre = (ej.get("nombre") or "").strip()
+        lista = ej.get("sets") or ej.get("series")
+        for s in lista if isinstance(lista, list) else []:
+            if not isinstance(s, dict):
+                continue
+            peso, reps = _num(s.get("peso")), _num(s.get("repes") or s.get("reps"), int)
+            if nombre and peso and reps:
+                salida.append((nombre, peso, reps, _rir(s)))
+                con_series.add(_slug(nombre))
+    for ej in (detalle.get("items") or []) + (detalle.get("ejercicios") or []):
+        if not isinstance(ej, dict):
+            continue
+        nombre = (ej.get("nombre") or "").strip()
+        if not nombre or _slug(nombre) in con_series:
+            continue
+        peso, reps = _num(ej.get("peso")), _num(ej.get("repes") or ej.get("reps"), int)
+        if not (peso and reps):
+            continue
+        n = max(1, min(_num(ej.get("series"), int) or 1, 20))
+        salida.extend((nombre, peso, reps, _rir(ej)) for _ in range(n))
+    return salida
+
+
+def _utc_naive(fecha):
+    # workout_sets.created_at es timestamp sin zona, en UTC
+    if fecha is None or getattr(fecha, "tzinfo", None) is None:
+        return fecha
+    return fecha.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _resolver(conn, ids: dict, nombres: dict) -> None:
+    """Completa ids {slug: exercise_id} dando de alta los ejercicios/alias que falten."""
+    faltan = [s for s in nombres if s not in ids]
+    if not faltan:
+        return
+    for slug, id_ in conn.execute(
+        sa.text("SELECT alias_slug, exercise_id FROM exercise_aliases WHERE alias_slug = ANY(:s)"), {"s": faltan}
+    ):
+        ids[slug] = id_
+    for slug in [s for s in faltan if s not in ids]:
+        nombre = nombres[slug][:120]
+        conn.execute(sa.text(
+            "INSERT INTO exercises (name, slug) VALUES (:n, :s) ON CONFLICT DO NOTHING"
+        ), {"n": nombre, "s": slug})
+        id_ = conn.execute(sa.text(
+            "SELECT id FROM exercises WHERE slug = :s OR name = :n ORDER BY (slug = :s) DESC LIMIT 1"
+        ), {"s": slug, "n": nombre}).scalar()
+        conn.execute(sa.text(
+            "INSERT INTO exercise_aliases (exercise_id, alias, alias_slug) VALUES (:i, :n, :s) ON CONFLICT DO NOTHING"
+        ), {"i": id_, "n": nombre, "s": slug})
+        ids[slug] = id_
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    if not sa.inspect(conn).has_table('workout_sets'):
+        op.create_table('workout_sets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('exercise_id', sa.Integer(), nullable=False),
+        sa.Column('weight', sa.Float(), nullable=False),
+        sa.Column('reps', sa.Integer(), nullable=False),
+        sa.Column('rir', sa.Integer(), nullable=False),
+        sa.Column('rest_sec', sa.Integer(), nullable=False),
+        sa.Column('bodyweight', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['exercise_id'], ['exercises.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_workout_sets_user_id'), 'workout_sets', ['user_id'], unique=False)
+        op.create_index(op.f('ix_workout_sets_exercise_id'), 'workout_sets', ['exercise_id'], unique=False)
+    # create_all del arranque puede haber creado ya la tabla con el modelo nuevo: cada objeto se comprueba
+    insp = sa.inspect(conn)
+    columnas = {c['name'] for c in insp.get_columns('workout_sets')}
+    indices = {i['name'] for i in insp.get_indexes('workout_sets')}
+    if 'progreso_id' not in columnas:
+        op.add_column('workout_sets', sa.Column('progreso_id', sa.Integer(), nullable=True))
+    if 'rutina_id' not in columnas:
+        op.add_column('workout_sets', sa.Column('rutina_id', sa.Integer(), nullable=True))
+    if not any(fk['constrained_columns'] == ['progreso_id'] for fk in insp.get_foreign_keys('workout_sets')):
+        op.create_foreign_key('workout_sets_progreso_id_fkey', 'workout_sets', 'progreso', ['progreso_id'], ['id'],
+                              ondelete='CASCADE')
+    if 'ix_workout_sets_progreso_id' not in indices:
+        op.create_index(op.f('ix_workout_sets_progreso_id'), 'workout_sets', ['progreso_id'], unique=False)
+    if 'ix_workout_sets_usuario_ejercicio_fecha' not in indices:
+        op.create_index('ix_workout_sets_usuario_ejercicio_fecha', 'workout_sets',
+                        ['user_id', 'exercise_id', 'created_at'], unique=False)
+
+    # Backfill: una fila por serie de cada Progreso histórico (por lotes, en orden de id); los que
+    # la app ya volcó a workout_sets (tabla creada por create_all) se saltan
+    ids: dict = {}
+    ultimo = 0
+    while True:
+        filas = conn.execute(sa.text(
+            "SELECT id, usuario_id, plan_id, fecha, progreso_detallado FROM progreso p "
+            "WHERE id > :u AND NOT EXISTS (SELECT 1 FROM workout_sets w WHERE w.progreso_id = p.id) "
+            "ORDER BY id LIMIT :n"
+        ), {"u": ultimo, "n": LOTE}).fetchall()
+        if not filas:
+            break
+        ultimo = filas[-1][0]
+        por_progreso = []
+        for id_, usuario_id, plan_id, fecha, texto in filas:
+            try:
+                detalle = json.loads(texto or "{}")
+            except (TypeError, ValueError):
+                continue
+            if isinstance(detalle, dict):
+                por_progreso.append((id_, usuario_id, plan_id, fecha, _series(detalle)))
+        nombres = {_slug(s[0]): s[0] for *_, series in por_progreso for s in series if _slug(s[0])}
+        _resolver(conn, ids, nombres)
+        nuevas = [
+            {"u": usuario_id, "e": ids[_slug(nombre)], "w": peso, "r": reps, "rir": rir,
+             "f": _utc_naive(fecha),
+             "p": id_, "rut": plan_id}
+            for id_, usuario_id, plan_id, fecha, series in por_progreso
+            for nombre, peso, reps, rir in series
+            if _slug(nombre) in ids
+        ]
+        if nuevas:
+            conn.execute(sa.text(
+                "INSERT INTO workout_sets (user_id, exercise_id, weight, reps, rir, rest_sec, created_at, progreso_id, rutina_id) "
+                "VALUES (:u, :e, :w, :r, :rir, 120, COALESCE(:f, now() AT TIME ZONE 'utc'), :p, :rut)"
+            ), nuevas)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM workout_sets WHERE progreso_id IS NOT NULL")
+    op.drop_index('ix_workout_sets_usuario_ejercicio_fecha', table_name='workout_sets')
+    op.drop_index(op.f('ix_workout_sets_progreso_id'), table_name='workout_sets')
+    op.drop_constraint('workout_sets_progreso_id_fkey', 'workout_sets', type_='foreignkey')
+    op.drop_column('workout_sets', 'rutina_id')
+    op.drop_column('workout_sets', 'progreso_id')
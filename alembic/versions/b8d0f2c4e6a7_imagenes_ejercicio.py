@@ -0,0 +1,43 @@
+"""registro de imagenes de ejercicios
+
+Revision ID: b8d0f2c4e6a7
+Revises: a7c9e1b3d5f6
+Create Date: 2026-10-18 10:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d0f2c4e6a7'
+down_revision: Union[str, None] = 'a7c9e1b3d5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_all del arranque puede haberla creado ya
+    if sa.inspect(op.get_bind()).has_table('imagenes_ejercicio'):
+        return
+    op.create_table('imagenes_ejercicio',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('clave', sa.String(length=200), nullable=False),
+    sa.Column('slug', sa.String(length=150), nullable=False),
+    sa.Column('estilo', sa.String(length=40), nullable=False),
+    sa.Column('imagen_url', sa.Text(), nullable=False),
+    sa.Column('usos', sa.Integer(), nullable=False),
+    sa.Column('creado_en', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('ultimo_uso', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_imagenes_ejercicio_clave'), 'imagenes_ejercicio', ['clave'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_imagenes_ejercicio_clave'), table_name='imagenes_ejercicio')
+    op.drop_table('imagenes_ejercicio')
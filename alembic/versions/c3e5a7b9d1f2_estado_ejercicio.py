@@ -0,0 +1,75 @@
+"""estado por usuario y ejercicio
+
+Revision ID: c3e5a7b9d1f2
+Revises: b2d4f6a8c0e1
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e5a7b9d1f2'
+down_revision: Union[str, None] = 'b2d4f6a8c0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    if not sa.inspect(conn).has_table('exercise_state'):
+        op.create_table('exercise_state',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('exercise_id', sa.Integer(), nullable=False),
+        sa.Column('ultimas_series', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('e1rm', sa.Float(), nullable=True),
+        sa.Column('ultimas_reps', sa.Integer(), nullable=True),
+        sa.Column('ultimo_rir', sa.Integer(), nullable=True),
+        sa.Column('mejor_peso', sa.Float(), nullable=True),
+        sa.Column('mejor_reps', sa.Integer(), nullable=True),
+        sa.Column('mejor_e1rm', sa.Float(), nullable=True),
+        sa.Column('sesiones', sa.Integer(), nullable=False),
+        sa.Column('ultima_fecha', sa.DateTime(), nullable=True),
+        sa.Column('actualizado_en', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['exercise_id'], ['exercises.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'exercise_id')
+        )
+
+    # Backfill desde workout_sets (misma definición que app.series: 3 series más recientes,
+    # e1RM Epley medio de esas 3, mejor serie por e1RM y sesiones = días (UTC) con series)
+    op.execute("""
+        INSERT INTO exercise_state (user_id, exercise_id, ultimas_series, e1rm, ultimas_reps, ultimo_rir,
+                                    mejor_peso, mejor_reps, mejor_e1rm, sesiones, ultima_fecha)
+        SELECT r.user_id, r.exercise_id,
+               jsonb_agg(jsonb_build_object(
+                   'weight', r.weight, 'reps', r.reps, 'rir', COALESCE(r.rir, 2),
+                   'fecha', to_char(r.created_at, 'YYYY-MM-DD"T"HH24:MI:SS')
+               ) ORDER BY r.n) FILTER (WHERE r.n <= 3),
+               round(avg(r.e1rm) FILTER (WHERE r.n <= 3)::numeric, 2),
+               max(r.reps) FILTER (WHERE r.n = 1),
+               max(COALESCE(r.rir, 2)) FILTER (WHERE r.n = 1),
+               (array_agg(r.weight ORDER BY r.e1rm DESC))[1],
+               (array_agg(r.reps ORDER BY r.e1rm DESC))[1],
+               round(max(r.e1rm)::numeric, 2),
+               count(DISTINCT r.created_at::date),
+               max(r.created_at)
+        FROM (
+            SELECT user_id, exercise_id, weight, reps, rir, created_at,
+                   weight * (1 + reps / 30.0) AS e1rm,
+                   row_number() OVER (PARTITION BY user_id, exercise_id ORDER BY created_at DESC, id DESC) AS n
+            FROM workout_sets
+            WHERE weight > 0 AND reps > 0
+        ) r
+        GROUP BY r.user_id, r.exercise_id
+        ON CONFLICT (user_id, exercise_id) DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('exercise_state')
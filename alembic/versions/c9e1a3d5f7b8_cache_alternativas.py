@@ -0,0 +1,46 @@
+"""cache de alternativas de ejercicio
+
+Revision ID: c9e1a3d5f7b8
+Revises: b8d0f2c4e6a7
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e1a3d5f7b8'
+down_revision: Union[str, None] = 'b8d0f2c4e6a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_all del arranque puede haberla creado ya
+    if sa.inspect(op.get_bind()).has_table('cache_alternativas'):
+        return
+    op.create_table('cache_alternativas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('clave', sa.String(length=400), nullable=False),
+    sa.Column('ejercicio', sa.String(length=200), nullable=False),
+    sa.Column('grupo_muscular', sa.String(length=100), nullable=False),
+    sa.Column('criterio', sa.String(length=60), nullable=False),
+    sa.Column('alternativas', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('creado_en', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('expira_en', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_cache_alternativas_clave'), 'cache_alternativas', ['clave'], unique=True)
+    op.create_index(op.f('ix_cache_alternativas_expira_en'), 'cache_alternativas', ['expira_en'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_cache_alternativas_expira_en'), table_name='cache_alternativas')
+    op.drop_index(op.f('ix_cache_alternativas_clave'), table_name='cache_alternativas')
+    op.drop_table('cache_alternativas')
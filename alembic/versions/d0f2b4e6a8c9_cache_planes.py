@@ -0,0 +1,48 @@
+"""cache de planes ia por huella de formulario
+
+Revision ID: d0f2b4e6a8c9
+Revises: c9e1a3d5f7b8
+Create Date: 2026-10-18 10:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0f2b4e6a8c9'
+down_revision: Union[str, None] = 'c9e1a3d5f7b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_all del arranque puede haberla creado ya
+    if sa.inspect(op.get_bind()).has_table('cache_planes'):
+        return
+    op.create_table('cache_planes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('huella', sa.String(length=64), nullable=False),
+    sa.Column('campos', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('base_json', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('aciertos', sa.Integer(), nullable=False),
+    sa.Column('usos_version', sa.Integer(), nullable=False),
+    sa.Column('generaciones', sa.Integer(), nullable=False),
+    sa.Column('creado_en', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('ultimo_uso', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('expira_en', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_cache_planes_huella'), 'cache_planes', ['huella'], unique=True)
+    op.create_index(op.f('ix_cache_planes_expira_en'), 'cache_planes', ['expira_en'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_cache_planes_expira_en'), table_name='cache_planes')
+    op.drop_index(op.f('ix_cache_planes_huella'), table_name='cache_planes')
+    op.drop_table('cache_planes')
@@ -0,0 +1,32 @@
+"""id en el índice del histórico de series (paginación por clave)
+
+Revision ID: d4f6a8c0e2b3
+Revises: c3e5a7b9d1f2
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f6a8c0e2b3'
+down_revision: Union[str, None] = 'c3e5a7b9d1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # (created_at, id) < cursor se resuelve dentro del índice, también entre series con el mismo created_at
+    op.drop_index('ix_workout_sets_usuario_ejercicio_fecha', table_name='workout_sets')
+    op.create_index('ix_workout_sets_usuario_ejercicio_fecha', 'workout_sets',
+                    ['user_id', 'exercise_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_workout_sets_usuario_ejercicio_fecha', table_name='workout_sets')
+    op.create_index('ix_workout_sets_usuario_ejercicio_fecha', 'workout_sets',
+                    ['user_id', 'exercise_id', 'created_at'], unique=False)
@@ -0,0 +1,56 @@
+"""registro de llamadas ia
+
+Revision ID: e1a3c5f7b9d0
+Revises: d0f2b4e6a8c9
+Create Date: 2026-10-18 10:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1a3c5f7b9d0'
+down_revision: Union[str, None] = 'd0f2b4e6a8c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_all del arranque puede haberla creado ya
+    if sa.inspect(op.get_bind()).has_table('ai_calls'):
+        return
+    op.create_table('ai_calls',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('creado_en', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('etiqueta', sa.String(length=60), nullable=False),
+    sa.Column('origen', sa.String(length=120), nullable=True),
+    sa.Column('modelo', sa.String(length=60), nullable=False),
+    sa.Column('tipo', sa.String(length=10), nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=True),
+    sa.Column('gimnasio_id', sa.Integer(), nullable=True),
+    sa.Column('tokens_entrada', sa.Integer(), nullable=True),
+    sa.Column('tokens_salida', sa.Integer(), nullable=True),
+    sa.Column('latencia_ms', sa.Integer(), nullable=False),
+    sa.Column('reintentos', sa.Integer(), nullable=False),
+    sa.Column('ok', sa.Boolean(), nullable=False),
+    sa.Column('error', sa.String(length=200), nullable=True),
+    sa.Column('coste_usd', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ai_calls_creado_en'), 'ai_calls', ['creado_en'], unique=False)
+    op.create_index(op.f('ix_ai_calls_etiqueta'), 'ai_calls', ['etiqueta'], unique=False)
+    op.create_index(op.f('ix_ai_calls_usuario_id'), 'ai_calls', ['usuario_id'], unique=False)
+    op.create_index(op.f('ix_ai_calls_gimnasio_id'), 'ai_calls', ['gimnasio_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ai_calls_gimnasio_id'), table_name='ai_calls')
+    op.drop_index(op.f('ix_ai_calls_usuario_id'), table_name='ai_calls')
+    op.drop_index(op.f('ix_ai_calls_etiqueta'), table_name='ai_calls')
+    op.drop_index(op.f('ix_ai_calls_creado_en'), table_name='ai_calls')
+    op.drop_table('ai_calls')
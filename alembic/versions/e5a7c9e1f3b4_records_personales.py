@@ -0,0 +1,82 @@
+"""récords personales por usuario, ejercicio y tipo
+
+Revision ID: e5a7c9e1f3b4
+Revises: d4f6a8c0e2b3
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9e1f3b4'
+down_revision: Union[str, None] = 'd4f6a8c0e2b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    if not sa.inspect(conn).has_table('records_personales'):
+        op.create_table('records_personales',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('exercise_id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=20), nullable=False),
+        sa.Column('peso_ref', sa.Float(), nullable=False),
+        sa.Column('valor', sa.Float(), nullable=False),
+        sa.Column('anterior', sa.Float(), nullable=True),
+        sa.Column('peso', sa.Float(), nullable=True),
+        sa.Column('reps', sa.Integer(), nullable=True),
+        sa.Column('workout_set_id', sa.Integer(), nullable=True),
+        sa.Column('fecha', sa.DateTime(), nullable=False),
+        sa.Column('actualizado_en', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['exercise_id'], ['exercises.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'exercise_id', 'tipo', 'peso_ref')
+        )
+        op.create_index('ix_records_personales_usuario_actualizado', 'records_personales',
+                        ['user_id', 'actualizado_en'], unique=False)
+
+    # Backfill desde workout_sets (misma definición que app.records); sin marca anterior ni avisos
+    op.execute("""
+        INSERT INTO records_personales (user_id, exercise_id, tipo, peso_ref, valor, peso, reps, workout_set_id, fecha)
+        SELECT DISTINCT ON (user_id, exercise_id)
+               user_id, exercise_id, 'e1rm', 0, round((weight * (1 + reps / 30.0))::numeric, 2),
+               weight, reps, id, created_at
+        FROM workout_sets
+        WHERE weight > 0 AND reps > 0
+        ORDER BY user_id, exercise_id, weight * (1 + reps / 30.0) DESC, created_at, id
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("""
+        INSERT INTO records_personales (user_id, exercise_id, tipo, peso_ref, valor, peso, reps, workout_set_id, fecha)
+        SELECT DISTINCT ON (user_id, exercise_id, round(weight::numeric, 2))
+               user_id, exercise_id, 'reps', round(weight::numeric, 2), reps, weight, reps, id, created_at
+        FROM workout_sets
+        WHERE weight > 0 AND reps > 0
+        ORDER BY user_id, exercise_id, round(weight::numeric, 2), reps DESC, created_at, id
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("""
+        INSERT INTO records_personales (user_id, exercise_id, tipo, peso_ref, valor, fecha)
+        SELECT DISTINCT ON (user_id, exercise_id)
+               user_id, exercise_id, 'volumen', 0, round(volumen::numeric, 2), ultima
+        FROM (
+            SELECT user_id, exercise_id, created_at::date AS dia,
+                   sum(weight * reps) AS volumen, max(created_at) AS ultima
+            FROM workout_sets
+            WHERE weight > 0 AND reps > 0
+            GROUP BY user_id, exercise_id, created_at::date
+        ) d
+        ORDER BY user_id, exercise_id, volumen DESC, dia
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_records_personales_usuario_actualizado', table_name='records_personales')
+    op.drop_table('records_personales')
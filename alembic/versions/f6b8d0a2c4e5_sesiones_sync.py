@@ -0,0 +1,67 @@
+"""sesiones sincronizadas offline y su log de eventos
+
+Revision ID: f6b8d0a2c4e5
+Revises: e5a7c9e1f3b4
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b8d0a2c4e5'
+down_revision: Union[str, None] = 'e5a7c9e1f3b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_all del arranque puede haberlas creado ya
+    insp = sa.inspect(op.get_bind())
+    if not insp.has_table('sesiones_sync'):
+        op.create_table('sesiones_sync',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('sesion', sa.String(length=64), nullable=False),
+        sa.Column('rutina_id', sa.Integer(), nullable=True),
+        sa.Column('dia', sa.Text(), nullable=True),
+        sa.Column('semana', sa.Integer(), nullable=True),
+        sa.Column('cursor', sa.BigInteger(), nullable=False),
+        sa.Column('workout_session_id', sa.Integer(), nullable=True),
+        sa.Column('progreso_id', sa.Integer(), nullable=True),
+        sa.Column('creado_en', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('actualizado_en', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['workout_session_id'], ['workout_sessions.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['progreso_id'], ['progreso.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('usuario_id', 'sesion', name='uq_sesion_sync_usuario')
+        )
+        op.create_index(op.f('ix_sesiones_sync_usuario_id'), 'sesiones_sync', ['usuario_id'], unique=False)
+    if not insp.has_table('eventos_sesion'):
+        op.create_table('eventos_sesion',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('sesion_sync_id', sa.Integer(), nullable=False),
+        sa.Column('clave', sa.String(length=64), nullable=False),
+        sa.Column('tipo', sa.String(length=24), nullable=False),
+        sa.Column('datos', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('ts_cliente', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('recibido_en', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['sesion_sync_id'], ['sesiones_sync.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sesion_sync_id', 'clave', name='uq_evento_sesion_clave')
+        )
+        op.create_index(op.f('ix_eventos_sesion_sesion_sync_id'), 'eventos_sesion', ['sesion_sync_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_eventos_sesion_sesion_sync_id'), table_name='eventos_sesion')
+    op.drop_table('eventos_sesion')
+    op.drop_index(op.f('ix_sesiones_sync_usuario_id'), table_name='sesiones_sync')
+    op.drop_table('sesiones_sync')
@@ -0,0 +1,163 @@
+# app/cache_ia.py
+"""
+Caché de dos niveles para respuestas IA que apenas cambian (alternativas de ejercicio):
+
+  1) LRU en memoria con TTL (por proceso).
+  2) Tabla cache_alternativas en Postgres (compartida entre procesos y reinicios).
+
+Peticiones idénticas simultáneas se agrupan (single-flight): solo una llama a la IA y el resto
+espera su resultado.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.config import settings
+from app.utils import generar_alternativas_ia, normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+
+class LRUTTL:
+    """LRU sencilla con caducidad por entrada."""
+
+    def __init__(self, maxsize: int, ttl_s: float):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._datos: OrderedDict[str, tuple[float, object]] = OrderedDict()
+
+    def get(self, clave: str):
+        item = self._datos.get(clave)
+        if item is None:
+            return None
+        expira, valor = item
+        if expira < time.monotonic():
+            del self._datos[clave]
+            return None
+        self._datos.move_to_end(clave)
+        return valor
+
+    def set(self, clave: str, valor, ttl_s: float | None = None) -> None:
+        self._datos[clave] = (time.monotonic() + (ttl_s or self.ttl_s), valor)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.maxsize:
+            self._datos.popitem(last=False)
+
+    def purgar(self, prefijo: str = "") -> int:
+        claves = [k for k in self._datos if k.startswith(prefijo)]
+        for k in claves:
+            del self._datos[k]
+        return len(claves)
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+
+_lru = LRUTTL(settings.ALT_CACHE_MAX, settings.ALT_CACHE_TTL_S)
+_en_vuelo: dict[str, asyncio.Future] = {}
+STATS = {"memoria": 0, "bd": 0, "ia": 0, "agrupadas": 0}
+
+
+def clave_alternativas(ejercicio: str, grupo_muscular: str = "", criterio: str = "") -> str:
+    return "|".join(normalizar_texto(x) for x in (ejercicio, grupo_muscular, criterio))
+
+
+async def _leer_bd(db: AsyncSession, clave: str) -> list | None:
+    res = await db.execute(
+        select(models.AlternativaCache.alternativas)
+        .where(
+            models.AlternativaCache.clave == clave,
+            models.AlternativaCache.expira_en > datetime.now(timezone.utc),
+        )
+    )
+    return res.scalar_one_or_none()
+
+
+async def _guardar_bd(db: AsyncSession, clave: str, ejercicio: str, grupo: str, criterio: str, alternativas: list) -> None:
+    expira = datetime.now(timezone.utc) + timedelta(seconds=settings.ALT_CACHE_TTL_S)
+    stmt = pg_insert(models.AlternativaCache).values(
+        clave=clave, ejercicio=ejercicio, grupo_muscular=grupo, criterio=criterio,
+        alternativas=alternativas, expira_en=expira,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.AlternativaCache.clave],
+        set_={"alternativas": stmt.excluded.alternativas, "expira_en": stmt.excluded.expira_en},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+async def alternativas_cacheadas(db: AsyncSession, ejercicio: str, grupo_muscular: str = "", criterio: str = "movilidad") -> list[str]:
+    """generar_alternativas_ia con caché memoria -> BD -> IA y deduplicación de peticiones en vuelo."""
+    grupo_muscular = grupo_muscular or ""
+    criterio = criterio or ""
+    clave = clave_alternativas(ejercicio, grupo_muscular, criterio)
+
+    valor = _lru.get(clave)
+    if valor is not None:
+        STATS["memoria"] += 1
+        return valor
+
+    futuro = _en_vuelo.get(clave)
+    if futuro is not None:
+        STATS["agrupadas"] += 1
+        try:
+            return await asyncio.shield(futuro)
+        except asyncio.CancelledError:
+            if not futuro.cancelled() or asyncio.current_task().cancelling():
+                raise
+            # se canceló la petición que la calculaba (no esta): la resolvemos aquí
+            return await alternativas_cacheadas(db, ejercicio, grupo_muscular, criterio)
+
+    futuro = asyncio.get_running_loop().create_future()
+    _en_vuelo[clave] = futuro
+    try:
+        valor = await _leer_bd(db, clave)
+        if valor is not None:
+            STATS["bd"] += 1
+        else:
+            STATS["ia"] += 1
+            valor = await generar_alternativas_ia(ejercicio, grupo_muscular, criterio)
+            if valor:  # no cacheamos respuestas vacías
+                try:
+                    await _guardar_bd(db, clave, ejercicio, grupo_muscular, criterio, valor)
+                except Exception as e:
+                    await db.rollback()
+                    logger.warning(f"[ALT-CACHE] no se pudo guardar '{clave}': {e}")
+        if valor:
+            _lru.set(clave, valor)
+        futuro.set_result(valor)
+        return valor
+    except Exception as e:
+        futuro.set_exception(e)
+        futuro.exception()  # marcada como recuperada si nadie más la espera
+        raise
+    finally:
+        # CancelledError no es Exception: sin esto las peticiones agrupadas esperarían para siempre
+        if not futuro.done():
+            futuro.cancel()
+        _en_vuelo.pop(clave, None)
+
+
+async def purgar_alternativas(db: AsyncSession, ejercicio: str | None = None) -> dict:
+    """Vacía la caché (entera o solo las entradas de un ejercicio) en memoria y en BD."""
+    if ejercicio:
+        prefijo = normalizar_texto(ejercicio) + "|"
+        en_memoria = _lru.purgar(prefijo)
+        res = await db.execute(delete(models.AlternativaCache).where(models.AlternativaCache.clave.startswith(prefijo)))
+    else:
+        en_memoria = _lru.purgar()
+        res = await db.execute(delete(models.AlternativaCache))
+    await db.commit()
+    return {"memoria": en_memoria, "bd": res.rowcount}
+
+
+def estadisticas_cache() -> dict:
+    return {**STATS, "entradas_memoria": len(_lru)}
@@ -0,0 +1,193 @@
+# app/cache_planes.py
+"""
+Reutilización de rutinas IA entre formularios casi idénticos.
+
+Muchos clientes envían el mismo perfil (misma franja de edad, experiencia, objetivos y un
+gimnasio con el mismo material). La huella del formulario agrupa esos campos en buckets junto con
+las etiquetas de equipamiento; si en la tabla cache_planes hay un microciclo base validado y fresco
+para esa huella, se reutiliza y solo se personaliza en local (semanas y progresión del usuario)
+en lugar de pagar otra generación.
+
+No entran en la huella ni la altura ni las semanas: la IA solo genera la semana 1 y el resto lo
+calcula app.progresion. Los formularios con texto libre (deporte, aspectos a mejorar) sí entran,
+así que casi nunca comparten plan.
+
+Frescura: settings.PLANES_CACHE_TTL_S y PLANES_CACHE_MAX_ACIERTOS. Métricas: /diag/planes-cache.
+"""
+import copy
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.config import settings
+from app.generador_local import equipo_desde_maquinas
+from app.progresion import expandir_plan
+from app.utils import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+# Contadores por proceso (el worker es quien consulta la caché)
+STATS = {"aciertos": 0, "fallos": 0, "guardados": 0}
+
+
+def _franja_edad(edad) -> str:
+    try:
+        edad = int(edad)
+    except (TypeError, ValueError):
+        return ""
+    for limite, franja in ((18, "<18"), (30, "18-29"), (45, "30-44"), (60, "45-59")):
+        if edad < limite:
+            return franja
+    return "60+"
+
+
+def _minutos(tiempo) -> str:
+    """'60', '60 min', '1h' -> múltiplo de 15 minutos; texto normalizado si no se entiende."""
+    texto = normalizar_texto(str(tiempo or ""))
+    m = re.search(r"\d+", texto)
+    if not m:
+        return texto
+    n = int(m.group())
+    if n <= 4 and "h" in texto:  # '1h', '2 horas'
+        n *= 60
+    return str(max(15, round(n / 15) * 15))
+
+
+def _lista(valores) -> list[str]:
+    return sorted({normalizar_texto(v) for v in valores or [] if normalizar_texto(v)})
+
+
+def huella_formulario(form_data: dict, equipamiento) -> tuple[str, dict]:
+    """(huella sha256, campos del bucket) de un FormularioClienteCreate + máquinas del gimnasio."""
+    campos = {
+        "edad": _franja_edad(form_data.get("edad")),
+        "sexo": normalizar_texto(form_data.get("sexo")),
+        "experiencia": normalizar_texto(form_data.get("experiencia_entrenamiento")),
+        "minutos": _minutos(form_data.get("tiempo_disponible")),
+        "preferencias": _lista(form_data.get("preferencias_entrenamiento")),
+        "objetivos": _lista(form_data.get("objetivos_entrenamiento")),
+        "deporte": normalizar_texto(form_data.get("deporte_especifico")),
+        "aspectos": normalizar_texto(form_data.get("aspectos_mejorar")),
+        "equipo": sorted(equipo_desde_maquinas(equipamiento)),
+    }
+    crudo = json.dumps(campos, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(crudo.encode()).hexdigest(), campos
+
+
+def _plan_valido(rutina: dict) -> bool:
+    """Solo se reutilizan planes completos: al menos un día y todos los días con ejercicios con nombre."""
+    plan = rutina.get("plan") or []
+    dias = plan[0].get("dias") if plan and isinstance(plan[0], dict) else None
+    if not dias:
+        return False
+    return all(
+        d.get("descanso") or (d.get("ejercicios") and all((e.get("nombre") or "").strip() for e in d["ejercicios"]))
+        for d in dias
+    )
+
+
+def _base_de(rutina: dict) -> dict:
+    """La semana 1 del plan ya guardado (con exercise_id e imágenes) como microciclo base."""
+    base = {k: v for k, v in rutina.items() if k not in ("plan", "duracion", "progresion")}
+    semana = copy.deepcopy(rutina["plan"][0])
+    semana.pop("fase", None)
+    base["plan"] = [semana]
+    return base
+
+
+def personalizar(base: dict, form_data: dict, semanas: int) -> dict:
+    """Ajuste local del plan reutilizado: semanas y progresión del usuario."""
+    rutina = expandir_plan(copy.deepcopy(base), semanas, form_data.get("experiencia_entrenamiento"))
+    rutina["reutilizada"] = True
+    return rutina
+
+
+async def plan_reutilizable(db: AsyncSession, huella: str) -> dict | None:
+    """Microciclo base fresco para la huella (y cuenta el acierto), o None."""
+    if not settings.PLANES_CACHE_ACTIVA:
+        return None
+    res = await db.execute(
+        update(models.PlanCache)
+        .where(
+            models.PlanCache.huella == huella,
+            models.PlanCache.expira_en > datetime.now(timezone.utc),
+            models.PlanCache.usos_version < settings.PLANES_CACHE_MAX_ACIERTOS,
+        )
+        .values(aciertos=models.PlanCache.aciertos + 1, usos_version=models.PlanCache.usos_version + 1,
+                ultimo_uso=func.now())
+        .returning(models.PlanCache.base_json)
+    )
+    base = res.scalar_one_or_none()
+    await db.commit()
+    STATS["aciertos" if base else "fallos"] += 1
+    return base
+
+
+async def guardar_plan(db: AsyncSession, huella: str, campos: dict, rutina: dict) -> bool:
+    """Guarda (o refresca) el plan de la huella si es válido. No falla el trabajo si no puede."""
+    if not settings.PLANES_CACHE_ACTIVA or not _plan_valido(rutina):
+        return False
+    expira = datetime.now(timezone.utc) + timedelta(seconds=settings.PLANES_CACHE_TTL_S)
+    stmt = pg_insert(models.PlanCache).values(
+        huella=huella, campos=campos, base_json=_base_de(rutina), aciertos=0, usos_version=0, generaciones=1,
+        expira_en=expira,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.PlanCache.huella],
+        set_={
+            "base_json": stmt.excluded.base_json,
+            "expira_en": stmt.excluded.expira_en,
+            "usos_version": 0,
+            "generaciones": models.PlanCache.generaciones + 1,
+            "creado_en": func.now(),
+        },
+    )
+    try:
+        await db.execute(stmt)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.warning(f"[PLAN-CACHE] no se pudo guardar {huella[:12]}: {e}")
+        return False
+    STATS["guardados"] += 1
+    return True
+
+
+async def estadisticas_planes(db: AsyncSession) -> dict:
+    """Tasa de acierto global (según la tabla, todos los procesos) y contadores de este proceso."""
+    fila = (await db.execute(
+        select(
+            func.count(models.PlanCache.id),
+            func.count(models.PlanCache.id).filter(models.PlanCache.expira_en > datetime.now(timezone.utc)),
+            func.coalesce(func.sum(models.PlanCache.aciertos), 0),
+            func.coalesce(func.sum(models.PlanCache.generaciones), 0),
+        )
+    )).one()
+    huellas, frescas, aciertos, generaciones = fila
+    total = aciertos + generaciones
+    return {
+        "huellas": huellas,
+        "frescas": frescas,
+        "aciertos": aciertos,
+        "generaciones": generaciones,
+        "tasa_acierto": round(aciertos / total, 3) if total else None,
+        "proceso": dict(STATS),
+        "ttl_s": settings.PLANES_CACHE_TTL_S,
+        "activa": settings.PLANES_CACHE_ACTIVA,
+    }
+
+
+async def purgar_planes(db: AsyncSession, solo_caducados: bool = True) -> int:
+    stmt = delete(models.PlanCache)
+    if solo_caducados:
+        stmt = stmt.where(models.PlanCache.expira_en <= datetime.now(timezone.utc))
+    res = await db.execute(stmt)
+    await db.commit()
+    return res.rowcount
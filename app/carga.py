@@ -0,0 +1,181 @@
+# app/carga.py
+"""
+Prueba de carga de los endpoints con IA. Pensada para usarse contra el servidor falso
+(app/fake_openai.py) y así medir la app sin gastar en la API real.
+
+  python -m app.fake_openai --latencia-ms 800 &
+  OPENAI_BASE_URL=http://127.0.0.1:9100/v1 uvicorn app.main:app &
+  OPENAI_BASE_URL=http://127.0.0.1:9100/v1 python -m app.trabajos &
+  python -m app.carga --email cliente@demo.com --password demo -c 20 -n 200 --esperar
+
+Escenarios (--escenarios, separados por comas):
+  formulario  POST /formulario-entreno (202); con --esperar también mide hasta que el trabajo termina
+  cambiar     POST /api/cambiar-ejercicio
+  comida      POST /registrar-comida con usar_ia=true
+
+Informa de p50/p95/p99, media, errores y rendimiento (peticiones correctas/s) por escenario.
+"""
+import argparse
+import asyncio
+import base64
+import random
+import time
+
+import aiohttp
+
+PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+EJERCICIOS = [
+    ("Press de banca con barra", "Pectoral"), ("Sentadilla trasera con barra", "Piernas"),
+    ("Remo con barra", "Espalda"), ("Press militar con barra", "Hombros"),
+    ("Peso muerto rumano con barra", "Isquiotibiales"), ("Jalón al pecho", "Espalda"),
+]
+
+
+class Medidas:
+    def __init__(self):
+        self.tiempos: dict[str, list[float]] = {}
+        self.errores: dict[str, int] = {}
+
+    def ok(self, escenario: str, segundos: float) -> None:
+        self.tiempos.setdefault(escenario, []).append(segundos)
+
+    def error(self, escenario: str) -> None:
+        self.errores[escenario] = self.errores.get(escenario, 0) + 1
+
+
+def _percentil(ordenados: list[float], p: float) -> float:
+    if not ordenados:
+        return float("nan")
+    k = (len(ordenados) - 1) * p
+    lo, hi = int(k), min(int(k) + 1, len(ordenados) - 1)
+    return ordenados[lo] + (ordenados[hi] - ordenados[lo]) * (k - lo)
+
+
+def informe(medidas: Medidas, duracion_s: float) -> str:
+    filas = [f"{'escenario':<22}{'ok':>6}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'media ms':>10}{'req/s':>8}"]
+    for esc in sorted(set(medidas.tiempos) | set(medidas.errores)):
+        t = sorted(medidas.tiempos.get(esc, []))
+        media = sum(t) / len(t) if t else float("nan")
+        filas.append(
+            f"{esc:<22}{len(t):>6}{medidas.errores.get(esc, 0):>6}"
+            f"{_percentil(t, .50) * 1000:>10.0f}{_percentil(t, .95) * 1000:>10.0f}"
+            f"{_percentil(t, .99) * 1000:>10.0f}{media * 1000:>10.0f}{len(t) / duracion_s:>8.2f}"
+        )
+    filas.append(f"duración total: {duracion_s:.1f}s")
+    return "\n".join(filas)
+
+
+async def login(session: aiohttp.ClientSession, base: str, email: str, password: str) -> None:
+    async with session.post(f"{base}/login", data={"username": email, "password": password},
+                            allow_redirects=False) as r:
+        if r.status != 303 or "access_token" not in r.cookies:
+            raise SystemExit(f"Login fallido ({r.status}): revisa --email/--password")
+
+
+async def _formulario(session, base: str, medidas: Medidas, esperar: bool, timeout_s: float) -> None:
+    datos = aiohttp.FormData()
+    for k, v in {"altura": 178, "edad": 30, "sexo": "hombre", "nivel_experiencia": "intermedio",
+                 "tiempo_entrenamiento": 60, "semanas": 8}.items():
+        datos.add_field(k, str(v))
+    datos.add_field("preferencias", "fuerza")
+    datos.add_field("objetivos", "ganar_masa")
+
+    t0 = time.perf_counter()
+    async with session.post(f"{base}/formulario-entreno", data=datos) as r:
+        cuerpo = await r.json(content_type=None) if r.status == 202 else None
+    if not cuerpo:
+        medidas.error("formulario (202)")
+        return
+    medidas.ok("formulario (202)", time.perf_counter() - t0)
+    if not esperar:
+        return
+
+    limite = t0 + timeout_s
+    while time.perf_counter() < limite:
+        await asyncio.sleep(0.5)
+        async with session.get(f"{base}{cuerpo['status_url']}") as r:
+            t = await r.json(content_type=None)
+        if t.get("estado") == "completado":
+            medidas.ok("formulario (completo)", time.perf_counter() - t0)
+            return
+        if t.get("estado") == "error":
+            break
+    medidas.error("formulario (completo)")
+
+
+async def _cambiar(session, base: str, medidas: Medidas) -> None:
+    nombre, grupo = random.choice(EJERCICIOS)
+    t0 = time.perf_counter()
+    async with session.post(f"{base}/api/cambiar-ejercicio", json={"actual": nombre, "grupo": grupo}) as r:
+        await r.read()
+        ok = r.status == 200
+    if ok:
+        medidas.ok("cambiar", time.perf_counter() - t0)
+    else:
+        medidas.error("cambiar")
+
+
+async def _comida(session, base: str, medidas: Medidas) -> None:
+    datos = aiohttp.FormData()
+    datos.add_field("imagen", PNG, filename="carga.png", content_type="image/png")
+    datos.add_field("descripcion", "Arroz con pollo")
+    datos.add_field("tipo_comida", "comida")
+    datos.add_field("usar_ia", "true")
+    t0 = time.perf_counter()
+    async with session.post(f"{base}/registrar-comida", data=datos, allow_redirects=False) as r:
+        await r.read()
+        ok = r.status < 400
+    if ok:
+        medidas.ok("comida", time.perf_counter() - t0)
+    else:
+        medidas.error("comida")
+
+
+async def ejecutar(args) -> None:
+    escenarios = [e.strip() for e in args.escenarios.split(",") if e.strip()]
+    medidas = Medidas()
+    conector = aiohttp.TCPConnector(limit=args.concurrencia)
+    tarro = aiohttp.CookieJar(unsafe=True)  # permite cookies de 127.0.0.1
+    async with aiohttp.ClientSession(connector=conector, cookie_jar=tarro,
+                                     timeout=aiohttp.ClientTimeout(total=args.timeout)) as session:
+        await login(session, args.base, args.email, args.password)
+
+        pendientes = iter(range(args.peticiones))
+
+        async def _cliente():
+            for i in pendientes:
+                esc = escenarios[i % len(escenarios)]
+                try:
+                    if esc == "formulario":
+                        await _formulario(session, args.base, medidas, args.esperar, args.timeout)
+                    elif esc == "cambiar":
+                        await _cambiar(session, args.base, medidas)
+                    elif esc == "comida":
+                        await _comida(session, args.base, medidas)
+                    else:
+                        raise SystemExit(f"Escenario desconocido: {esc}")
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    medidas.error(esc)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(_cliente() for _ in range(args.concurrencia)))
+        print(informe(medidas, time.perf_counter() - t0))
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Prueba de carga de los endpoints con IA")
+    p.add_argument("--base", default="http://127.0.0.1:8000")
+    p.add_argument("--email", required=True, help="usuario con rol cliente")
+    p.add_argument("--password", required=True)
+    p.add_argument("-c", "--concurrencia", type=int, default=10)
+    p.add_argument("-n", "--peticiones", type=int, default=100)
+    p.add_argument("--escenarios", default="formulario,cambiar,comida")
+    p.add_argument("--esperar", action="store_true", help="medir también hasta que termina el trabajo de rutina")
+    p.add_argument("--timeout", type=float, default=300.0)
+    asyncio.run(ejecutar(p.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# app/carga_inicial.py
+"""
+Carga de arranque para ejercicios sin histórico: categoría por palabras clave del nombre ->
+fracción del peso corporal o kg fijos, según la tabla settings.CARGAS_INICIALES.
+
+La tabla se compila una sola vez (al importar) en una única regex con una alternativa por
+categoría, en orden de prioridad, cada una con un lookahead sobre sus claves:
+
+    ^(?:(?=.*?(?:sentadilla|squat))(?P<c0>)|(?=.*?(?:peso muerto|deadlift|...))(?P<c1>)|...)
+
+re.match prueba las alternativas en ese orden y se queda con la primera que encaja, que es
+justo lo que hacía la cadena de `if any(k in name for k in [...])`. Nombres y claves se pliegan
+igual (minúsculas, sin tildes): 'Jalon al pecho' y 'Jalón al pecho' caen en la misma categoría.
+
+Para añadir o ajustar categorías basta con cambiar CARGAS_INICIALES (p.ej. en el .env, en JSON).
+"""
+import re
+from typing import NamedTuple
+
+from app.config import settings
+from app.utils import normalizar_texto
+
+
+class Categoria(NamedTuple):
+    nombre: str
+    tipo: str       # "bw" (fracción del peso corporal) | "kg" (carga fija)
+    valor: float
+
+
+def compilar(tabla) -> tuple[re.Pattern, list[Categoria]]:
+    """(regex, categorías por índice de grupo) a partir de filas [categoría, claves, tipo, valor]."""
+    categorias, alternativas = [], []
+    for nombre, claves, tipo, valor in tabla:
+        claves = sorted({normalizar_texto(k) for k in claves if normalizar_texto(k)}, key=len, reverse=True)
+        if not claves or tipo not in ("bw", "kg"):
+            raise ValueError(f"CARGAS_INICIALES: fila no válida para '{nombre}'")
+        alternativas.append(f"(?=.*?(?:{'|'.join(map(re.escape, claves))}))(?P<c{len(categorias)}>)")
+        categorias.append(Categoria(nombre, tipo, float(valor)))
+    return re.compile(f"^(?:{'|'.join(alternativas)})" if alternativas else r"(?!)", re.DOTALL), categorias
+
+
+_PATRON, _CATEGORIAS = compilar(settings.CARGAS_INICIALES)
+
+
+def categoria(nombre: str | None) -> Categoria | None:
+    m = _PATRON.match(normalizar_texto(nombre))
+    return _CATEGORIAS[int(m.lastgroup[1:])] if m else None
+
+
+def carga_base(nombre: str | None, peso_corporal: float) -> float:
+    """Carga de arranque (sin ajustar a reps ni redondear) para el ejercicio."""
+    cat = categoria(nombre)
+    if cat is None:
+        return settings.CARGA_INICIAL_DEFECTO
+    return cat.valor * peso_corporal if cat.tipo == "bw" else cat.valor
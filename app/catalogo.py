@@ -0,0 +1,230 @@
+# app/catalogo.py
+"""
+Catálogo canónico de ejercicios (tablas exercises + exercise_aliases).
+
+Las rutinas siguen guardando el nombre libre que propone la IA, pero al guardar un plan cada
+ejercicio se resuelve a un id del catálogo (ej["exercise_id"]) por su slug normalizado
+(minúsculas, sin tildes: 'Press  de Banca' y 'press de banca' son el mismo). Los nombres nuevos
+se dan de alta al vuelo; los sinónimos se añaden como alias y resuelven al mismo id.
+
+Con el id, lo que antes era recorrer el JSON comparando strings pasa a ser un lookup por clave:
+imagen canónica, grupo muscular, equipo...
+
+Sembrar el catálogo base (ejercicios del generador local + alias habituales):
+  python -m app.catalogo
+"""
+import asyncio
+import logging
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.database import SessionLocal
+from app.generador_local import CATALOGO
+from app.imagenes import _existe_local, _safe_slug
+from app.utils import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+# patrón de movimiento del generador local -> grupo muscular del catálogo
+GRUPO_POR_PATRON = {
+    "sentadilla": "Piernas", "bisagra": "Cadena posterior", "empuje_h": "Pectoral",
+    "empuje_v": "Hombros", "tiron_h": "Espalda", "tiron_v": "Espalda", "zancada": "Piernas",
+    "femoral": "Isquiotibiales", "hombro": "Hombros", "biceps": "Bíceps", "triceps": "Tríceps",
+    "gemelo": "Gemelos", "core": "Core", "cardio": "Cardio", "movilidad": "Movilidad",
+}
+
+# sinónimos frecuentes en las respuestas de la IA -> nombre canónico
+ALIAS_BASE = {
+    "Press de banca con barra": ["Press de banca", "Press banca", "Bench press", "Press plano con barra"],
+    "Sentadilla trasera con barra": ["Sentadilla", "Sentadilla con barra", "Sentadilla trasera", "Back squat", "Squat"],
+    "Peso muerto rumano con barra": ["Peso muerto rumano", "Romanian deadlift", "RDL"],
+    "Press militar con barra": ["Press militar", "Overhead press", "Press de hombros con barra"],
+    "Remo con barra": ["Remo con barra inclinado", "Barbell row", "Remo Pendlay"],
+    "Jalón al pecho": ["Jalón al pecho en polea", "Jalón frontal", "Lat pulldown"],
+    "Dominadas": ["Dominadas pronas", "Pull ups", "Chin ups"],
+    "Prensa de piernas": ["Prensa", "Prensa inclinada", "Leg press"],
+    "Hip thrust": ["Hip thrust con barra", "Empuje de cadera"],
+    "Zancadas con mancuernas": ["Zancadas", "Lunges"],
+    "Curl femoral en máquina": ["Curl femoral", "Curl femoral tumbado", "Leg curl"],
+    "Elevaciones laterales": ["Elevaciones laterales con mancuernas", "Lateral raises"],
+    "Plancha frontal": ["Plancha", "Plank"],
+    "Fondos en paralelas": ["Fondos", "Dips"],
+    "Elevación de gemelos": ["Elevación de talones", "Gemelos de pie", "Calf raises"],
+}
+
+
+def slug_ejercicio(nombre: str | None) -> str:
+    """Clave de resolución: 'Press de Banca ' -> 'press_de_banca'."""
+    return _safe_slug(normalizar_texto(nombre))[:160]
+
+
+def _ejercicios_plan(rutina_json: dict) -> list[dict]:
+    return [
+        ej
+        for semana in (rutina_json or {}).get("plan", []) or []
+        for dia in semana.get("dias", []) or []
+        for ej in dia.get("ejercicios", []) or []
+        if isinstance(ej, dict) and (ej.get("nombre") or "").strip()
+    ]
+
+
+async def resolver_ejercicios(db: AsyncSession, nombres, crear: bool = True) -> dict[str, int]:
+    """
+    Devuelve {slug: exercise_id} para los nombres dados con un lookup por lotes en los alias.
+    Con crear=True los que no existen se dan de alta (nombre tal cual + alias canónico).
+    """
+    por_slug: dict[str, str] = {}
+    for n in nombres:
+        s = slug_ejercicio(n)
+        if s:
+            por_slug.setdefault(s, " ".join(str(n).split())[:120])
+    if not por_slug:
+        return {}
+
+    res = await db.execute(
+        select(models.ExerciseAlias.alias_slug, models.ExerciseAlias.exercise_id)
+        .where(models.ExerciseAlias.alias_slug.in_(list(por_slug)))
+    )
+    ids = dict(res.all())
+    faltan = [s for s in por_slug if s not in ids]
+    if not faltan or not crear:
+        return ids
+
+    # Alta concurrente-segura: ON CONFLICT DO NOTHING y luego se relee
+    await db.execute(
+        pg_insert(models.Exercise)
+        .values([{"name": por_slug[s], "slug": s} for s in faltan])
+        .on_conflict_do_nothing()
+    )
+    res = await db.execute(
+        select(models.Exercise.id, models.Exercise.slug, models.Exercise.name)
+        .where(models.Exercise.slug.in_(faltan) | models.Exercise.name.in_([por_slug[s] for s in faltan]))
+    )
+    por_nombre = {}
+    for id_, slug, name in res.all():
+        if slug in faltan:
+            ids[slug] = id_
+        por_nombre[name] = id_
+    for s in faltan:  # mismo nombre con otro slug (filas antiguas): se resuelve por nombre
+        if s not in ids and por_slug[s] in por_nombre:
+            ids[s] = por_nombre[por_slug[s]]
+
+    nuevos = [{"exercise_id": ids[s], "alias": por_slug[s], "alias_slug": s} for s in faltan if s in ids]
+    if nuevos:
+        await db.execute(pg_insert(models.ExerciseAlias).values(nuevos).on_conflict_do_nothing())
+    return ids
+
+
+async def vincular_plan(db: AsyncSession, rutina_json: dict) -> dict:
+    """
+    Anota ej["exercise_id"] en cada ejercicio del plan (in-place) y usa la imagen canónica del
+    catálogo donde el plan no tiene una local. Las imágenes locales del plan que el catálogo aún
+    no tiene pasan a ser la canónica. No hace commit: va en la misma transacción que guarda la rutina.
+    """
+    ejercicios = _ejercicios_plan(rutina_json)
+    if not ejercicios:
+        return rutina_json
+    ids = await resolver_ejercicios(db, [ej["nombre"] for ej in ejercicios])
+    for ej in ejercicios:
+        ej["exercise_id"] = ids.get(slug_ejercicio(ej["nombre"]))
+
+    res = await db.execute(
+        select(models.Exercise.id, models.Exercise.imagen_url)
+        .where(models.Exercise.id.in_(list(set(ids.values()))))
+    )
+    canonicas = {id_: url for id_, url in res.all() if url and _existe_local(url)}
+    promover: dict[int, str] = {}
+    for ej in ejercicios:
+        id_, url = ej.get("exercise_id"), ej.get("imagen_url") or ""
+        if id_ is None:
+            continue
+        if url.startswith("/static/") and _existe_local(url):
+            if id_ not in canonicas:
+                promover.setdefault(id_, url)
+        elif id_ in canonicas:
+            ej["imagen_url"] = canonicas[id_]
+    if promover:
+        # UPDATE por clave primaria en lote (executemany)
+        await db.execute(update(models.Exercise), [{"id": i, "imagen_url": u} for i, u in promover.items()])
+    return rutina_json
+
+
+async def imagenes_por_id(db: AsyncSession, ids) -> dict[int, str]:
+    """{exercise_id: imagen_url canónica} para los ids dados (solo las que existen en disco)."""
+    ids = {i for i in ids if i}
+    if not ids:
+        return {}
+    res = await db.execute(
+        select(models.Exercise.id, models.Exercise.imagen_url)
+        .where(models.Exercise.id.in_(list(ids)), models.Exercise.imagen_url.is_not(None))
+    )
+    return {id_: url for id_, url in res.all() if _existe_local(url)}
+
+
+async def anadir_alias(db: AsyncSession, exercise_id: int, alias: str) -> bool:
+    """Añade un sinónimo a un ejercicio. Devuelve False si ese alias ya resolvía a otro ejercicio."""
+    slug = slug_ejercicio(alias)
+    if not slug:
+        return False
+    stmt = (
+        pg_insert(models.ExerciseAlias)
+        .values(exercise_id=exercise_id, alias=alias.strip()[:200], alias_slug=slug)
+        .on_conflict_do_nothing()
+        .returning(models.ExerciseAlias.id)
+    )
+    creado = (await db.execute(stmt)).scalar_one_or_none()
+    if creado is None:
+        actual = await db.scalar(
+            select(models.ExerciseAlias.exercise_id).where(models.ExerciseAlias.alias_slug == slug)
+        )
+        return actual == exercise_id
+    return True
+
+
+async def sembrar_catalogo(db: AsyncSession) -> int:
+    """Da de alta (idempotente) los ejercicios del generador local con grupo, equipo y alias base."""
+    filas = [
+        {"name": nombre, "slug": slug_ejercicio(nombre), "grupo_muscular": GRUPO_POR_PATRON.get(patron),
+         "equipo": ", ".join(sorted(equipo)) or "peso corporal"}
+        for nombre, patron, equipo, _nivel, _motivo in CATALOGO
+    ]
+    # un nombre base que ya existe con otro slug (filas antiguas) chocaría con el UNIQUE de name y
+    # abortaría toda la siembra: esas filas se dejan como están (resolver_ejercicios las encuentra por nombre)
+    slug_de = {f["name"]: f["slug"] for f in filas}
+    res = await db.execute(
+        select(models.Exercise.name, models.Exercise.slug).where(models.Exercise.name.in_(list(slug_de)))
+    )
+    ocupados = {nombre for nombre, slug in res.all() if slug != slug_de[nombre]}
+    nuevas = [f for f in filas if f["name"] not in ocupados]
+    if nuevas:
+        stmt = pg_insert(models.Exercise).values(nuevas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.Exercise.slug],
+            set_={"grupo_muscular": stmt.excluded.grupo_muscular, "equipo": stmt.excluded.equipo},
+        )
+        await db.execute(stmt)
+    ids = await resolver_ejercicios(db, [f["name"] for f in filas])
+    alias = [
+        {"exercise_id": ids[slug_ejercicio(canonico)], "alias": a, "alias_slug": slug_ejercicio(a)}
+        for canonico, sinonimos in ALIAS_BASE.items()
+        if slug_ejercicio(canonico) in ids
+        for a in sinonimos
+    ]
+    if alias:
+        await db.execute(pg_insert(models.ExerciseAlias).values(alias).on_conflict_do_nothing())
+    await db.commit()
+    return len(filas)
+
+
+async def _cli() -> None:
+    async with SessionLocal() as db:
+        n = await sembrar_catalogo(db)
+    print(f"Catálogo sembrado: {n} ejercicios base y {sum(map(len, ALIAS_BASE.values()))} alias")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_cli())
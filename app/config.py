@@ -10,6 +10,84 @@ ENV_PATH = BASE_DIR / ".env"
 class Settings(BaseSettings):
     OPENAI_API_KEY: str | None = None
     DATABASE_URL: str | None = None  # <-- añade este campo
+    OPENAI_BASE_URL: str | None = None  # p.ej. servidor OpenAI falso para pruebas de carga
+
+    # Pasarela IA (app/gateway_ia.py)
+    IA_TIMEOUT_S: float = 120.0
+    IA_POOL_MAX: int = 50              # conexiones HTTP simultáneas del pool compartido
+    IA_POOL_KEEPALIVE: int = 20
+    IA_CONCURRENCIA_MODELO: dict[str, int] = {"gpt-4o": 8, "gpt-4o-mini": 16, "gpt-image-1": 4}
+    IA_CONCURRENCIA_DEFECTO: int = 8
+    IA_RPM: dict[str, int] = {"gpt-4o": 500, "gpt-4o-mini": 1000, "gpt-image-1": 50}
+    IA_RPM_DEFECTO: int = 300
+    IA_REINTENTOS: int = 4
+    IA_BACKOFF_BASE_S: float = 0.5
+    IA_BACKOFF_MAX_S: float = 20.0
+    # Registro de cada llamada IA en la tabla ai_calls (app/registro_ia.py)
+    IA_REGISTRO_ACTIVO: bool = True
+    IA_REGISTRO_FLUSH_S: float = 2.0   # las filas se insertan por lotes cada N segundos
+    # USD por millón de tokens [entrada, salida]; imágenes sin 'usage' -> IA_PRECIO_IMAGEN por imagen
+    IA_PRECIOS: dict[str, list[float]] = {
+        "gpt-4o": [2.5, 10.0], "gpt-4o-mini": [0.15, 0.6], "gpt-image-1": [5.0, 40.0],
+    }
+    IA_PRECIO_IMAGEN: float = 0.04
+
+    # Personal con acceso a /admin/* y /diag/* de coste (emails, sin distinguir mayúsculas)
+    ADMIN_EMAILS: list[str] = []
+
+    # Imágenes IA de ejercicios (generación en paralelo al crear rutinas)
+    IMG_CONCURRENCIA: int = 4          # llamadas simultáneas a la API de imágenes
+    IMG_TIMEOUT_S: float = 90.0        # tiempo máximo por ejercicio (generar + descargar)
+    # Derivados ligeros de cada imagen subida/generada (app/derivados.py, requiere Pillow)
+    IMG_ANCHOS: list[int] = [160, 320, 640]
+    IMG_FORMATOS: list[str] = ["avif", "webp"]
+    IMG_CALIDAD: int = 70
+    # Reparación masiva de imágenes (app/reparar_imagenes.py): topes del servidor
+    REPARAR_MAX_LOTE: int = 200
+    REPARAR_MAX_CONCURRENCIA: int = 8
+    REPARAR_MAX_REGENERADAS: int = 200  # llamadas de pago a la API de imágenes por trabajo
+
+    # Cola de trabajos IA (python -m app.trabajos)
+    TRABAJOS_CONCURRENCIA: int = 2     # trabajos simultáneos por proceso worker
+    TRABAJOS_POLL_S: float = 2.0       # espera entre consultas cuando la cola está vacía
+    TRABAJOS_LEASE_S: int = 600        # sin latido en este tiempo -> el trabajo se considera huérfano
+    TRABAJOS_MAX_INTENTOS: int = 3
+    RUTINA_SOLO_LOCAL: bool = False    # True: rutinas solo con el generador local (sin gasto de IA)
+    TRABAJOS_SSE_POLL_S: float = 0.5   # cada cuánto mira /api/trabajos/{id}/eventos si hay semanas nuevas
+
+    # Caché de alternativas de ejercicio (memoria LRU + tabla cache_alternativas)
+    ALT_CACHE_MAX: int = 2000          # entradas en la LRU en memoria
+    ALT_CACHE_TTL_S: int = 30 * 24 * 3600
+
+    # Reutilización de planes IA entre formularios casi idénticos (tabla cache_planes)
+    PLANES_CACHE_ACTIVA: bool = True
+    PLANES_CACHE_TTL_S: int = 14 * 24 * 3600   # frescura: pasado este tiempo se vuelve a generar
+    PLANES_CACHE_MAX_ACIERTOS: int = 200       # tras N reutilizaciones se regenera (variedad)
+
+    # Canal WebSocket de la sesión en vivo (app/sesion_en_vivo.py)
+    SESION_WS_FLUSH_S: float = 2.0        # los eventos se guardan por lotes cada N segundos...
+    SESION_WS_FLUSH_EVENTOS: int = 20     # ...o al acumular N
+
+    # Carga de arranque sin histórico (app/carga_inicial.py): [categoría, palabras clave, "bw" | "kg", valor]
+    # "bw" = fracción del peso corporal, "kg" = carga fija. Gana la primera categoría (en este orden)
+    # con alguna clave en el nombre; se compara sin tildes ni mayúsculas.
+    CARGAS_INICIALES: list[tuple[str, list[str], str, float]] = [
+        ("sentadilla", ["sentadilla", "squat"], "bw", 0.7),
+        ("peso_muerto", ["peso muerto", "deadlift", "hip hinge"], "bw", 0.9),
+        ("press_banca", ["press banca", "bench", "press de banca"], "bw", 0.6),
+        ("press_militar", ["press militar", "overhead", "hombro barra"], "bw", 0.35),
+        ("dominada", ["dominada", "pull-up", "chin-up"], "bw", 0.0),  # con lastre/ayuda es complejo: peso corporal
+        ("remo_barra", ["remo barra", "barbell row"], "bw", 0.5),
+        ("remo_mancuernas", ["remo mancuernas", "dumbbell row"], "kg", 24),  # par 12+12 aprox
+        ("prensa", ["prensa", "leg press"], "bw", 1.5),
+        ("extension_cuadriceps", ["extensión cuádriceps", "maquina cuadriceps"], "kg", 25),
+        ("curl_femoral", ["curl femoral", "leg curl"], "kg", 25),
+        ("jalon", ["jalón", "lat pulldown"], "kg", 35),
+        ("aperturas", ["aperturas", "fly", "cruce", "crossover"], "kg", 16),
+        ("biceps", ["biceps", "curl", "martillo"], "kg", 16),
+        ("triceps", ["triceps", "press francés", "jalón triceps"], "kg", 20),
+    ]
+    CARGA_INICIAL_DEFECTO: float = 20.0   # kg si ninguna categoría encaja
 
     # Lee del .env (por si no vieniera del entorno) y NO rompas por otras claves
     model_config = SettingsConfigDict(
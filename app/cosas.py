@@ -1,7 +1,7 @@
-from openai import AsyncOpenAI
-import asyncio, os
+from app import gateway_ia
+import asyncio
 async def test():
-    c = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    r = await c.images.generate(model="gpt-image-1", prompt="ok", size="256x256")
+    r = await gateway_ia.imagen(model="gpt-image-1", prompt="ok", size="256x256")
     print("ok:", bool(r.data))
-asyncio.run(test())
\ No newline at end of file
+    await gateway_ia.cerrar()
+asyncio.run(test())
@@ -28,6 +28,19 @@ async def crear_usuario(db: AsyncSession, usuario):
     await db.refresh(db_usuario)
     return db_usuario
 
+# ---------- GIMNASIO ----------
+async def get_equipamiento_principal(db: AsyncSession, usuario_id: int) -> str:
+    """Máquinas del gimnasio principal del usuario, separadas por comas ("" si no tiene)."""
+    result = await db.execute(
+        select(models.InfraestructuraGimnasio.nombre_maquina)
+        .join(models.UsuarioGimnasio, models.UsuarioGimnasio.gimnasio_id == models.InfraestructuraGimnasio.gimnasio_id)
+        .where(
+            models.UsuarioGimnasio.usuario_id == usuario_id,
+            models.UsuarioGimnasio.es_principal == True
+        )
+    )
+    return ", ".join(result.scalars().all())
+
 # ---------- FORMULARIO CLIENTE ----------
 async def get_formulario_por_usuario(db: AsyncSession, usuario_id: int):
     result = await db.execute(select(FormularioCliente).where(FormularioCliente.usuario_id == usuario_id))
@@ -0,0 +1,188 @@
+# app/derivados.py
+"""
+Derivados de imagen para servir fotos ligeras.
+
+Por cada imagen de /static/uploads (IA de ejercicios, avatares, comidas...) se generan:
+  - {stem}_w{ancho}.webp (y .avif si Pillow lo soporta) para cada ancho de settings.IMG_ANCHOS;
+  - {stem}_lqip.txt: placeholder borroso diminuto como data URI (se pinta mientras carga la buena).
+
+El trabajo con Pillow es CPU y disco, así que corre en un hilo (asyncio.to_thread) y nunca
+bloquea el event loop. Si Pillow no está instalado todo sigue funcionando con la imagen original.
+
+Plantillas: `srcset(url)` e `img_responsive(url, alt, ...)` (globals de Jinja).
+Backfill de lo que ya hay en disco:  python -m app.derivados
+"""
+import asyncio
+import base64
+import io
+import logging
+from pathlib import Path
+
+from markupsafe import Markup, escape
+
+from app.config import settings
+
+try:
+    from PIL import Image, ImageFilter, ImageOps
+except ImportError:  # Pillow es opcional
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+UPLOAD_DIR = STATIC_DIR / "uploads"
+EXTENSIONES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp"}
+ANCHO_LQIP = 24
+
+_avif_ok: bool | None = None
+_tareas: set[asyncio.Task] = set()
+
+
+def _es_derivado(path: Path) -> bool:
+    return "_w" in path.stem and path.stem.rsplit("_w", 1)[-1].isdigit()
+
+
+def _ruta_local(url: str) -> Path | None:
+    if not url or not url.startswith("/static/"):
+        return None
+    return STATIC_DIR / url[len("/static/"):]
+
+
+def _url_derivado(url: str, ancho: int, fmt: str) -> str:
+    base = url.rsplit(".", 1)[0]
+    return f"{base}_w{ancho}.{fmt}"
+
+
+def _formatos() -> list[str]:
+    global _avif_ok
+    fmts = [f for f in settings.IMG_FORMATOS if f in ("webp", "avif")]
+    if "avif" in fmts:
+        if _avif_ok is None:
+            try:
+                Image.new("RGB", (2, 2)).save(io.BytesIO(), "AVIF")
+                _avif_ok = True
+            except Exception:
+                _avif_ok = False
+                logger.info("[DERIVADOS] Pillow sin soporte AVIF: solo WebP")
+        if not _avif_ok:
+            fmts.remove("avif")
+    return fmts
+
+
+def generar_derivados_sync(path: Path) -> int:
+    """Genera (o regenera si el original es más nuevo) los derivados de `path`. Devuelve cuántos escribió."""
+    if Image is None or not path.is_file() or path.suffix.lower() not in EXTENSIONES or _es_derivado(path):
+        return 0
+    mtime = path.stat().st_mtime
+    escritos = 0
+    with Image.open(path) as original:
+        img = ImageOps.exif_transpose(original)
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        for fmt in _formatos():
+            for ancho in settings.IMG_ANCHOS:
+                destino = path.with_name(f"{path.stem}_w{ancho}.{fmt}")
+                if destino.is_file() and destino.stat().st_mtime >= mtime:
+                    continue
+                w = min(ancho, img.width)
+                copia = img.resize((w, max(1, round(img.height * w / img.width))), Image.LANCZOS)
+                opciones = {"method": 4} if fmt == "webp" else {}
+                copia.save(destino, fmt.upper(), quality=settings.IMG_CALIDAD, **opciones)
+                escritos += 1
+
+        lqip = path.with_name(f"{path.stem}_lqip.txt")
+        if not lqip.is_file() or lqip.stat().st_mtime < mtime:
+            h = max(1, round(img.height * ANCHO_LQIP / img.width))
+            mini = img.resize((ANCHO_LQIP, h), Image.BILINEAR).filter(ImageFilter.GaussianBlur(1))
+            buf = io.BytesIO()
+            mini.save(buf, "WEBP", quality=30)
+            lqip.write_text("data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode())
+            escritos += 1
+    return escritos
+
+
+async def generar_derivados(path: Path | str) -> int:
+    """Versión async: el trabajo de Pillow va a un hilo."""
+    path = Path(path)
+    try:
+        return await asyncio.to_thread(generar_derivados_sync, path)
+    except Exception as e:
+        logger.warning(f"[DERIVADOS] no se pudieron generar para {path.name}: {e}")
+        return 0
+
+
+def programar_derivados(path: Path | str) -> None:
+    """Lanza la generación en segundo plano (para subidas: no retrasa la respuesta)."""
+    tarea = asyncio.get_running_loop().create_task(generar_derivados(path))
+    _tareas.add(tarea)
+    tarea.add_done_callback(_tareas.discard)
+
+
+# ===========================
+#  Helpers de plantilla
+# ===========================
+def srcset(url: str, fmt: str = "webp") -> str:
+    """'…_w160.webp 160w, …_w320.webp 320w, …' con los derivados que existen ('' si ninguno)."""
+    path = _ruta_local(url)
+    if path is None:
+        return ""
+    partes = []
+    for ancho in settings.IMG_ANCHOS:
+        if path.with_name(f"{path.stem}_w{ancho}.{fmt}").is_file():
+            partes.append(f"{_url_derivado(url, ancho, fmt)} {ancho}w")
+    return ", ".join(partes)
+
+
+def placeholder(url: str) -> str:
+    path = _ruta_local(url)
+    if path is None:
+        return ""
+    lqip = path.with_name(f"{path.stem}_lqip.txt")
+    try:
+        return lqip.read_text()
+    except OSError:
+        return ""
+
+
+def img_responsive(url: str, alt: str = "", sizes: str = "120px", style: str = "", clase: str = "") -> Markup:
+    """<picture> con AVIF/WebP a varios anchos, carga diferida y placeholder borroso; cae al <img> original."""
+    url = url or ""
+    fuentes = []
+    for fmt in ("avif", "webp"):
+        s = srcset(url, fmt)
+        if s:
+            fuentes.append(f'<source type="image/{fmt}" srcset="{escape(s)}" sizes="{escape(sizes)}">')
+    lqip = placeholder(url)
+    estilo = style + (f";background:url({lqip}) center/cover no-repeat" if lqip else "")
+    atributos = f'src="{escape(url)}" alt="{escape(alt)}" loading="lazy" decoding="async"'
+    if clase:
+        atributos += f' class="{escape(clase)}"'
+    if estilo:
+        atributos += f' style="{escape(estilo)}"'
+    img = f"<img {atributos}>"
+    if not fuentes:
+        return Markup(img)
+    # display:contents -> el <img> se dimensiona respecto al contenedor, igual que sin <picture>
+    return Markup(f'<picture style="display:contents">{"".join(fuentes)}{img}</picture>')
+
+
+def registrar_en_plantillas(env) -> None:
+    env.globals.update(srcset=srcset, img_responsive=img_responsive, placeholder_imagen=placeholder)
+
+
+async def _backfill() -> None:
+    ficheros = [p for p in UPLOAD_DIR.iterdir() if p.suffix.lower() in EXTENSIONES and not _es_derivado(p)]
+    sem = asyncio.Semaphore(settings.IMG_CONCURRENCIA)
+
+    async def _uno(p: Path) -> int:
+        async with sem:
+            return await generar_derivados(p)
+
+    total = sum(await asyncio.gather(*(_uno(p) for p in ficheros)))
+    print(f"{len(ficheros)} imágenes revisadas, {total} derivados escritos")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if Image is None:
+        raise SystemExit("Pillow no está instalado (pip install pillow)")
+    asyncio.run(_backfill())
@@ -0,0 +1,189 @@
+# app/fake_openai.py
+"""
+Servidor falso compatible con la API de OpenAI, para medir la app sin gastar en la API de pago.
+
+Implementa lo que usa app/gateway_ia.py:
+  POST /v1/chat/completions   (normal y stream=True, en SSE como la API real)
+  POST /v1/images/generations (devuelve un PNG diminuto en b64_json)
+
+Uso:
+  python -m app.fake_openai --puerto 9100 --latencia-ms 800 --jitter-ms 300 --error-rate 0.05
+  OPENAI_BASE_URL=http://127.0.0.1:9100/v1 uvicorn app.main:app   (y el worker igual)
+
+La respuesta de chat se elige por el contenido del prompt: alternativas de ejercicio, análisis
+nutricional o, por defecto, un plan de entrenamiento (el JSON de --plan o uno de ejemplo).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 1x1 PNG transparente
+PNG_B64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+
+PLAN_EJEMPLO = {
+    "duracion": "4 semanas",
+    "plan": [
+        {
+            "semana": 1,
+            "dias": [
+                {
+                    "dia": dia,
+                    "tipo_entrenamiento": tipo,
+                    "ejercicios": [
+                        {"nombre": n, "series": 4, "repeticiones": "8-10", "motivo": "Ejercicio de prueba."}
+                        for n in ejercicios
+                    ],
+                    "consejo": "Calienta bien antes de empezar.",
+                }
+                for dia, tipo, ejercicios in [
+                    ("Lunes", "Torso", ["Press de banca con barra", "Remo con barra", "Press militar con barra"]),
+                    ("Miércoles", "Pierna", ["Sentadilla trasera con barra", "Peso muerto rumano con barra", "Zancadas"]),
+                    ("Viernes", "Full body", ["Dominadas", "Press inclinado con mancuernas", "Hip thrust"]),
+                ]
+            ],
+        }
+    ],
+    "consejos_generales": "Mantén una buena hidratación.",
+    "advertencias": "Detén el ejercicio ante dolor agudo.",
+}
+
+CONFIG = {
+    "latencia_ms": 800.0,
+    "jitter_ms": 300.0,
+    "error_rate": 0.0,
+    "token_ms": 5.0,      # pausa entre fragmentos en streaming
+    "fragmento": 24,      # caracteres por fragmento en streaming
+    "plan": PLAN_EJEMPLO,
+}
+STATS = {"chat": 0, "stream": 0, "imagenes": 0, "errores": 0}
+
+app = FastAPI(title="OpenAI falso")
+
+
+async def _latencia() -> None:
+    ms = max(0.0, random.gauss(CONFIG["latencia_ms"], CONFIG["jitter_ms"]))
+    await asyncio.sleep(ms / 1000)
+
+
+def _error_simulado() -> JSONResponse | None:
+    if random.random() >= CONFIG["error_rate"]:
+        return None
+    STATS["errores"] += 1
+    if random.random() < 0.5:
+        return JSONResponse(
+            {"error": {"message": "Rate limit (simulado)", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"retry-after": "1"},
+        )
+    return JSONResponse({"error": {"message": "Error interno (simulado)", "type": "server_error"}}, status_code=500)
+
+
+def _texto_respuesta(messages: list) -> str:
+    prompt = " ".join(
+        m["content"] if isinstance(m.get("content"), str)
+        else " ".join(p.get("text", "") for p in m.get("content") or [] if isinstance(p, dict))
+        for m in messages
+    ).lower()
+    if "alternativas de ejercicio" in prompt:
+        return json.dumps(["Press con mancuernas", "Press en máquina", "Flexiones lastradas"], ensure_ascii=False)
+    if "nutricionista" in prompt:
+        return json.dumps({"calorias": 520, "proteinas_g": 32.0, "carbohidratos_g": 55.0,
+                           "grasas_g": 18.0, "fibra_g": 6.0, "azucar_g": 9.0})
+    return json.dumps(CONFIG["plan"], ensure_ascii=False, indent=2)
+
+
+def _uso(messages: list, texto: str) -> dict:
+    entrada = sum(len(str(m.get("content", ""))) for m in messages) // 4
+    salida = len(texto) // 4
+    return {"prompt_tokens": entrada, "completion_tokens": salida, "total_tokens": entrada + salida}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await _latencia()
+    if (err := _error_simulado()) is not None:
+        return err
+
+    modelo = body.get("model", "gpt-4o")
+    messages = body.get("messages") or []
+    texto = _texto_respuesta(messages)
+    ident = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    creado = int(time.time())
+
+    if not body.get("stream"):
+        STATS["chat"] += 1
+        return {
+            "id": ident, "object": "chat.completion", "created": creado, "model": modelo,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": texto}}],
+            "usage": _uso(messages, texto),
+        }
+
+    STATS["stream"] += 1
+
+    async def _flujo():
+        def _chunk(delta: dict, fin: str | None = None) -> str:
+            datos = {"id": ident, "object": "chat.completion.chunk", "created": creado, "model": modelo,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": fin}]}
+            return f"data: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+        yield _chunk({"role": "assistant", "content": ""})
+        paso = CONFIG["fragmento"]
+        for i in range(0, len(texto), paso):
+            await asyncio.sleep(CONFIG["token_ms"] / 1000)
+            yield _chunk({"content": texto[i:i + paso]})
+        yield _chunk({}, "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            datos = {"id": ident, "object": "chat.completion.chunk", "created": creado, "model": modelo,
+                     "choices": [], "usage": _uso(messages, texto)}
+            yield f"data: {json.dumps(datos)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(_flujo(), media_type="text/event-stream")
+
+
+@app.post("/v1/images/generations")
+async def images_generations(request: Request):
+    await request.json()
+    await _latencia()
+    if (err := _error_simulado()) is not None:
+        return err
+    STATS["imagenes"] += 1
+    return {"created": int(time.time()), "data": [{"b64_json": PNG_B64}]}
+
+
+@app.get("/stats")
+async def stats():
+    return {**STATS, "config": {k: v for k, v in CONFIG.items() if k != "plan"}}
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Servidor OpenAI falso para pruebas de carga")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--puerto", type=int, default=9100)
+    p.add_argument("--latencia-ms", type=float, default=CONFIG["latencia_ms"])
+    p.add_argument("--jitter-ms", type=float, default=CONFIG["jitter_ms"])
+    p.add_argument("--error-rate", type=float, default=CONFIG["error_rate"], help="0..1, mitad 429 y mitad 500")
+    p.add_argument("--token-ms", type=float, default=CONFIG["token_ms"])
+    p.add_argument("--plan", help="Fichero JSON con la rutina a devolver (formato rutina_json)")
+    args = p.parse_args()
+
+    CONFIG.update(latencia_ms=args.latencia_ms, jitter_ms=args.jitter_ms,
+                  error_rate=args.error_rate, token_ms=args.token_ms)
+    if args.plan:
+        with open(args.plan, encoding="utf-8") as f:
+            CONFIG["plan"] = json.load(f)
+
+    uvicorn.run(app, host=args.host, port=args.puerto, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
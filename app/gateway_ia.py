@@ -0,0 +1,197 @@
+# app/gateway_ia.py
+"""
+Pasarela única para todas las llamadas a OpenAI.
+
+- Un solo AsyncOpenAI por proceso (y por API key) con pool HTTP persistente: la conexión TLS
+  se reutiliza entre peticiones en vez de abrirse en cada llamada.
+- Semáforo por modelo: limita cuántas llamadas simultáneas hay a cada modelo.
+- Token bucket por modelo: reparte las peticiones por minuto (IA_RPM) y absorbe ráfagas.
+- Reintentos con backoff exponencial + jitter ante 429 / 5xx / errores de red, respetando
+  Retry-After cuando la API lo envía. El cliente de OpenAI se crea con max_retries=0 para que
+  los reintentos se hagan solo aquí.
+- Cada llamada se anota en app.registro_ia (tabla ai_calls) con su `etiqueta` (la función de
+  app.utils que la hace), tokens, latencia, reintentos y coste.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+
+import httpx
+from fastapi import HTTPException
+from openai import (
+    AsyncOpenAI,
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    RateLimitError,
+)
+
+from app import registro_ia
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket asíncrono: `rate` fichas/s con capacidad `capacidad`."""
+
+    def __init__(self, rate: float, capacidad: float):
+        self.rate = rate
+        self.capacidad = capacidad
+        self._fichas = capacidad
+        self._ultimo = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _rellenar(self) -> None:
+        ahora = time.monotonic()
+        self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.rate)
+        self._ultimo = ahora
+
+    async def adquirir(self) -> None:
+        async with self._lock:  # en orden de llegada
+            self._rellenar()
+            if self._fichas < 1:
+                await asyncio.sleep((1 - self._fichas) / self.rate)
+                self._rellenar()
+            self._fichas -= 1
+
+
+_clientes: dict[str, AsyncOpenAI] = {}
+_semaforos: dict[str, asyncio.Semaphore] = {}
+_buckets: dict[str, TokenBucket] = {}
+
+
+def cliente(api_key: str | None = None) -> AsyncOpenAI:
+    """Cliente compartido (lazy). Lanza 401 controlado si no hay API key."""
+    key = (api_key or settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY") or "").strip()
+    if not key:
+        raise HTTPException(status_code=401, detail="OPENAI_API_KEY no está configurada")
+    c = _clientes.get(key)
+    if c is None:
+        http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.IA_POOL_MAX,
+                max_keepalive_connections=settings.IA_POOL_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(settings.IA_TIMEOUT_S, connect=10.0),
+        )
+        c = AsyncOpenAI(
+            api_key=key,
+            base_url=settings.OPENAI_BASE_URL or None,
+            max_retries=0,
+            http_client=http,
+        )
+        _clientes[key] = c
+    return c
+
+
+def _semaforo(modelo: str) -> asyncio.Semaphore:
+    sem = _semaforos.get(modelo)
+    if sem is None:
+        n = settings.IA_CONCURRENCIA_MODELO.get(modelo, settings.IA_CONCURRENCIA_DEFECTO)
+        sem = _semaforos[modelo] = asyncio.Semaphore(max(1, n))
+    return sem
+
+
+def _bucket(modelo: str) -> TokenBucket:
+    b = _buckets.get(modelo)
+    if b is None:
+        rpm = settings.IA_RPM.get(modelo, settings.IA_RPM_DEFECTO)
+        b = _buckets[modelo] = TokenBucket(rate=max(rpm, 1) / 60.0, capacidad=max(1, rpm // 10))
+    return b
+
+
+def _reintentable(e: Exception) -> bool:
+    if isinstance(e, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(e, APIStatusError) and e.status_code >= 500
+
+
+def _espera(intento: int, e: Exception) -> float:
+    # Retry-After (segundos) si la API lo indica; si no, backoff exponencial con full jitter
+    resp = getattr(e, "response", None)
+    retry_after = resp.headers.get("retry-after") if resp is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), settings.IA_BACKOFF_MAX_S)
+        except ValueError:
+            pass
+    techo = min(settings.IA_BACKOFF_MAX_S, settings.IA_BACKOFF_BASE_S * (2 ** intento))
+    return random.uniform(0, techo)
+
+
+async def _llamar(modelo: str, fn, etiqueta: str | None = None, tipo: str = "chat"):
+    """Ejecuta fn() con el semáforo y el bucket del modelo, reintentando los fallos transitorios."""
+    intento = 0
+    inicio = time.perf_counter()
+    while True:
+        await _bucket(modelo).adquirir()
+        try:
+            async with _semaforo(modelo):
+                respuesta = await fn()
+            registro_ia.anotar(etiqueta, modelo, tipo, inicio, intento, respuesta=respuesta)
+            return respuesta
+        except Exception as e:
+            if not _reintentable(e) or intento >= settings.IA_REINTENTOS:
+                registro_ia.anotar(etiqueta, modelo, tipo, inicio, intento, error=e)
+                raise
+            espera = _espera(intento, e)
+            intento += 1
+            logger.warning(f"[IA] {modelo}: {type(e).__name__}, reintento {intento} en {espera:.1f}s")
+            await asyncio.sleep(espera)
+
+
+async def chat(model: str, messages: list, api_key: str | None = None, etiqueta: str | None = None, **kwargs):
+    c = cliente(api_key)
+    return await _llamar(model, lambda: c.chat.completions.create(model=model, messages=messages, **kwargs), etiqueta)
+
+
+async def chat_stream(model: str, messages: list, api_key: str | None = None, etiqueta: str | None = None, **kwargs):
+    """
+    Igual que chat() pero en streaming: va devolviendo los fragmentos de texto según llegan.
+    Solo se reintenta si el fallo ocurre antes del primer fragmento (después ya se ha entregado texto).
+    """
+    c = cliente(api_key)
+    kwargs.setdefault("stream_options", {"include_usage": True})  # tokens en el último fragmento
+    intento = 0
+    inicio = time.perf_counter()
+    while True:
+        await _bucket(model).adquirir()
+        entregado = False
+        uso = (None, None)
+        try:
+            async with _semaforo(model):
+                stream = await c.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        uso = registro_ia.uso_de(chunk)
+                    if not chunk.choices:
+                        continue
+                    texto = chunk.choices[0].delta.content
+                    if texto:
+                        entregado = True
+                        yield texto
+            registro_ia.anotar(etiqueta, model, "stream", inicio, intento, uso=uso)
+            return
+        except Exception as e:
+            if entregado or not _reintentable(e) or intento >= settings.IA_REINTENTOS:
+                registro_ia.anotar(etiqueta, model, "stream", inicio, intento, error=e, uso=uso)
+                raise
+            espera = _espera(intento, e)
+            intento += 1
+            logger.warning(f"[IA] {model} (stream): {type(e).__name__}, reintento {intento} en {espera:.1f}s")
+            await asyncio.sleep(espera)
+
+
+async def imagen(model: str, prompt: str, api_key: str | None = None, etiqueta: str | None = None, **kwargs):
+    c = cliente(api_key)
+    return await _llamar(model, lambda: c.images.generate(model=model, prompt=prompt, **kwargs), etiqueta, "imagen")
+
+
+async def cerrar() -> None:
+    await registro_ia.volcar()
+    for c in _clientes.values():
+        await c.close()
+    _clientes.clear()
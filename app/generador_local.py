@@ -0,0 +1,183 @@
+# app/generador_local.py
+"""
+Generador de rutinas por reglas, sin IA. Construye en milisegundos un rutina_json válido a partir
+de los datos del FormularioCliente y del equipamiento del gimnasio (InfraestructuraGimnasio).
+
+Se usa como borrador instantáneo mientras la IA genera la versión definitiva y como respaldo
+cuando la IA falla o está desactivada (settings.RUTINA_SOLO_LOCAL).
+
+Reglas:
+  - días/semana según experiencia (3 / 4 / 5) y reparto full body / torso-pierna / torso-pierna-PPL;
+  - nº de ejercicios por sesión según los minutos disponibles (~10 min por ejercicio, 3..8);
+  - series/repeticiones según objetivo (fuerza, hipertrofia, pérdida de grasa, salud);
+  - cada hueco del día (patrón de movimiento) se llena con el primer ejercicio del catálogo
+    compatible con el equipamiento y el nivel; los días B rotan a la siguiente variante;
+  - semanas 2..N con el motor de progresión (app.progresion.expandir_plan).
+"""
+from app.progresion import expandir_plan
+from app.utils import normalizar_texto
+
+# Etiquetas de equipamiento deducidas del nombre de cada máquina del gimnasio
+_EQUIPO_POR_PALABRA = {
+    "barra": "barra", "olimpic": "barra", "rack": "rack", "jaula": "rack", "smith": "maquina",
+    "mancuerna": "mancuernas", "banco": "banco", "polea": "polea", "cable": "polea", "cruce": "polea",
+    "prensa": "prensa", "maquina": "maquina", "extension": "maquina", "femoral": "maquina",
+    "contractor": "maquina", "jalon": "polea", "dominada": "barra_dominadas", "paralela": "paralelas",
+    "kettlebell": "kettlebell", "pesa rusa": "kettlebell", "cinta": "cardio", "eliptica": "cardio",
+    "bici": "cardio", "spinning": "cardio", "remo ergometro": "cardio", "ergometro": "cardio",
+    "escaladora": "cardio", "trx": "trx", "goma": "bandas", "banda": "bandas",
+}
+# Sin equipamiento registrado se asume un gimnasio comercial estándar
+EQUIPO_ESTANDAR = {"barra", "rack", "mancuernas", "banco", "polea", "prensa", "maquina",
+                   "barra_dominadas", "paralelas", "cardio"}
+
+_NIVELES = {"principiante": 0, "intermedio": 1, "avanzado": 2}
+
+# (nombre, patrón, equipo requerido, nivel mínimo, motivo)
+CATALOGO: list[tuple[str, str, frozenset, int, str]] = [
+    ("Sentadilla trasera con barra", "sentadilla", frozenset({"barra", "rack"}), 1, "Fuerza general de tren inferior y core."),
+    ("Prensa de piernas", "sentadilla", frozenset({"prensa"}), 0, "Cuádriceps y glúteos con carga estable."),
+    ("Sentadilla goblet", "sentadilla", frozenset({"mancuernas"}), 0, "Patrón de sentadilla seguro y técnico."),
+    ("Sentadilla con peso corporal", "sentadilla", frozenset(), 0, "Aprende el patrón de sentadilla sin carga."),
+    ("Peso muerto rumano con barra", "bisagra", frozenset({"barra"}), 1, "Isquiotibiales y glúteos, cadena posterior."),
+    ("Peso muerto rumano con mancuernas", "bisagra", frozenset({"mancuernas"}), 0, "Cadena posterior con carga moderada."),
+    ("Hip thrust", "bisagra", frozenset({"banco"}), 0, "Glúteo mayor con bajo estrés lumbar."),
+    ("Puente de glúteos", "bisagra", frozenset(), 0, "Activación de glúteos sin material."),
+    ("Press de banca con barra", "empuje_h", frozenset({"barra", "banco"}), 1, "Fuerza de pectoral, deltoide anterior y tríceps."),
+    ("Press de banca con mancuernas", "empuje_h", frozenset({"mancuernas", "banco"}), 0, "Pectoral con mayor rango y trabajo unilateral."),
+    ("Press de pecho en máquina", "empuje_h", frozenset({"maquina"}), 0, "Empuje horizontal guiado."),
+    ("Flexiones", "empuje_h", frozenset(), 0, "Empuje horizontal con peso corporal."),
+    ("Press militar con barra", "empuje_v", frozenset({"barra"}), 1, "Fuerza de hombros y estabilidad del tronco."),
+    ("Press de hombros con mancuernas", "empuje_v", frozenset({"mancuernas"}), 0, "Deltoides con recorrido libre."),
+    ("Flexiones pica", "empuje_v", frozenset(), 0, "Empuje vertical sin material."),
+    ("Remo con barra", "tiron_h", frozenset({"barra"}), 1, "Espalda media y dorsal."),
+    ("Remo en polea baja", "tiron_h", frozenset({"polea"}), 0, "Espalda media con tensión constante."),
+    ("Remo con mancuerna a una mano", "tiron_h", frozenset({"mancuernas", "banco"}), 0, "Dorsal y romboides, trabajo unilateral."),
+    ("Remo invertido en TRX", "tiron_h", frozenset({"trx"}), 0, "Tirón horizontal con peso corporal."),
+    ("Dominadas", "tiron_v", frozenset({"barra_dominadas"}), 2, "Dorsal ancho y bíceps con peso corporal."),
+    ("Jalón al pecho", "tiron_v", frozenset({"polea"}), 0, "Dorsal ancho con carga ajustable."),
+    ("Jalón con banda elástica", "tiron_v", frozenset({"bandas"}), 0, "Tirón vertical con poco material."),
+    ("Zancadas con mancuernas", "zancada", frozenset({"mancuernas"}), 0, "Pierna unilateral y equilibrio."),
+    ("Sentadilla búlgara", "zancada", frozenset({"banco"}), 1, "Cuádriceps y glúteo unilateral."),
+    ("Zancadas alternas", "zancada", frozenset(), 0, "Pierna unilateral sin material."),
+    ("Curl femoral en máquina", "femoral", frozenset({"maquina"}), 0, "Aislamiento de isquiotibiales."),
+    ("Peso muerto a una pierna", "femoral", frozenset(), 1, "Isquios y estabilidad de cadera."),
+    ("Elevaciones laterales", "hombro", frozenset({"mancuernas"}), 0, "Deltoides lateral."),
+    ("Face pull en polea", "hombro", frozenset({"polea"}), 0, "Deltoides posterior y salud del hombro."),
+    ("Curl de bíceps con mancuernas", "biceps", frozenset({"mancuernas"}), 0, "Aislamiento de bíceps."),
+    ("Curl de bíceps en polea", "biceps", frozenset({"polea"}), 0, "Bíceps con tensión constante."),
+    ("Extensión de tríceps en polea", "triceps", frozenset({"polea"}), 0, "Aislamiento de tríceps."),
+    ("Fondos en paralelas", "triceps", frozenset({"paralelas"}), 1, "Tríceps y pectoral inferior."),
+    ("Fondos en banco", "triceps", frozenset({"banco"}), 0, "Tríceps con peso corporal."),
+    ("Elevación de gemelos", "gemelo", frozenset(), 0, "Gemelos y estabilidad del tobillo."),
+    ("Plancha frontal", "core", frozenset(), 0, "Estabilidad del core."),
+    ("Pallof press", "core", frozenset({"polea"}), 0, "Antirrotación del tronco."),
+    ("Dead bug", "core", frozenset(), 0, "Control lumbopélvico."),
+    ("Cardio en máquina (intervalos)", "cardio", frozenset({"cardio"}), 0, "Capacidad aeróbica y gasto calórico."),
+    ("Swing con kettlebell", "cardio", frozenset({"kettlebell"}), 1, "Potencia de cadera y acondicionamiento."),
+    ("Circuito de saltos y escaladores", "cardio", frozenset(), 0, "Acondicionamiento sin material."),
+    ("Movilidad de cadera y columna torácica", "movilidad", frozenset(), 0, "Rango de movimiento y prevención de lesiones."),
+]
+
+# Patrones por tipo de sesión, ordenados por prioridad (los primeros siempre entran)
+_SESIONES = {
+    "Full body": ["sentadilla", "empuje_h", "tiron_h", "bisagra", "empuje_v", "tiron_v", "core", "zancada"],
+    "Torso": ["empuje_h", "tiron_v", "empuje_v", "tiron_h", "hombro", "biceps", "triceps", "core"],
+    "Pierna": ["sentadilla", "bisagra", "zancada", "femoral", "gemelo", "core", "sentadilla", "bisagra"],
+    "Empuje": ["empuje_h", "empuje_v", "triceps", "hombro", "empuje_h", "core"],
+    "Tirón": ["tiron_v", "tiron_h", "biceps", "hombro", "bisagra", "core"],
+}
+_REPARTOS = {
+    3: [("Lunes", "Full body", 0), ("Miércoles", "Full body", 1), ("Viernes", "Full body", 0)],
+    4: [("Lunes", "Torso", 0), ("Martes", "Pierna", 0), ("Jueves", "Torso", 1), ("Viernes", "Pierna", 1)],
+    5: [("Lunes", "Torso", 0), ("Martes", "Pierna", 0), ("Miércoles", "Empuje", 1),
+        ("Jueves", "Tirón", 1), ("Viernes", "Pierna", 1)],
+}
+
+
+def equipo_desde_maquinas(maquinas) -> set[str]:
+    """Etiquetas de equipamiento a partir de los nombres de InfraestructuraGimnasio (lista o 'a, b, c')."""
+    if isinstance(maquinas, str):
+        maquinas = [m for m in maquinas.split(",")]
+    equipo: set[str] = set()
+    for m in maquinas or []:
+        nombre = normalizar_texto(m)
+        equipo |= {tag for palabra, tag in _EQUIPO_POR_PALABRA.items() if palabra in nombre}
+    return equipo or set(EQUIPO_ESTANDAR)
+
+
+def _esquema(objetivos: list[str], preferencias: list[str], nivel: int) -> tuple[int, str, str]:
+    """(series, repeticiones, descripción) según objetivo."""
+    if "fuerza" in preferencias:
+        return (4 if nivel else 3), "5-8", "fuerza"
+    if "ganar_masa" in objetivos or "estetica" in preferencias:
+        return (4 if nivel == 2 else 3), "8-12", "hipertrofia"
+    if "perder_peso" in objetivos or "resistencia" in preferencias:
+        return 3, "12-15", "pérdida de grasa / resistencia"
+    return 3, "10-12", "salud general"
+
+
+def _elegir(patron: str, equipo: set[str], nivel: int, variante: int, usados: set[str]):
+    candidatos = [e for e in CATALOGO if e[1] == patron and e[2] <= equipo and e[3] <= nivel and e[0] not in usados]
+    if not candidatos:
+        return None
+    # Las variantes sin material solo si el gimnasio no tiene nada mejor para ese patrón
+    con_material = [e for e in candidatos if e[2]] or candidatos
+    return con_material[variante % len(con_material)]
+
+
+def generar_rutina_local(form_data: dict, maquinas=None, semanas: int | None = None) -> dict:
+    """rutina_json completo ({duracion, plan, consejos_generales, advertencias}) sin llamar a la IA."""
+    nivel = _NIVELES.get(normalizar_texto(form_data.get("experiencia_entrenamiento")), 0)
+    objetivos = [normalizar_texto(o) for o in form_data.get("objetivos_entrenamiento") or []]
+    preferencias = [normalizar_texto(p) for p in form_data.get("preferencias_entrenamiento") or []]
+    try:
+        minutos = int(form_data.get("tiempo_disponible") or 60)
+    except (TypeError, ValueError):
+        minutos = 60
+    n_ejercicios = max(3, min(8, minutos // 10))
+    semanas = max(1, int(semanas or form_data.get("semanas") or 4))
+    equipo = equipo_desde_maquinas(maquinas)
+
+    series, reps, enfoque = _esquema(objetivos, preferencias, nivel)
+    extra_cardio = "perder_peso" in objetivos or "resistencia" in preferencias
+    extra_movilidad = "movilidad" in preferencias or "mejorar_salud" in objetivos
+
+    dias = []
+    for dia, sesion, variante in _REPARTOS[3 + nivel]:
+        huecos = n_ejercicios - int(extra_cardio) - int(extra_movilidad)
+        patrones = _SESIONES[sesion][:max(2, huecos)]
+        if extra_movilidad:
+            patrones = ["movilidad"] + patrones
+        if extra_cardio:
+            patrones = patrones + ["cardio"]
+        usados: set[str] = set()
+        ejercicios = []
+        for patron in patrones:
+            elegido = _elegir(patron, equipo, nivel, variante, usados)
+            if not elegido:
+                continue
+            nombre, patron, _, _, motivo = elegido
+            usados.add(nombre)
+            if patron in ("cardio", "movilidad", "core"):
+                ej = {"nombre": nombre, "series": 2 if patron != "cardio" else 1,
+                      "repeticiones": "45s" if patron == "core" else ("10 min" if patron == "cardio" else "5 min")}
+            else:
+                ej = {"nombre": nombre, "series": series, "repeticiones": reps}
+            ej["motivo"] = motivo
+            ejercicios.append(ej)
+        dias.append({
+            "dia": dia,
+            "tipo_entrenamiento": sesion,
+            "ejercicios": ejercicios,
+            "consejo": "Calienta 5-10 minutos y deja 1-3 repeticiones en recámara en cada serie.",
+        })
+
+    base = {
+        "duracion": f"{semanas} semanas",
+        "plan": [{"semana": 1, "dias": dias}],
+        "consejos_generales": f"Rutina orientada a {enfoque}. Sube el peso cuando completes el rango alto de repeticiones con buena técnica.",
+        "advertencias": "Detén el ejercicio ante dolor agudo. Consulta a un profesional si tienes lesiones previas.",
+        "generada": "local",
+    }
+    return expandir_plan(base, semanas, form_data.get("experiencia_entrenamiento"))
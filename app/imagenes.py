@@ -0,0 +1,227 @@
+# app/imagenes.py
+import asyncio
+import base64
+import logging
+import re
+from pathlib import Path
+
+import aiohttp
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.config import settings
+from app.derivados import generar_derivados
+from app.utils import generar_imagen_ejercicio
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = Path(__file__).resolve().parent / "static" / "uploads"
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+ESTILO_DEFECTO = "realista"
+
+# Contadores del registro de imágenes (por proceso); se consultan en /diag/imagenes-cache
+CACHE_STATS = {"hits": 0, "misses": 0}
+
+
+def _safe_slug(s: str) -> str:
+    s = re.sub(r"[^\w\s-]", "", s, flags=re.UNICODE).strip().lower()
+    return re.sub(r"[-\s]+", "_", s)
+
+
+def clave_imagen(slug: str, estilo: str = ESTILO_DEFECTO) -> str:
+    return f"{estilo}:{slug}"
+
+
+def _fichero_imagen(slug: str, estilo: str) -> str:
+    # Nombre determinista: la misma clave siempre apunta al mismo fichero
+    return f"ia_{slug}__{estilo}.png"
+
+
+def _existe_local(url: str) -> bool:
+    return url.startswith("/static/uploads/") and (UPLOAD_DIR / url.rsplit("/", 1)[-1]).is_file()
+
+
+async def descargar_imagen_ia(url: str, filename: str, session: aiohttp.ClientSession | None = None) -> str | None:
+    """Guarda en UPLOAD_DIR una imagen (data URI o URL). Con `session` reutiliza su pool de conexiones."""
+    path = UPLOAD_DIR / filename
+    try:
+        if url.startswith("data:image/"):
+            _, b64 = url.split(",", 1)
+            with open(path, "wb") as f:
+                f.write(base64.b64decode(b64))
+            await generar_derivados(path)
+            return f"/static/uploads/{filename}"
+        if session is None:
+            async with aiohttp.ClientSession() as propia:
+                return await descargar_imagen_ia(url, filename, propia)
+        async with session.get(url) as resp:
+            if resp.status != 200:
+                return None
+            data = await resp.read()
+        with open(path, "wb") as f:
+            f.write(data)
+        await generar_derivados(path)
+        return f"/static/uploads/{filename}"
+    except Exception:
+        return None
+
+
+# ===========================
+#  Registro de imágenes
+# ===========================
+async def buscar_imagenes(db: AsyncSession, slugs: list[str], estilo: str = ESTILO_DEFECTO) -> dict[str, str]:
+    """
+    Devuelve {slug: imagen_url} para los slugs ya registrados (y cuyo fichero sigue en disco).
+    Solo lee: el uso se anota con anotar_usos en la escritura final, para no dejar filas del
+    registro bloqueadas mientras se generan las imágenes que faltan.
+    """
+    slugs = list(dict.fromkeys(s for s in slugs if s))
+    if not slugs:
+        return {}
+    claves = {clave_imagen(s, estilo): s for s in slugs}
+    res = await db.execute(
+        select(models.ImagenEjercicio.clave, models.ImagenEjercicio.imagen_url)
+        .where(models.ImagenEjercicio.clave.in_(list(claves)))
+    )
+    encontradas = {claves[c]: url for c, url in res.all() if _existe_local(url)}
+    CACHE_STATS["hits"] += len(encontradas)
+    CACHE_STATS["misses"] += len(slugs) - len(encontradas)
+    return encontradas
+
+
+async def anotar_usos(db: AsyncSession, slugs, estilo: str = ESTILO_DEFECTO) -> None:
+    """usos + 1 de las imágenes reutilizadas (justo antes del commit final de quien llama)."""
+    claves = sorted(clave_imagen(s, estilo) for s in slugs)
+    if claves:
+        await db.execute(
+            update(models.ImagenEjercicio)
+            .where(models.ImagenEjercicio.clave.in_(claves))
+            .values(usos=models.ImagenEjercicio.usos + 1, ultimo_uso=func.now())
+        )
+
+
+async def registrar_imagenes(db: AsyncSession, urls: dict[str, str], estilo: str = ESTILO_DEFECTO) -> None:
+    """Guarda/actualiza {slug: imagen_url} en el registro (upsert por clave)."""
+    if not urls:
+        return
+    stmt = pg_insert(models.ImagenEjercicio).values([
+        {"clave": clave_imagen(slug, estilo), "slug": slug, "estilo": estilo, "imagen_url": url, "usos": 1}
+        for slug, url in urls.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.ImagenEjercicio.clave],
+        set_={"imagen_url": stmt.excluded.imagen_url, "ultimo_uso": func.now()},
+    )
+    await db.execute(stmt)
+
+
+async def _imagen_para_ejercicio(nombre: str, motivo: str, estilo: str = ESTILO_DEFECTO) -> str | None:
+    """Genera la imagen IA de un ejercicio y la guarda en local. Devuelve la ruta /static/... o None."""
+    url_tmp = await generar_imagen_ejercicio(nombre, motivo)
+    return await descargar_imagen_ia(url_tmp, _fichero_imagen(_safe_slug(nombre), estilo))
+
+
+async def imagen_ejercicio(db: AsyncSession, nombre: str, motivo: str = "", estilo: str = ESTILO_DEFECTO) -> str | None:
+    """
+    Imagen local de un ejercicio: primero el registro; si no está, la genera con IA y la registra.
+    Propaga las HTTPException de generar_imagen_ejercicio.
+    """
+    slug = _safe_slug(nombre)
+    encontradas = await buscar_imagenes(db, [slug], estilo)
+    if slug in encontradas:
+        await anotar_usos(db, [slug], estilo)
+        await db.commit()
+        return encontradas[slug]
+    await db.commit()  # no retener la conexión mientras responde la IA
+    url_local = await _imagen_para_ejercicio(nombre, motivo, estilo)
+    if url_local:
+        await registrar_imagenes(db, {slug: url_local}, estilo)
+        await db.commit()
+    return url_local
+
+
+async def generar_imagenes_plan(
+    rutina: dict,
+    db: AsyncSession | None = None,
+    concurrencia: int | None = None,
+    timeout_s: float | None = None,
+    estilo: str = ESTILO_DEFECTO,
+    solo_registro: bool = False,
+) -> dict:
+    """
+    Añade 'imagen_url' a todos los ejercicios de rutina['plan'] generando las imágenes en paralelo.
+
+    - Si se pasa `db`, antes de llamar a la IA se consulta el registro de imágenes (una sola query);
+      los ejercicios ya conocidos se resuelven al instante y los nuevos se registran al terminar.
+    - Un mismo ejercicio repetido en varias semanas/días se genera UNA sola vez.
+    - Como mucho `concurrencia` llamadas simultáneas a la API (settings.IMG_CONCURRENCIA).
+    - Cada ejercicio tiene su propio timeout (settings.IMG_TIMEOUT_S).
+    - Si un ejercicio falla o se pasa de tiempo se deja imagen_url="" (el usuario puede pulsar "🪄")
+      y el resto del plan sigue adelante.
+    - Con solo_registro=True no se llama a la IA: solo se rellenan las imágenes ya registradas.
+
+    Devuelve {"cache": n, "generadas": n, "fallidas": m}.
+    """
+    concurrencia = max(1, concurrencia or settings.IMG_CONCURRENCIA)
+    timeout_s = timeout_s or settings.IMG_TIMEOUT_S
+
+    # Agrupa las apariciones de cada ejercicio por su slug
+    grupos: dict[str, list[dict]] = {}
+    for semana in rutina.get("plan", []) or []:
+        for dia in semana.get("dias", []) or []:
+            for ej in dia.get("ejercicios", []) or []:
+                nombre = (ej.get("nombre") or "").strip()
+                if not nombre:
+                    continue
+                grupos.setdefault(_safe_slug(nombre), []).append(ej)
+
+    en_cache = await buscar_imagenes(db, list(grupos), estilo) if db is not None else {}
+    for slug, url in en_cache.items():
+        for a in grupos.pop(slug):
+            a["imagen_url"] = url
+
+    if solo_registro:
+        for apariciones in grupos.values():
+            for a in apariciones:
+                a.setdefault("imagen_url", "")
+        if db is not None:
+            await anotar_usos(db, en_cache, estilo)
+            await db.commit()
+        return {"cache": len(en_cache), "generadas": 0, "fallidas": 0}
+    if db is not None:
+        await db.commit()  # cierra la transacción de la consulta: la IA puede tardar minutos
+
+    sem = asyncio.Semaphore(concurrencia)
+
+    async def _una(slug: str, apariciones: list[dict]) -> tuple[str, str | None]:
+        ej = apariciones[0]
+        nombre = ej.get("nombre", "")
+        async with sem:
+            try:
+                url_local = await asyncio.wait_for(
+                    _imagen_para_ejercicio(nombre, ej.get("motivo", ""), estilo), timeout=timeout_s
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"[IMG-IA] timeout ({timeout_s}s) generando '{nombre}'")
+                url_local = None
+            except Exception as e:
+                logger.warning(f"[IMG-IA] fallo generando '{nombre}': {e}")
+                url_local = None
+        for a in apariciones:
+            a["imagen_url"] = url_local or ""
+        return slug, url_local
+
+    resultados = await asyncio.gather(*(_una(s, a) for s, a in grupos.items()))
+    nuevas = {slug: url for slug, url in resultados if url}
+
+    if db is not None:
+        await anotar_usos(db, en_cache, estilo)
+        await registrar_imagenes(db, nuevas, estilo)
+        await db.commit()
+
+    stats = {"cache": len(en_cache), "generadas": len(nuevas), "fallidas": len(resultados) - len(nuevas)}
+    logger.info(f"[IMG-IA] plan: {len(en_cache) + len(resultados)} ejercicios únicos -> {stats}")
+    return stats
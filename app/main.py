@@ -3,14 +3,14 @@
 # ───────────────────────────────
 import os
 import re
-from datetime import datetime, date, timedelta  # <-- Añadir timedelta
+import asyncio
+from datetime import datetime, date, timedelta, timezone  # <-- Añadir timedelta
 import datetime as _dt
 from app.utils import analizar_nutricion_imagen
 from pydantic import ValidationError
 import json
 from sqlalchemy import inspect as sa_inspect  # ← evita conflicto con stdlib
 import uuid
-import base64
 import shutil
 import inspect as py_inspect  # ← si necesitas stdlib inspect
 import logging
@@ -29,8 +29,6 @@ from dotenv import load_dotenv
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 import aiohttp
-import openai
-from openai import AsyncOpenAI
 # En main.py, cambia esta línea:
 from sqlalchemy import select, insert, update
 
@@ -41,10 +39,10 @@ from sqlalchemy import select, insert, update, func  # <-- AÑADIR func
 # ───────────────────────────────
 from fastapi import (
     FastAPI, APIRouter, Request, Depends, HTTPException, Form,
-    UploadFile, File, Query, Cookie
+    UploadFile, File, Query, Cookie, Body, WebSocket
 )
 from fastapi.responses import (
-    HTMLResponse, JSONResponse, RedirectResponse
+    HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 )
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
@@ -66,12 +64,13 @@ BASE_DIR = Path(__file__).resolve().parent
 load_dotenv(BASE_DIR.parent / ".env")
 
 from app import models, crud, schemas
-from app.database import engine, Base, get_db  # engine ASYNC ya configurado
+from app.database import engine, Base, get_db, SessionLocal  # engine ASYNC ya configurado
+from app.config import settings
 from app.models import (
     Usuario, Gimnasio, UsuarioGimnasio, SesionEntreno, RegistroComida,
     Entrenamiento, Plan, UsuarioPlan, Dieta, InfraestructuraGimnasio,
     FormularioCliente, FormularioDieta, FormularioMixto,
-    Rutina, PlanMixtoGenerado, DietaGenerada
+    Rutina
 )
 from app.crud import (
     crear_o_actualizar_formulario,
@@ -83,16 +82,30 @@ from app.schemas import (
 )
 from app.utils import (
     generar_imagen_ejercicio,
-    generar_alternativas_ia,
-    generar_rutina_ia,
     generar_dieta_ia,
     ajustar_rutina_ia,
     construir_prompt,
-    construir_prompt_mixto,
     construir_prompt_dieta,
     construir_prompt_alternativas,
     get_current_user_from_token,
 )
+from app.imagenes import _existe_local, _safe_slug, descargar_imagen_ia, generar_imagenes_plan, imagen_ejercicio, CACHE_STATS
+from app.catalogo import anadir_alias, imagenes_por_id, resolver_ejercicios, sembrar_catalogo, slug_ejercicio, vincular_plan
+from app.trabajos import encolar_trabajo, trabajo_a_dict
+from app.generador_local import generar_rutina_local
+from app.derivados import programar_derivados, registrar_en_plantillas
+from app.reparar_imagenes import _stats_vacias, reparar_rutinas
+from app import gateway_ia, registro_ia
+from app.cache_ia import alternativas_cacheadas, purgar_alternativas, estadisticas_cache
+from app.cache_planes import estadisticas_planes, purgar_planes
+from app.series import registrar_series, ultimos_sets, estados_por_ejercicio, historial_columnar, leer_cursor
+from app.records import records_ejercicio, records_recientes
+from app.prediction import suggest_next_loads
+from app.carga_inicial import carga_base
+from app.sesiones import guardar_sesion_detallada
+from app.sincronizacion import sincronizar, eventos_desde
+from app.sesion_en_vivo import CanalSesion
+from sqlalchemy.orm.attributes import flag_modified
 
 # ───────────────────────────────
 # ⚙️ App y config
@@ -114,6 +127,7 @@ if not os.getenv("OPENAI_API_KEY"):
 router = APIRouter()
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
 templates.env.globals["DEFAULT_AVATAR_REL"] = DEFAULT_AVATAR_REL
+registrar_en_plantillas(templates.env)  # srcset / img_responsive
 UPLOAD_DIR = BASE_DIR / "static" / "uploads"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -144,12 +158,19 @@ async def startup():
         await conn.run_sync(Base.metadata.create_all)
     logger.info("DB OK: metadata revisada/creada")
 
+    try:
+        async with SessionLocal() as db:
+            await sembrar_catalogo(db)  # idempotente: ejercicios base + alias
+    except Exception as e:
+        logger.warning("No se pudo sembrar el catálogo de ejercicios (¿falta alembic upgrade?): %s", e)
+
 
 
 @app.on_event("shutdown")
 async def shutdown() -> None:
     try:
         await engine.dispose()
+        await gateway_ia.cerrar()
         logger.info("Engine disposed correctamente")
     except Exception as e:
         logger.warning("Error al cerrar engine: %s", e)
@@ -174,9 +195,6 @@ async def get_template_context(request: Request, db: AsyncSession = Depends(get_
         "DEFAULT_AVATAR_REL": DEFAULT_AVATAR_REL
     }
 
-def _safe_slug(s: str) -> str:
-    s = re.sub(r"[^\w\s-]", "", s, flags=re.UNICODE).strip().lower()
-    return re.sub(r"[-\s]+", "_", s)
 # Montar carpeta static y templates usando rutas absolutas
 
 # --- KPIs helpers ---
@@ -230,24 +248,6 @@ async def all_exception_handler(request: Request, exc: Exception):
     tb = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
     return PlainTextResponse(f"GENERIC ERROR:\n{tb}", status_code=500)
 
-async def descargar_imagen_ia(url: str, filename: str) -> str | None:
-    path = UPLOAD_DIR / filename
-    try:
-        if url.startswith("data:image/"):
-            _, b64 = url.split(",", 1)
-            with open(path, "wb") as f:
-                f.write(base64.b64decode(b64))
-            return f"/static/uploads/{filename}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                if resp.status != 200:
-                    return None
-                data = await resp.read()
-        with open(path, "wb") as f:
-            f.write(data)
-        return f"/static/uploads/{filename}"
-    except Exception:
-        return None
 async def get_current_user(request: Request, db: AsyncSession = Depends(get_db),
                            access_token: str | None = Cookie(default=None)):
     if access_token is None:
@@ -268,9 +268,34 @@ async def get_current_user(request: Request, db: AsyncSession = Depends(get_db),
         logger.warning(f"Usuario no encontrado: {email}")
         raise HTTPException(status_code=404, detail="User not found")
 
+    # quién provoca las llamadas IA de esta petición (registro ai_calls)
+    ruta = getattr(request.scope.get("route"), "path", request.url.path)
+    registro_ia.fijar_contexto(usuario_id=usuario.id, origen=f"{request.method} {ruta}")
     return {"id": usuario.id, "email": email, "rol": rol}
 
 
+async def get_staff_user(user = Depends(get_current_user)):
+    """Solo personal de la plataforma (ADMIN_EMAILS): endpoints /admin y diagnósticos con datos de todos."""
+    if (user["email"] or "").lower() not in {e.strip().lower() for e in settings.ADMIN_EMAILS}:
+        raise HTTPException(status_code=403, detail="Solo para administradores")
+    return user
+
+
+async def usuario_websocket(websocket: WebSocket, db: AsyncSession) -> dict | None:
+    """Lo mismo que get_current_user para un WebSocket (cookie access_token), una vez al conectar."""
+    token = websocket.cookies.get("access_token")
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    usuario = await crud.get_usuario_por_email(db, payload.get("sub"))
+    if usuario is None:
+        return None
+    return {"id": usuario.id, "email": usuario.email, "rol": payload.get("rol")}
+
+
 def role_required(required_roles: list[str]):
     def wrapper(current_user=Depends(get_current_user)):
         if current_user["rol"] not in required_roles:
@@ -285,65 +310,65 @@ def role_required(required_roles: list[str]):
 async def api_generar_imagen_ejercicio(
     rutina_id: int,
     nombre: str,
+    exercise_id: int | None = None,
     db: AsyncSession = Depends(get_db),
     user = Depends(get_current_user),
 ):
-    logger.info(f"[IMG-IA] req rutina_id={rutina_id} nombre='{nombre}' user={user['email']}")
+    logger.info(f"[IMG-IA] req rutina_id={rutina_id} nombre='{nombre}' exercise_id={exercise_id} user={user['email']}")
     try:
         rutina = await db.get(models.Rutina, rutina_id)
         if not rutina or rutina.usuario_id != user["id"]:
             raise HTTPException(404, "Rutina no encontrada")
 
-        # localizar ejercicio
+        # ejercicio del catálogo: por id, o por nombre normalizado (rutinas guardadas antes del catálogo)
+        if exercise_id is None:
+            exercise_id = (await resolver_ejercicios(db, [nombre])).get(slug_ejercicio(nombre))
+        ejercicio = await db.get(models.Exercise, exercise_id) if exercise_id else None
+
+        # apariciones en el plan (todas las semanas comparten imagen)
         plan = rutina.rutina_json or {}
-        objetivo = None
-        for semana in plan.get("plan", []):
-            for dia in semana.get("dias", []):
-                for ej in dia.get("ejercicios", []):
-                    if (ej.get("nombre") or "").strip().lower() == nombre.strip().lower():
-                        objetivo = ej
-                        break
-                if objetivo: break
-            if objetivo: break
-        if not objetivo:
+        slug = slug_ejercicio(nombre)
+        objetivos = [
+            ej for semana in plan.get("plan", []) for dia in semana.get("dias", []) for ej in dia.get("ejercicios", [])
+            if (exercise_id and ej.get("exercise_id") == exercise_id) or slug_ejercicio(ej.get("nombre")) == slug
+        ]
+        if not objetivos:
             raise HTTPException(404, "Ejercicio no existe en la rutina")
+        objetivo = objetivos[0]
 
-        # ya local
+        # imagen canónica del catálogo o ya local en el plan
+        url_local = ejercicio.imagen_url if ejercicio and _existe_local(ejercicio.imagen_url or "") else None
         url_existente = (objetivo.get("imagen_url") or "").strip()
-        if url_existente.startswith("/static/uploads/"):
-            logger.info(f"[IMG-IA] ya local -> {url_existente}")
-            return {"url": url_existente}
+        if not url_local and url_existente.startswith("/static/uploads/") and _existe_local(url_existente):
+            url_local = url_existente
 
         # normalizar si era remota previa
-        if url_existente.startswith(("http://", "https://", "data:image/")):
+        if not url_local and url_existente.startswith(("http://", "https://", "data:image/")):
             fname_old = f"ia_{_safe_slug(nombre)}_{uuid.uuid4().hex}.png"
-            url_local_old = await descargar_imagen_ia(url_existente, fname_old)
-            if url_local_old:
-                objetivo["imagen_url"] = url_local_old
-                rutina.rutina_json = plan
-                await db.commit()
-                logger.info(f"[IMG-IA] normalizada previa -> {url_local_old}")
-                return {"url": url_local_old}
-
-        # GENERAR IA
-        motivo = objetivo.get("motivo", "")
-        url_tmp = await generar_imagen_ejercicio(nombre, motivo)
-        logger.info(f"[IMG-IA] OpenAI OK, tipo={'data' if url_tmp.startswith('data:') else 'url'}")
+            url_local = await descargar_imagen_ia(url_existente, fname_old)
+            if url_local:
+                logger.info(f"[IMG-IA] normalizada previa -> {url_local}")
 
-        # GUARDAR LOCAL SIEMPRE
-        fname = f"ia_{_safe_slug(nombre)}_{uuid.uuid4().hex}.png"
-        url_local = await descargar_imagen_ia(url_tmp, fname)
+        # REGISTRO DE IMÁGENES o GENERAR IA (se guarda local siempre)
+        if not url_local:
+            url_local = await imagen_ejercicio(db, nombre, objetivo.get("motivo", ""))
         if not url_local:
             logger.error("[IMG-IA] descargar_imagen_ia() devolvió None")
             raise HTTPException(502, "No se pudo guardar la imagen generada")
 
         try:
-            objetivo["imagen_url"] = url_local
-            rutina.rutina_json = plan
+            for ej in objetivos:
+                ej["imagen_url"] = url_local
+                if exercise_id:
+                    ej["exercise_id"] = exercise_id
+            flag_modified(rutina, "rutina_json")
+            if ejercicio and not _existe_local(ejercicio.imagen_url or ""):
+                ejercicio.imagen_url = url_local  # pasa a ser la canónica para todas las rutinas
             await db.commit()
         except Exception as e:
             await db.rollback()
             raise HTTPException(500, f"Error guardando la imagen en la BD: {e}")
+        return {"url": url_local, "exercise_id": exercise_id}
 
     except HTTPException:
         raise
@@ -380,53 +405,61 @@ async def sugerencia_inicial(
     2) Si NO hay histórico: usa heurística por patrón + peso corporal si existe.
     Solo se usa como 'seed' en la SEMANA 1.
     """
-    # 1) Si hay historial, usa tu predictor actual
-    sets = await _ultimos_sets_usuario(db, usuario_id, ejercicio_nombre)
-    load, _ = _sugerir_carga_desde_sets(sets, target_reps=(5, 8), micro_step=micro_step)
-    if load:
-        return load
-
-    # 2) Heurística sin historial
-    bw = await _peso_usuario(db, usuario_id) or 70.0  # fallback 70 kg
-    name = (ejercicio_nombre or "").lower()
-
-    # Mapa de arranque (novato/intermedio bajo) orientativo
-    # % sobre peso corporal para compuestos; valores fijos para mancuernas/máquinas.
-    base = None
-    if any(k in name for k in ["sentadilla", "squat"]):
-        base = 0.7 * bw
-    elif any(k in name for k in ["peso muerto", "deadlift", "hip hinge"]):
-        base = 0.9 * bw
-    elif any(k in name for k in ["press banca", "bench", "press de banca"]):
-        base = 0.6 * bw
-    elif any(k in name for k in ["press militar", "overhead", "hombro barra"]):
-        base = 0.35 * bw
-    elif any(k in name for k in ["dominada", "pull-up", "chin-up"]):
-        # Si es con lastre/ayuda es complejo; sugiere 0 (peso corporal)
-        base = 0.0
-    elif any(k in name for k in ["remo barra", "barbell row"]):
-        base = 0.5 * bw
-    elif any(k in name for k in ["remo mancuernas", "dumbbell row"]):
-        base = 24  # par 12+12 aprox
-    elif any(k in name for k in ["prensa", "leg press"]):
-        base = 1.5 * bw
-    elif any(k in name for k in ["extensión cuádriceps", "maquina cuadriceps"]):
-        base = 25
-    elif any(k in name for k in ["curl femoral", "leg curl"]):
-        base = 25
-    elif any(k in name for k in ["jalón", "lat pulldown"]):
-        base = 35
-    elif any(k in name for k in ["aperturas", "fly", "cruce", "crossover"]):
-        base = 16
-    elif any(k in name for k in ["biceps", "curl", "martillo"]):
-        base = 16
-    elif any(k in name for k in ["triceps", "press francés", "jalón triceps"]):
-        base = 20
-    else:
-        base = 20  # valor seguro por defecto
+    return (await sugerencias_iniciales(db, usuario_id, [(ejercicio_nombre, reps_obj)], micro_step))[0]
+
+
+async def sugerencias_iniciales(
+    db: AsyncSession,
+    usuario_id: int,
+    ejercicios: list[tuple[str, object]],
+    micro_step: float = 2.5,
+    historial: dict[str, list[dict]] | None = None,
+) -> list[float | None]:
+    """
+    sugerencia_inicial para todos los ejercicios de un día: [(nombre, reps_obj), ...] -> [carga, ...].
+    Una sola lectura de exercise_state para todos (o el `historial` {slug: series} ya leído) y el peso
+    corporal como mucho una vez.
+    """
+    if historial is None:
+        estados = await estados_por_ejercicio(db, usuario_id, [n for n, _ in ejercicios])
+        historial = {slug: e["ultimas_series"] for slug, e in estados.items()}
+    bw = None
+    cargas = []
+    for nombre, reps_obj in ejercicios:
+        # 1) Si hay historial, usa tu predictor actual
+        sets = historial.get(slug_ejercicio(nombre), [])
+        load, _ = _sugerir_carga_desde_sets(sets, target_reps=(5, 8), micro_step=micro_step)
+        if load:
+            cargas.append(load)
+            continue
+        # 2) Heurística sin historial
+        if bw is None:
+            bw = await _peso_usuario(db, usuario_id) or 70.0  # fallback 70 kg
+        cargas.append(_carga_sin_historial(nombre, bw, reps_obj, micro_step))
+    return cargas
+
+
+_OBJETIVO_TIEMPO = re.compile(r"\d+\s*(?:(?:s|seg|segs|segundos?|sec|secs|min|mins|minutos?)\b|[\"'])", re.I)
+
+
+def _reps_objetivo(reps_obj) -> int:
+    """8, '8-10', '12 reps' -> primer número; 8 si no hay ninguno o es un tiempo ('30s', '1 min')."""
+    if isinstance(reps_obj, (int, float)):
+        return int(reps_obj) or 8
+    texto = str(reps_obj or "")
+    if _OBJETIVO_TIEMPO.search(texto):  # isométricos/cardio: 30 s no son 30 reps
+        return 8
+    m = re.search(r"\d+", texto)
+    return int(m.group()) if m else 8
+
+
+def _carga_sin_historial(ejercicio_nombre: str, bw: float, reps_obj=None, micro_step: float = 2.5) -> float | None:
+    # Mapa de arranque (novato/intermedio bajo) orientativo: % sobre peso corporal para compuestos,
+    # valores fijos para mancuernas/máquinas (tabla settings.CARGAS_INICIALES, ver app/carga_inicial.py)
+    base = carga_base(ejercicio_nombre, bw)
 
     # Ajuste por reps objetivo (si el plan pone p.ej. 12 reps, baja algo la carga)
-    reps = reps_obj or 8
+    reps = _reps_objetivo(reps_obj)
     if reps >= 10: base *= 0.9
     if reps >= 12: base *= 0.85
     if reps <= 6:  base *= 1.05
@@ -785,61 +818,143 @@ async def procesar_formulario_entreno(
     )
     await crud.crear_o_actualizar_formulario(db, user["id"], form_data)
 
-    # 2. Equipamiento del gimnasio (si el usuario está afiliado a uno principal)
-    result_gym = await db.execute(
-        select(models.Gimnasio)
-        .join(models.UsuarioGimnasio, models.UsuarioGimnasio.gimnasio_id == models.Gimnasio.id)
-        .where(
-            models.UsuarioGimnasio.usuario_id == user["id"],
-            models.UsuarioGimnasio.es_principal == True
-        )
+    # 2. Encola la generación (IA + imágenes); la hace un worker (python -m app.trabajos)
+    trabajo = await encolar_trabajo(db, user["id"], "entreno", {"form_data": form_data.model_dump()})
+
+    # 3. Borrador instantáneo por reglas (semana 1) para enseñar algo mientras trabaja la IA
+    equipamiento = await crud.get_equipamiento_principal(db, user["id"])
+    borrador = generar_rutina_local(form_data.model_dump(), equipamiento, semanas=1)["plan"][0]
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": trabajo.id,
+            "estado": trabajo.estado,
+            "status_url": f"/api/trabajos/{trabajo.id}",
+            "borrador": borrador,
+        },
     )
-    gimnasio = result_gym.scalar_one_or_none()
-    equipamiento = ""
-    if gimnasio:
-        res_maquinas = await db.execute(
-            select(models.InfraestructuraGimnasio)
-            .where(models.InfraestructuraGimnasio.gimnasio_id == gimnasio.id)
+
+
+@app.post("/formulario-entreno/local")
+async def crear_rutina_local(
+    job_id: int | None = Body(None, embed=True),
+    user=Depends(role_required(["cliente"])),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Guarda al momento la rutina del generador local (sin IA) con el último formulario del usuario.
+    Con `job_id` (el trabajo 'entreno' en cola) lo cierra en la misma transacción: el worker lo
+    abandona sin guardar otra rutina; si la IA ya la había guardado, se devuelve esa.
+    """
+    formulario = await crud.get_formulario_por_usuario(db, user["id"])
+    if not formulario:
+        raise HTTPException(400, "Rellena primero el formulario de entrenamiento")
+    form_data = schemas.FormularioClienteCreate.model_validate(formulario, from_attributes=True).model_dump()
+    equipamiento = await crud.get_equipamiento_principal(db, user["id"])
+    rutina = generar_rutina_local(form_data, equipamiento)
+    await generar_imagenes_plan(rutina, db, solo_registro=True)  # sin esperar a la IA de imágenes (hace commit)
+    await vincular_plan(db, rutina)
+
+    # el trabajo se bloquea aquí, ya en la transacción que guarda la rutina
+    trabajo = None
+    if job_id is not None:
+        trabajo = await db.scalar(
+            select(models.TrabajoIA)
+            .where(models.TrabajoIA.id == job_id, models.TrabajoIA.usuario_id == user["id"],
+                   models.TrabajoIA.tipo == "entreno")
+            .with_for_update()
         )
-        maquinas = res_maquinas.scalars().all()
-        equipamiento = ", ".join([m.nombre_maquina for m in maquinas])
-
-    # 3. Llama a OpenAI para generar rutina personalizada
-    rutina = await generar_rutina_ia(form_data.__dict__, equipamiento, "", "")
-
-    # 4. Añade imágenes IA a cada ejercicio (iterar sobre rutina['plan'])
-    for semana in rutina["plan"]:
-        for dia in semana["dias"]:
-            for ejercicio in dia["ejercicios"]:
-                nombre = ejercicio["nombre"]
-                motivo = ejercicio.get("motivo", "")
-                # 1. Genera la URL temporal de IA (como antes)
-                url_temporal = await generar_imagen_ejercicio(nombre, motivo)
-                # 2. Descarga la imagen en tu servidor/local (¡nuevo paso!)
-                import uuid
-                nombre_archivo = f"ia_{nombre.replace(' ', '_').lower()}_{uuid.uuid4().hex}.png"
-                url_local = await descargar_imagen_ia(url_temporal, nombre_archivo)
-                # 3. Guarda la ruta local en el JSON (si la descarga falla, guarda la temporal)
-                ejercicio["imagen_url"] = url_local if url_local else url_temporal
-    # 5. Guarda la rutina (JSON con imágenes) en la base de datos (si tienes modelo Plan o similar)
-    # Ejemplo:
+        if trabajo and (trabajo.resultado or {}).get("rutina_id"):
+            return {"rutina_id": trabajo.resultado["rutina_id"]}
+
     rutina_obj = models.Rutina(
         usuario_id=user["id"],
         nombre="Rutina personalizada",
-        descripcion="Rutina generada por IA según tus preferencias",
-        rutina_json=rutina,  # Si tu columna es tipo JSON, NO uses dumps aquí.
-        semanas=form_data.semanas,
+        descripcion="Rutina generada automáticamente según tus preferencias",
+        rutina_json=rutina,
+        semanas=len(rutina["plan"]),
         fecha_creacion=datetime.now(),
     )
     db.add(rutina_obj)
+    await db.flush()
+    if trabajo and trabajo.estado in ("pendiente", "en_curso"):
+        # completado con esta rutina: el SSE/polling de la página lleva a la misma
+        trabajo.estado = "completado"
+        trabajo.fase = "Sustituido por el borrador local"
+        trabajo.progreso = 100
+        trabajo.resultado = {"rutina_id": rutina_obj.id, "borrador": True}
+        trabajo.terminado_en = datetime.now(timezone.utc)
     await db.commit()
     await db.refresh(rutina_obj)
+    return {"rutina_id": rutina_obj.id}
 
-    # 6. Muestra la rutina
-    return RedirectResponse(url="/usuarios", status_code=302)
 
-    # O simplemente redirigir:
-    # return RedirectResponse(url="/usuarios", status_code=302)
+@app.get("/api/trabajos/{trabajo_id}")
+async def estado_trabajo(
+    trabajo_id: int,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_current_user),
+):
+    trabajo = await db.get(models.TrabajoIA, trabajo_id)
+    if not trabajo or trabajo.usuario_id != user["id"]:
+        raise HTTPException(404, "Trabajo no encontrado")
+    return trabajo_a_dict(trabajo)
+
+def _sse(evento: str, datos) -> str:
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+
+
+@app.get("/api/trabajos/{trabajo_id}/eventos")
+async def eventos_trabajo(
+    trabajo_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_current_user),
+):
+    """
+    Server-Sent Events del trabajo: 'semana' por cada semana del plan en cuanto la IA la termina,
+    'progreso' al cambiar de fase y 'fin' / 'error' al acabar.
+    """
+    trabajo = await db.get(models.TrabajoIA, trabajo_id)
+    if not trabajo or trabajo.usuario_id != user["id"]:
+        raise HTTPException(404, "Trabajo no encontrado")
+
+    async def _flujo():
+        enviadas = 0
+        ultima_fase = None
+        latido = 0.0
+        while not await request.is_disconnected():
+            # sesión corta por consulta: no retenemos una conexión del pool durante todo el stream
+            async with SessionLocal() as s:
+                t = await s.get(models.TrabajoIA, trabajo_id)
+            if t is None:
+                yield _sse("error", {"error": "Trabajo no encontrado"})
+                return
+            if t.estado == "en_curso" and isinstance(t.resultado, dict):
+                semanas = t.resultado.get("semanas") or []
+                for semana in semanas[enviadas:]:
+                    yield _sse("semana", semana)
+                enviadas = max(enviadas, len(semanas))
+            if (t.fase, t.progreso) != ultima_fase:
+                ultima_fase = (t.fase, t.progreso)
+                yield _sse("progreso", {"estado": t.estado, "fase": t.fase, "progreso": t.progreso})
+            if t.estado == "completado":
+                yield _sse("fin", trabajo_a_dict(t))
+                return
+            if t.estado == "error":
+                yield _sse("error", {"error": t.error})
+                return
+            await asyncio.sleep(settings.TRABAJOS_SSE_POLL_S)
+            latido += settings.TRABAJOS_SSE_POLL_S
+            if latido >= 15:
+                latido = 0.0
+                yield ": ping\n\n"
+
+    return StreamingResponse(
+        _flujo(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/formulario")
 async def guardar_formulario(
@@ -885,6 +1000,8 @@ async def registrar_progreso_entreno(
         progreso_detallado=json.dumps(detalle)
     )
     db.add(progreso)
+    await db.flush()
+    await registrar_series(db, usuario_id, detalle, progreso_id=progreso.id, rutina_id=rutina_id)
     await db.commit()
     return JSONResponse({"msg": "Progreso registrado correctamente", "detalle": detalle})
 
@@ -977,12 +1094,23 @@ async def ver_dia_entreno(
                 break
     except Exception:
         ejercicios = []
+    # imágenes canónicas del catálogo en un único lookup por id
+    canonicas = await imagenes_por_id(db, [ej.get("exercise_id") for ej in ejercicios])
     for ej in ejercicios:
+        url_plan = ej.get("imagen_url")
+        if ej.get("exercise_id") in canonicas and not (isinstance(url_plan, str) and _existe_local(url_plan.strip())):
+            ej["imagen_url"] = canonicas[ej["exercise_id"]]
+    # sugerencias de todo el día con una sola lectura de histórico
+    try:
+        sugeridos = await sugerencias_iniciales(
+            db, user["id"], [(ej.get("nombre", ""), ej.get("repeticiones") or ej.get("reps")) for ej in ejercicios]
+        )
+    except Exception:
+        logger.exception("[SUGERENCIAS] fallo calculando las del día")
+        sugeridos = [None] * len(ejercicios)
+    for ej, sugerido in zip(ejercicios, sugeridos):
         try:
-            ej["sugerido"] = await sugerencia_inicial(
-                db, user["id"], ej.get("nombre", ""),
-                ej.get("repeticiones") or ej.get("reps")
-            )
+            ej["sugerido"] = sugerido
 
             url_val = ej.get("imagen_url") or ""
             if not isinstance(url_val, str):
@@ -1010,9 +1138,96 @@ async def api_sugerencia_carga(
     db: AsyncSession = Depends(get_db),
     user = Depends(get_current_user)
 ):
-    sets = await _ultimos_sets_usuario(db, user["id"], ejercicio)
+    estado = await _estado_ejercicio(db, user["id"], ejercicio)
+    sets = estado["ultimas_series"] if estado else []
     load, note = _sugerir_carga_desde_sets(sets, micro_step=micro_step)
-    return {"exercise": ejercicio, "suggested_load": load, "note": note, "samples": sets[:3]}
+    return {"exercise": ejercicio, "suggested_load": load, "note": note, "samples": sets[:3], "estado": estado}
+
+@app.post("/api/sugerencia-carga/batch")
+async def api_sugerencia_carga_batch(
+    payload: schemas.SugerenciasCargaIn,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """
+    Sugerencias de todo un día en una petición (hasta 50 ejercicios):
+      {"ejercicios": ["Press banca", {"nombre": "Remo", "repeticiones": "8-10"}], "micro_step": 2.5}
+    Devuelve por ejercicio lo mismo que /api/sugerencia-carga más `sugerido` (semilla sin histórico).
+    """
+    ejercicios = [
+        (e, None) if isinstance(e, str) else (e.nombre, e.repeticiones or e.reps)
+        for e in payload.ejercicios
+    ]
+    micro_step = payload.micro_step or 2.5
+    estados = await estados_por_ejercicio(db, user["id"], [n for n, _ in ejercicios])
+    historial = {slug: e["ultimas_series"] for slug, e in estados.items()}
+    sugeridos = await sugerencias_iniciales(db, user["id"], ejercicios, micro_step, historial)
+    salida = []
+    for (nombre, _), sugerido in zip(ejercicios, sugeridos):
+        sets = historial.get(slug_ejercicio(nombre), [])
+        load, note = _sugerir_carga_desde_sets(sets, micro_step=micro_step)
+        salida.append({"exercise": nombre, "suggested_load": load, "note": note,
+                       "samples": sets[:3], "sugerido": sugerido})
+    return {"sugerencias": salida}
+
+@app.get("/api/historial/{ejercicio}")
+async def api_historial_ejercicio(
+    ejercicio: str,
+    cursor: str | None = None,
+    limite: int = Query(500, ge=1, le=5000),
+    desde: date | None = None,
+    hasta: date | None = None,
+    reps_min: int | None = Query(None, ge=1),
+    reps_max: int | None = Query(None, ge=1),
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """
+    Histórico de series de un ejercicio (workout_sets), más recientes primero, en columnas:
+        GET /api/historial/Press%20banca?desde=2024-01-01&reps_min=3&reps_max=6
+        -> {"ejercicio", "exercise_id", "id": [...], "fecha": [ms epoch], "peso": [...], "reps": [...],
+            "rir": [...], "e1rm": [...], "siguiente": cursor}
+    Para la página siguiente se repite la petición con cursor=siguiente (null = no hay más).
+    `hasta` es inclusivo.
+    """
+    try:
+        antes = leer_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    ids = await resolver_ejercicios(db, [ejercicio], crear=False)
+    exercise_id = ids.get(slug_ejercicio(ejercicio))
+    if exercise_id is None:
+        raise HTTPException(404, "Ejercicio no encontrado")
+    columnas = await historial_columnar(
+        db, user["id"], exercise_id, antes, limite,
+        desde=datetime.combine(desde, datetime.min.time()) if desde else None,
+        hasta=datetime.combine(hasta + timedelta(days=1), datetime.min.time()) if hasta else None,
+        reps_min=reps_min, reps_max=reps_max,
+    )
+    return {"ejercicio": ejercicio, "exercise_id": exercise_id, **columnas}
+
+@app.get("/api/records")
+async def api_records_recientes(
+    limite: int = Query(20, ge=1, le=100),
+    todos: bool = False,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """Feed de récords personales recientes (todos=true incluye las primeras marcas de cada ejercicio)."""
+    return {"records": await records_recientes(db, user["id"], limite, solo_batidos=not todos)}
+
+@app.get("/api/records/{ejercicio}")
+async def api_records_ejercicio(
+    ejercicio: str,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """Insignias de récord de un ejercicio: mejor e1RM, mejor volumen diario y más reps por peso."""
+    ids = await resolver_ejercicios(db, [ejercicio], crear=False)
+    exercise_id = ids.get(slug_ejercicio(ejercicio))
+    if exercise_id is None:
+        raise HTTPException(404, "Ejercicio no encontrado")
+    return {"ejercicio": ejercicio, "exercise_id": exercise_id, **await records_ejercicio(db, user["id"], exercise_id)}
 
 # Guardar sesión desde la nueva UI (alias al tuyo si quieres)
 @app.post("/api/guardar-sesion")
@@ -1038,13 +1253,86 @@ async def api_guardar_sesion(
             progreso_detallado=json.dumps(detalle)
         )
         db.add(prog)
+        await db.flush()
+        series = await registrar_series(db, user["id"], detalle, progreso_id=prog.id, rutina_id=payload["rutina_id"])
         await db.commit()
-        return {"ok": True}
+        return {"ok": True, "series": len(series)}
     except Exception as e:
         await db.rollback()
         raise HTTPException(400, detail=str(e))
 
 
+@app.post("/api/sesiones")
+async def api_crear_sesion(
+    payload: dict = Body(...),
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """
+    Ingesta de una sesión completa (tiempos, ejercicios, series y descansos) en las tablas
+    workout_sessions / exercise_sessions / set_records / rest_periods. Ver app/sesiones.py.
+    """
+    try:
+        resultado = await guardar_sesion_detallada(db, user["id"], payload)
+        await db.commit()
+        return resultado
+    except ValueError as e:
+        await db.rollback()
+        raise HTTPException(400, detail=str(e))
+
+
+@app.post("/api/sync")
+async def api_sync_sesion(
+    payload: dict = Body(...),
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """
+    Lote de eventos de una sesión registrada offline (ver app/sincronizacion.py):
+      {"sesion": "<uuid>", "rutina_id": 12, "dia": "Lunes", "semana": 1,
+       "eventos": [{"clave": "<uuid>", "tipo": "serie", "datos": {...}, "ts": 1700000000000}]}
+    Devuelve {"ack": [claves guardadas], "cursor": ..., "materializada": bool}.
+    """
+    meta = {
+        "rutina_id": int(payload["rutina_id"]) if str(payload.get("rutina_id") or "").isdigit() else None,
+        "dia": str(payload.get("dia") or "") or None,
+        "semana": int(payload["semana"]) if str(payload.get("semana") or "").isdigit() else None,
+    }
+    try:
+        return await sincronizar(db, user["id"], str(payload.get("sesion") or ""), payload.get("eventos"), meta)
+    except ValueError as e:
+        await db.rollback()
+        raise HTTPException(400, detail=str(e))
+
+
+@app.websocket("/ws/sesion/{sesion}")
+async def ws_sesion(
+    websocket: WebSocket,
+    sesion: str,
+    rutina_id: int | None = None,
+    dia: str | None = None,
+    semana: int | None = None,
+):
+    """Canal en vivo de la sesión `sesion` (uuid de /api/sync): series, descansos, temporizadores y sugerencias."""
+    async with SessionLocal() as db:
+        user = await usuario_websocket(websocket, db)
+    if user is None or not sesion or len(sesion) > 64:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    await CanalSesion(websocket, user["id"], sesion, {"rutina_id": rutina_id, "dia": dia, "semana": semana}).atender()
+
+
+@app.get("/api/sync/{sesion}")
+async def api_sync_eventos(
+    sesion: str,
+    desde: int = 0,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    return await eventos_desde(db, user["id"], sesion, desde)
+
+
 # Cambiar ejercicio (placeholder IA)
 @app.post("/api/cambiar-ejercicio")
 async def api_cambiar_ejercicio(
@@ -1060,7 +1348,7 @@ async def api_cambiar_ejercicio(
         raise HTTPException(400, "Falta 'actual'")
 
     try:
-        lista = await generar_alternativas_ia(actual, grupo)  # usa utils
+        lista = await alternativas_cacheadas(db, actual, grupo, criterio)
         # acepta tanto lista de strings como objetos con "nombre"
         candidatos = []
         for x in lista:
@@ -1172,6 +1460,7 @@ async def upload_comida(
 
     with open(filepath, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+    programar_derivados(filepath)
 
     registro_comida = RegistroComida(
         usuario_id=user["id"],
@@ -1342,43 +1631,13 @@ async def formulario_mixto_post(
         "duracion_mixta": duracion_mixta,
     }
 
-    prompt = construir_prompt_mixto(form_data, otros_datos)
-    response = await openai.ChatCompletion.acreate(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
-    )
-    contenido_json = json.loads(response.choices[0].message.content)
-
-    # Separar entreno y dieta
-    rutina_json = contenido_json.get("entrenamiento", {})
-    dieta_json = contenido_json.get("dieta", {})
-
-    # Guardar rutina
-    rutina = models.Rutina(
-        usuario_id=current_user.id,
-        nombre="Rutina Mixta IA",
-        descripcion="Entrenamiento generado por IA desde formulario mixto",
-        rutina_json=rutina_json,
-        semanas=int(duracion_mixta),
-        fecha_creacion=datetime.now(),
+    trabajo = await encolar_trabajo(
+        db, current_user["id"], "mixto", {"form_data": form_data, "otros_datos": otros_datos}
     )
-    db.add(rutina)
-
-    # Guardar dieta
-    dieta = models.Dieta(
-        usuario_id=current_user.id,
-        nombre="Dieta Mixta IA",
-        descripcion="Dieta generada por IA desde formulario mixto",
-        dieta_json=dieta_json,
-        semanas=int(duracion_mixta),
-        fecha_creacion=datetime.now(),
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": trabajo.id, "estado": trabajo.estado, "status_url": f"/api/trabajos/{trabajo.id}"},
     )
-    db.add(dieta)
-
-    await db.commit()
-
-    return RedirectResponse(url="/usuarios", status_code=302)
 
 @router.get("/gimnasios", response_class=HTMLResponse)
 async def listar_gimnasios(request: Request, db: AsyncSession = Depends(get_db)):
@@ -1738,6 +1997,7 @@ async def subir_infraestructura(
         filepath = UPLOAD_DIR / filename
         with open(filepath, "wb") as f:
             shutil.copyfileobj(imagen.file, f)
+        programar_derivados(filepath)
         imagen_url = f"/static/uploads/{filename}"
 
     # Si no hay imagen, usar IA para generar imagen del modelo
@@ -1773,7 +2033,7 @@ async def ver_gimnasio(request: Request, gimnasio_id: int, db: AsyncSession = De
         "maquinas": maquinas
     })
 
-@router.post("/generar_dieta", response_class=HTMLResponse)
+@router.post("/generar_dieta")
 async def generar_dieta(
     request: Request,
     edad: int = Form(...),
@@ -1794,140 +2054,31 @@ async def generar_dieta(
     db: AsyncSession = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_user)
 ):
-    # 1. Prepara el prompt (pon el texto largo de arriba aquí, formateado con los datos)
-    prompt = f"""Eres un nutricionista clínico experto, especializado en crear dietas totalmente personalizadas, variadas y basadas en evidencia científica para mejorar la salud y el rendimiento de cada usuario. Genera un plan de alimentación detallado y adaptado para el siguiente usuario:
-
-    **Datos del usuario:**
-    - Edad: {edad}
-    - Sexo: {sexo}
-    - Altura: {altura} cm
-    - Peso: {peso} kg
-    - Objetivos principales: {objetivos}
-    - Nivel de actividad física: {actividad_fisica}
-    - Experiencia previa con dietas: {experiencia_dietas}
-    - Tipo de dieta preferida: {tipo_dieta}
-    - Preferencias alimentarias: {preferencias_alimentarias}
-    - Alergias o intolerancias: {alergias}
-    - Alimentos que no desea incluir: {alimentos_no_deseados}
-    - Número de comidas al día: {comidas_al_dia}
-    - Momentos preferidos para comer: {tiempo_comidas}
-    - Contexto adicional: {otros_datos}
-    - Duración total de la dieta: {duracion_dieta}
-
-    [INCLUYE AQUÍ EL RESTO DEL PROMPT, VARIEDAD, REQUISITOS Y FORMATO JSON]
-    """
-
-    # 2. Llama a OpenAI
-    response = await openai.ChatCompletion.acreate(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "Responde siempre solo con el JSON solicitado, nunca añadas texto ni explicaciones fuera del JSON."},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.8,
-        max_tokens=2048
-    )
-    dieta_json = response.choices[0].message.content
-
-    # 3. Guarda en la base de datos
-    nueva_dieta = DietaGenerada(
-        usuario_id=usuario_actual.id,
-        datos_entrada=json.dumps({
-            "edad": edad, "sexo": sexo, "altura": altura, "peso": peso,
-            "objetivos": objetivos, "actividad_fisica": actividad_fisica,
-            "experiencia_dietas": experiencia_dietas, "tipo_dieta": tipo_dieta,
-            "preferencias_alimentarias": preferencias_alimentarias, "alergias": alergias,
-            "alimentos_no_deseados": alimentos_no_deseados, "comidas_al_dia": comidas_al_dia,
-            "tiempo_comidas": tiempo_comidas, "otros_datos": otros_datos, "duracion_dieta": duracion_dieta
-        }),
-        dieta_json=dieta_json
-    )
-    db.add(nueva_dieta)
-    await db.commit()
-    await db.refresh(nueva_dieta)
-
-    # 4. Muestra el resultado (ajusta la ruta de template a la tuya)
-    return templates.TemplateResponse(
-        "dieta_generada.html",
-        {"request": request, "dieta": json.loads(dieta_json)}
-    )
-
-@router.post("/formulario_mixto")
-async def formulario_mixto_post(
-    request: Request,
-    db: AsyncSession = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user),
-    edad: int = Form(...),
-    sexo: str = Form(...),
-    altura_cm: int = Form(...),
-    peso: float = Form(None),
-    experiencia_entrenamiento: str = Form(""),
-    actividad_fisica: str = Form(""),
-    tiempo_disponible: str = Form(""),
-    preferencias_entrenamiento: str = Form(""),
-    objetivos_entrenamiento: str = Form(""),
-    tipo_dieta: str = Form(""),
-    preferencias_alimentarias: str = Form(""),
-    alergias: str = Form(""),
-    comidas_al_dia: int = Form(None),
-    deporte_especifico: str = Form(""),
-    equipamiento: str = Form(""),
-    limitaciones: str = Form(""),
-    otros_datos: str = Form(""),
-    duracion_mixta: str = Form(...),
-):
-    # Prepara los datos para el prompt
-    form_data = {
-        "edad": edad,
-        "sexo": sexo,
-        "altura_cm": altura_cm,
-        "peso": peso,
-        "experiencia_entrenamiento": experiencia_entrenamiento,
-        "actividad_fisica": actividad_fisica,
-        "tiempo_disponible": tiempo_disponible,
-        "preferencias_entrenamiento": [s.strip() for s in preferencias_entrenamiento.split(",") if s.strip()],
-        "objetivos_entrenamiento": [s.strip() for s in objetivos_entrenamiento.split(",") if s.strip()],
-        "tipo_dieta": tipo_dieta,
-        "preferencias_alimentarias": preferencias_alimentarias,
-        "alergias": alergias,
-        "comidas_al_dia": comidas_al_dia,
-        "deporte_especifico": deporte_especifico,
-        "equipamiento": equipamiento,
-        "limitaciones": limitaciones,
-        "duracion_mixta": duracion_mixta,
+    datos = {
+        "edad": edad, "sexo": sexo, "altura": altura, "peso": peso,
+        "objetivos": objetivos, "actividad_fisica": actividad_fisica,
+        "experiencia_dietas": experiencia_dietas, "tipo_dieta": tipo_dieta,
+        "preferencias_alimentarias": preferencias_alimentarias, "alergias": alergias,
+        "alimentos_no_deseados": alimentos_no_deseados, "comidas_al_dia": comidas_al_dia,
+        "tiempo_comidas": tiempo_comidas, "otros_datos": otros_datos, "duracion_dieta": duracion_dieta
     }
-
-    prompt = construir_prompt_mixto(form_data, otros_datos)
-
-    # Llama a OpenAI (o tu proveedor de IA)
-    openai_client = AsyncOpenAI(api_key="TU_API_KEY_OPENAI")
-    response = await openai_client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.5,
-    )
-    contenido_json = response.choices[0].message.content
-
-    # Guarda el resultado en la base de datos
-    nuevo_plan = PlanMixtoGenerado(
-        usuario_id=current_user.id,
-        contenido_json=contenido_json
+    # La dieta la genera un worker; el resultado queda en GET /api/trabajos/{id}
+    trabajo = await encolar_trabajo(db, usuario_actual["id"], "dieta", {"datos": datos})
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": trabajo.id, "estado": trabajo.estado, "status_url": f"/api/trabajos/{trabajo.id}"},
     )
-    db.add(nuevo_plan)
-    await db.commit()
-    await db.refresh(nuevo_plan)
-
-    # Devuelve o redirige como prefieras
-    return {"ok": True, "plan_mixto": json.loads(contenido_json)}
-
 
 @router.post("/alternativas_ejercicio")
-async def alternativas_ejercicio(request: Request):
+async def alternativas_ejercicio(request: Request, db: AsyncSession = Depends(get_db)):
     data = await request.json()
     ejercicio = data.get("ejercicio")
     grupo_muscular = data.get("grupo_muscular")  # Puedes pasarlo desde el frontend si lo tienes
+    criterio = data.get("criterio") or "movilidad"
+    if not ejercicio:
+        return JSONResponse({"error": "Falta 'ejercicio'"}, status_code=400)
     try:
-        alternativas = await generar_alternativas_ia(ejercicio, grupo_muscular)
+        alternativas = await alternativas_cacheadas(db, ejercicio, grupo_muscular or "", criterio)
     except Exception as e:
         return JSONResponse({"error": f"No se pudieron generar alternativas: {e}"}, status_code=500)
     return JSONResponse({"alternativas": alternativas})
@@ -2158,6 +2309,7 @@ async def subir_foto_perfil(
     filepath = UPLOAD_DIR / filename
     with open(filepath, "wb") as f:
         shutil.copyfileobj(imagen.file, f)
+    programar_derivados(filepath)
 
     usuario = await db.get(Usuario, user["id"])
     usuario.imagen_url = f"/static/uploads/{filename}"
@@ -2313,6 +2465,8 @@ async def guardar_sesion_entreno(
         progreso_detallado=json.dumps(datos)
     )
     db.add(progreso)
+    await db.flush()
+    await registrar_series(db, usuario_id, datos, progreso_id=progreso.id, rutina_id=rutina_id)
     await db.commit()
     return {"msg": "Sesión guardada correctamente"}
 
@@ -2327,33 +2481,19 @@ def _round_to_step(x: float, step: float) -> float:
 
 async def _ultimos_sets_usuario(db, usuario_id: int, ejercicio_nombre: str, limite_registros: int = 20):
     """
-    Lee tus últimos Progreso (JSON) y extrae sets del ejercicio indicado.
-    Espera estructuras como las que guardas en registrar_progreso_entreno:
-        {"semana":..., "dia":..., "ejercicios":[{"nombre": "...", "peso": 60, "repes": 8, "rir": 2, ...}, ...]}
+    Últimas series del usuario en ese ejercicio (más recientes primero), de workout_sets:
+    una lectura indexada por (usuario, ejercicio, fecha). Ver app/series.py.
+        [{"weight": 60.0, "reps": 8, "rir": 2, "fecha": "..."}, ...]
     """
-    from app import models  # evitar import circular al inicio
-    res = await db.execute(
-        select(models.Progreso)
-        .where(models.Progreso.usuario_id == usuario_id)
-        .order_by(models.Progreso.fecha.desc())
-        .limit(limite_registros)
-    )
-    sets = []
-    for prog in res.scalars().all():
-        try:
-            detalle = json.loads(prog.progreso_detallado)
-            for e in detalle.get("ejercicios", []):
-                if (e.get("nombre") or "").strip().lower() == ejercicio_nombre.strip().lower():
-                    # Normalizamos claves que ya usas: "peso", "repes" (y opcional "rir")
-                    sets.append({
-                        "weight": float(e.get("peso", 0) or 0),
-                        "reps": int(e.get("repes", 0) or 0),
-                        "rir": int(e.get("rir", 2) or 2),
-                        "fecha": str(detalle.get("fecha", "")),
-                    })
-        except Exception:
-            continue
-    return sets
+    return await ultimos_sets(db, usuario_id, ejercicio_nombre, limite=limite_registros)
+
+async def _estado_ejercicio(db, usuario_id: int, ejercicio_nombre: str) -> dict | None:
+    """
+    Estado de fuerza del usuario en ese ejercicio (exercise_state, lectura por clave):
+        {"ultimas_series": [...3 más recientes], "e1rm": 80.0, "mejor_serie": {...}, "sesiones": 12, ...}
+    """
+    estados = await estados_por_ejercicio(db, usuario_id, [ejercicio_nombre])
+    return estados.get(slug_ejercicio(ejercicio_nombre))
 
 def _sugerir_carga_desde_sets(sets: list, target_reps=(5,8), micro_step=2.5):
     if not sets:
@@ -2393,13 +2533,15 @@ async def sugerencia_carga(
     GET /progress/suggestion?ejercicio=Press%20Banca
     Devuelve: {"exercise": "...", "suggested_load": 72.5, "note": "..."}
     """
-    sets = await _ultimos_sets_usuario(db, user["id"], ejercicio)
+    estado = await _estado_ejercicio(db, user["id"], ejercicio)
+    sets = estado["ultimas_series"] if estado else []
     load, note = _sugerir_carga_desde_sets(sets, micro_step=micro_step)
     return {
         "exercise": ejercicio,
         "suggested_load": load,
         "note": note,
-        "samples": sets[:3]  # te deja ver en el front qué datos usó
+        "samples": sets[:3],  # te deja ver en el front qué datos usó
+        "estado": estado,     # e1RM, mejor serie, nº de sesiones...
     }
 
 from urllib.parse import unquote
@@ -2467,14 +2609,10 @@ async def api_generar_imagen_ejercicio(
                 logger.info(f"[IMG-IA] normalizada previa -> {url_local_old}")
                 return {"url": url_local_old}
 
-        # Generar con IA
+        # Registro de imágenes compartido; si no está, generar con IA y guardar local
+        # SIEMPRE (evita 403 de blobs temporales)
         motivo = objetivo.get("motivo", "")
-        url_tmp = await generar_imagen_ejercicio(nombre, motivo)  # utils.py OK :contentReference[oaicite:1]{index=1}
-        logger.info(f"[IMG-IA] OpenAI OK, tipo={'data' if url_tmp.startswith('data:') else 'url'}")
-
-        # Guardar local SIEMPRE (evita 403 de blobs temporales)
-        fname = f"ia_{_safe_slug(nombre)}_{uuid.uuid4().hex}.png"
-        url_local = await descargar_imagen_ia(url_tmp, fname)
+        url_local = await imagen_ejercicio(db, nombre, motivo)
         if not url_local:
             logger.error("[IMG-IA] descargar_imagen_ia() devolvió None")
             raise HTTPException(502, "No se pudo guardar la imagen generada")
@@ -2511,52 +2649,106 @@ async def diag_image():
         return {"ok": False, "error": str(e)}
 
 
+@app.get("/diag/alternativas-cache")
+async def diag_alternativas_cache():
+    return estadisticas_cache()
+
+
+@app.get("/diag/ia-llamadas")
+async def diag_ia_llamadas(
+    horas: int = Query(24, ge=1, le=24 * 90),
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_staff_user),
+):
+    """p50/p95 de latencia, tokens y gasto de la IA por función, ruta, modelo y gimnasio (solo personal)."""
+    await registro_ia.volcar()  # incluye lo aún pendiente en memoria de este proceso
+    return await registro_ia.informe(db, horas)
+
+
+@app.get("/diag/planes-cache")
+async def diag_planes_cache(db: AsyncSession = Depends(get_db)):
+    """Reutilización de rutinas IA por huella de formulario (tasa de acierto global y por proceso)."""
+    return await estadisticas_planes(db)
+
+
+@app.post("/admin/cache-planes/purgar")
+async def purgar_cache_planes(
+    todo: bool = False,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_staff_user),
+):
+    """Borra los planes caducados (o todos con ?todo=true)."""
+    return {"ok": True, "borrados": await purgar_planes(db, solo_caducados=not todo)}
+
+
+@app.post("/admin/cache-alternativas/purgar")
+async def purgar_cache_alternativas(
+    ejercicio: str | None = None,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_staff_user),
+):
+    """Vacía la caché de alternativas (todas, o solo las de ?ejercicio=...)."""
+    borradas = await purgar_alternativas(db, ejercicio)
+    return {"ok": True, "ejercicio": ejercicio, "borradas": borradas}
+
+
+@app.post("/admin/ejercicios/{exercise_id}/alias")
+async def anadir_alias_ejercicio(
+    exercise_id: int,
+    alias: str = Body(..., embed=True),
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_staff_user),
+):
+    """Registra un sinónimo del catálogo: las rutinas que lo usen resolverán a este ejercicio."""
+    if not await db.get(models.Exercise, exercise_id):
+        raise HTTPException(404, "Ejercicio no encontrado")
+    if not await anadir_alias(db, exercise_id, alias):
+        raise HTTPException(409, "Ese alias ya pertenece a otro ejercicio")
+    await db.commit()
+    return {"ok": True, "exercise_id": exercise_id, "alias": alias, "slug": slug_ejercicio(alias)}
+
+
 # app/main.py
 @app.post("/admin/fix-imagenes-rutina/{rutina_id}")
 async def fix_imagenes_rutina(
     rutina_id: int,
     db: AsyncSession = Depends(get_db),
-    user = Depends(get_current_user)  # limita a admin si quieres
+    user = Depends(get_staff_user)
 ):
     rutina = await db.get(models.Rutina, rutina_id)
     if not rutina:
         raise HTTPException(404, "Rutina no encontrada")
 
-    plan = rutina.rutina_json or {}
-    cambios = 0
-
-    for semana in plan.get("plan", []):
-        for dia in semana.get("dias", []):
-            for ej in dia.get("ejercicios", []):
-                url = (ej.get("imagen_url") or "").strip()
-                if url.startswith("/static/uploads/"):
-                    continue  # ya local
-                if url.startswith(("http://", "https://")):
-                    # intenta descargar la externa
-                    filename = f"ia_{_safe_slug(ej.get('nombre','ej'))}_{uuid.uuid4().hex}.png"
-                    local = await descargar_imagen_ia(url, filename)
-                    if local:
-                        ej["imagen_url"] = local
-                        cambios += 1
-                    else:
-                        # si falla, regénérala
-                        try:
-                            motivo = ej.get("motivo", "")
-                            url_tmp = await generar_imagen_ejercicio(ej.get("nombre",""), motivo)
-                            local2 = await descargar_imagen_ia(url_tmp, filename)
-                            if local2:
-                                ej["imagen_url"] = local2
-                                cambios += 1
-                            else:
-                                ej["imagen_url"] = ""
-                        except Exception:
-                            ej["imagen_url"] = ""
-                # si está vacía, no tocamos (el usuario ya pulsará "🪄")
-
-    if cambios:
-        rutina.rutina_json = plan
-        await db.commit()
-    return {"ok": True, "cambios": cambios}
+    stats = _stats_vacias()
+    async with aiohttp.ClientSession() as session:
+        await reparar_rutinas(db, [rutina], session, settings.IMG_CONCURRENCIA, stats,
+                              max_regeneradas=settings.REPARAR_MAX_REGENERADAS)
+    cambios = stats["registro"] + stats["descargadas"] + stats["regeneradas"]
+    return {"ok": True, "cambios": cambios, **stats}
+
+
+@app.post("/admin/reparar-imagenes")
+async def reparar_imagenes_todas(
+    lote: int = Query(50, ge=1),
+    concurrencia: int | None = Query(None, ge=1),
+    max_regeneradas: int | None = Query(None, ge=0),
+    db: AsyncSession = Depends(get_db),
+    user = Depends(get_staff_user),
+):
+    """
+    Encola la reparación de imágenes de TODAS las rutinas (reanudable; ver app/reparar_imagenes.py).
+    lote, concurrencia y max_regeneradas (imágenes IA de pago) se acotan con REPARAR_MAX_*.
+    """
+    trabajo = await encolar_trabajo(db, user["id"], "reparar_imagenes", {
+        "lote": min(lote, settings.REPARAR_MAX_LOTE),
+        "concurrencia": min(concurrencia, settings.REPARAR_MAX_CONCURRENCIA) if concurrencia else None,
+        "max_regeneradas": min(max_regeneradas if max_regeneradas is not None else settings.REPARAR_MAX_REGENERADAS,
+                               settings.REPARAR_MAX_REGENERADAS),
+    })
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": trabajo.id, "estado": trabajo.estado, "status_url": f"/api/trabajos/{trabajo.id}"},
+    )
 
 @app.get("/diag/openai-key")
 async def diag_key():
@@ -2568,6 +2760,18 @@ async def diag_key():
         "len": len(k) if k else 0
     }
 
+@app.get("/diag/imagenes-cache")
+async def diag_imagenes_cache(db: AsyncSession = Depends(get_db)):
+    total = await db.scalar(select(func.count(models.ImagenEjercicio.id)))
+    usos = await db.scalar(select(func.coalesce(func.sum(models.ImagenEjercicio.usos), 0)))
+    consultas = CACHE_STATS["hits"] + CACHE_STATS["misses"]
+    return {
+        **CACHE_STATS,
+        "hit_rate": round(CACHE_STATS["hits"] / consultas, 3) if consultas else None,
+        "imagenes_registradas": total,
+        "usos_totales": usos,
+    }
+
 @app.get("/diag/probar-imagen")
 async def diag_probar_imagen():
     # Fuerza una llamada directa a la IA sin base de datos ni auth
@@ -2987,6 +3191,7 @@ async def registrar_comida(
     filepath = UPLOAD_DIR / filename
     with open(filepath, "wb") as buffer:
         shutil.copyfileobj(imagen.file, buffer)
+    programar_derivados(filepath)
 
     imagen_url = f"/static/uploads/{filename}"
 
@@ -3441,6 +3646,49 @@ async def panel_gimnasio_clientes(
     })
 
 
+@app.get("/panel-gimnasio/cargas")
+async def panel_gimnasio_cargas(
+        micro_step: float = 2.5,
+        user=Depends(role_required(["gimnasio"])),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Carga sugerida para la próxima sesión de todos los socios del gimnasio en todos sus ejercicios.
+    Una consulta (exercise_state de los socios) y un cálculo vectorizado (prediction.suggest_next_loads).
+    Respuesta en columnas: la fila i es (usuario_id[i], exercise_id[i], suggested_load[i], e1rm[i]).
+    """
+    E = models.EstadoEjercicio
+    res = await db.execute(
+        select(E.user_id, E.exercise_id, E.ultimas_series, models.Exercise.name, models.Usuario.nombre)
+        .join(models.UsuarioGimnasio, models.UsuarioGimnasio.usuario_id == E.user_id)
+        .join(models.Exercise, models.Exercise.id == E.exercise_id)
+        .join(models.Usuario, models.Usuario.id == E.user_id)
+        .where(models.UsuarioGimnasio.gimnasio_id == user["id"])
+        .order_by(E.user_id, E.exercise_id)
+    )
+    pares = res.all()
+
+    grupo, peso, reps, rir = [], [], [], []
+    for i, par in enumerate(pares):
+        for s in par.ultimas_series or []:
+            grupo.append(i)
+            peso.append(s.get("weight") or 0)
+            reps.append(s.get("reps") or 0)
+            rir.append(s.get("rir", 2))
+    cargas, e1rms = suggest_next_loads(grupo, peso, reps, rir, len(pares), micro_step=micro_step)
+
+    return {
+        "gimnasio_id": user["id"],
+        "pares": len(pares),
+        "usuario_id": [p.user_id for p in pares],
+        "exercise_id": [p.exercise_id for p in pares],
+        "suggested_load": cargas,
+        "e1rm": [round(e, 1) if e is not None else None for e in e1rms],
+        "usuarios": {p.user_id: p.nombre for p in pares},
+        "ejercicios": {p.exercise_id: p.name for p in pares},
+    }
+
+
 # ───────────────────────────────
 # 💳 Gestión de Cobros
 # ───────────────────────────────
@@ -3567,4 +3815,8 @@ async def agregar_producto(
     except Exception as e:
         await db.rollback()
         logger.error(f"Error al agregar producto: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Router /progress (al final: importa get_current_user de este módulo)
+from app.progress import router as progress_router  # noqa: E402
+app.include_router(progress_router)
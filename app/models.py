@@ -1,5 +1,5 @@
 from __future__ import annotations
-from sqlalchemy import Table, String, Integer, DateTime, Text, ForeignKey, Boolean, UniqueConstraint, Column, Numeric, Float
+from sqlalchemy import Table, String, Integer, BigInteger, DateTime, Text, ForeignKey, Boolean, UniqueConstraint, Column, Numeric, Float, Index
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB, JSON
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship, Mapped, mapped_column
@@ -381,12 +381,57 @@ class RestPeriod(Base):
 
     ejercicio: Mapped["ExerciseSession"] = relationship("ExerciseSession", back_populates="descansos")
 
+class SesionSync(Base):
+    """Sesión registrada offline desde el móvil (app/sincronizacion.py): uuid del cliente -> sesión materializada."""
+    __tablename__ = "sesiones_sync"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    usuario_id: Mapped[int] = mapped_column(ForeignKey("usuarios.id", ondelete="CASCADE"), index=True)
+    sesion: Mapped[str] = mapped_column(String(64))                  # uuid generado en el cliente
+    rutina_id: Mapped[int | None] = mapped_column(Integer)
+    dia: Mapped[str | None] = mapped_column(Text)
+    semana: Mapped[int | None] = mapped_column(Integer)
+    cursor: Mapped[int] = mapped_column(BigInteger, default=0)       # id del último evento recibido
+    workout_session_id: Mapped[int | None] = mapped_column(ForeignKey("workout_sessions.id", ondelete="SET NULL"))
+    progreso_id: Mapped[int | None] = mapped_column(ForeignKey("progreso.id", ondelete="SET NULL"))
+    creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    actualizado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    __table_args__ = (UniqueConstraint("usuario_id", "sesion", name="uq_sesion_sync_usuario"),)
+
+class EventoSesion(Base):
+    """Evento de una SesionSync (serie, descanso, inicio/fin...); `clave` es la clave de idempotencia del cliente."""
+    __tablename__ = "eventos_sesion"
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)   # orden de llegada = cursor del servidor
+    sesion_sync_id: Mapped[int] = mapped_column(ForeignKey("sesiones_sync.id", ondelete="CASCADE"), index=True)
+    clave: Mapped[str] = mapped_column(String(64))
+    tipo: Mapped[str] = mapped_column(String(24))
+    datos: Mapped[dict] = mapped_column(JSONB)
+    ts_cliente: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    recibido_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    __table_args__ = (UniqueConstraint("sesion_sync_id", "clave", name="uq_evento_sesion_clave"),)
+
 class Exercise(Base):
+    """Catálogo canónico de ejercicios: las rutinas guardan su id en cada ejercicio (exercise_id)."""
     __tablename__ = "exercises"
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(120), unique=True, index=True)
+    slug: Mapped[str | None] = mapped_column(String(160), unique=True, index=True)
+    grupo_muscular: Mapped[str | None] = mapped_column(String(60))
+    equipo: Mapped[str | None] = mapped_column(String(120))
+    imagen_url: Mapped[str | None] = mapped_column(Text)
+    creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    aliases = relationship("ExerciseAlias", back_populates="exercise", cascade="all, delete-orphan")
+
+class ExerciseAlias(Base):
+    """Nombres alternativos (normalizados) que resuelven al mismo ejercicio del catálogo."""
+    __tablename__ = "exercise_aliases"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    exercise_id: Mapped[int] = mapped_column(ForeignKey("exercises.id", ondelete="CASCADE"), index=True)
+    alias: Mapped[str] = mapped_column(String(200))
+    alias_slug: Mapped[str] = mapped_column(String(160), unique=True, index=True)
+    exercise = relationship("Exercise", back_populates="aliases")
 
 class WorkoutSet(Base):
+    """Histórico plano de series (una fila por serie); lo escribe app.series al guardar cada sesión."""
     __tablename__ = "workout_sets"
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(index=True)
@@ -397,7 +442,135 @@ class WorkoutSet(Base):
     rest_sec: Mapped[int] = mapped_column(default=120)  # descanso
     bodyweight: Mapped[float] = mapped_column(nullable=True)
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    progreso_id: Mapped[int | None] = mapped_column(ForeignKey("progreso.id", ondelete="CASCADE"), index=True)
+    rutina_id: Mapped[int | None] = mapped_column(Integer)
     exercise = relationship("Exercise")
+    # sugerencias de carga e histórico paginado por (created_at, id): un range scan de este índice
+    __table_args__ = (Index("ix_workout_sets_usuario_ejercicio_fecha", "user_id", "exercise_id", "created_at", "id"),)
+
+
+class EstadoEjercicio(Base):
+    """
+    Estado de fuerza por (usuario, ejercicio), mantenido por app.series en cada escritura de series:
+    las sugerencias de carga leen esta fila por clave primaria en vez de recorrer workout_sets.
+    """
+    __tablename__ = "exercise_state"
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    exercise_id: Mapped[int] = mapped_column(ForeignKey("exercises.id", ondelete="CASCADE"), primary_key=True)
+    ultimas_series: Mapped[list] = mapped_column(JSONB, default=list)  # 3 más recientes [{weight, reps, rir, fecha}]
+    e1rm: Mapped[float | None] = mapped_column(Float)                 # media Epley de ultimas_series
+    ultimas_reps: Mapped[int | None] = mapped_column(Integer)
+    ultimo_rir: Mapped[int | None] = mapped_column(Integer)
+    mejor_peso: Mapped[float | None] = mapped_column(Float)            # mejor serie por e1RM
+    mejor_reps: Mapped[int | None] = mapped_column(Integer)
+    mejor_e1rm: Mapped[float | None] = mapped_column(Float)
+    sesiones: Mapped[int] = mapped_column(Integer, default=0)
+    ultima_fecha: Mapped[datetime | None] = mapped_column(DateTime)    # UTC sin zona, como workout_sets
+    actualizado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class RecordPersonal(Base):
+    """
+    Récords personales por (usuario, ejercicio, tipo), mantenidos por app.records en cada escritura
+    de series: la fila solo se reescribe cuando se supera. Tipos:
+      e1rm     mejor e1RM (Epley) de una serie                     peso_ref = 0
+      reps     más repeticiones con un peso                        peso_ref = ese peso
+      volumen  mayor volumen (peso x reps) de un día en el ejercicio  peso_ref = 0
+    """
+    __tablename__ = "records_personales"
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    exercise_id: Mapped[int] = mapped_column(ForeignKey("exercises.id", ondelete="CASCADE"), primary_key=True)
+    tipo: Mapped[str] = mapped_column(String(20), primary_key=True)
+    peso_ref: Mapped[float] = mapped_column(Float, primary_key=True, default=0)
+    valor: Mapped[float] = mapped_column(Float)
+    anterior: Mapped[float | None] = mapped_column(Float)          # récord superado (None = primera marca)
+    peso: Mapped[float | None] = mapped_column(Float)              # serie que lo logró (e1rm / reps)
+    reps: Mapped[int | None] = mapped_column(Integer)
+    workout_set_id: Mapped[int | None] = mapped_column(Integer)
+    fecha: Mapped[datetime] = mapped_column(DateTime)              # UTC sin zona, como workout_sets
+    actualizado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # feed de récords recientes del usuario
+    __table_args__ = (Index("ix_records_personales_usuario_actualizado", "user_id", "actualizado_en"),)
+
+
+class ImagenEjercicio(Base):
+    """Registro de imágenes IA por ejercicio normalizado + estilo, compartido entre rutinas y usuarios."""
+    __tablename__ = "imagenes_ejercicio"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    clave: Mapped[str] = mapped_column(String(200), unique=True, index=True)  # "{estilo}:{slug}"
+    slug: Mapped[str] = mapped_column(String(150))
+    estilo: Mapped[str] = mapped_column(String(40))
+    imagen_url: Mapped[str] = mapped_column(Text)
+    usos: Mapped[int] = mapped_column(Integer, default=0)
+    creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    ultimo_uso: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class AlternativaCache(Base):
+    """Caché persistente de alternativas IA por (ejercicio, grupo_muscular, criterio) normalizados."""
+    __tablename__ = "cache_alternativas"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    clave: Mapped[str] = mapped_column(String(400), unique=True, index=True)
+    ejercicio: Mapped[str] = mapped_column(String(200))
+    grupo_muscular: Mapped[str] = mapped_column(String(100), default="")
+    criterio: Mapped[str] = mapped_column(String(60), default="")
+    alternativas: Mapped[list] = mapped_column(JSONB)
+    creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    expira_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+
+
+class PlanCache(Base):
+    """Microciclo base IA reutilizable por huella de formulario (datos agrupados + equipamiento)."""
+    __tablename__ = "cache_planes"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    huella: Mapped[str] = mapped_column(String(64), unique=True, index=True)
+    campos: Mapped[dict] = mapped_column(JSONB)        # el bucket legible (para diagnóstico)
+    base_json: Mapped[dict] = mapped_column(JSONB)     # rutina_json con solo la semana 1
+    aciertos: Mapped[int] = mapped_column(Integer, default=0)       # reutilizaciones acumuladas
+    usos_version: Mapped[int] = mapped_column(Integer, default=0)   # reutilizaciones del plan actual
+    generaciones: Mapped[int] = mapped_column(Integer, default=1)   # veces que se generó con IA
+    creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    ultimo_uso: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    expira_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+
+
+class LlamadaIA(Base):
+    """Una fila por llamada a la API de IA (latencia, tokens, reintentos y coste estimado)."""
+    __tablename__ = "ai_calls"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+    etiqueta: Mapped[str] = mapped_column(String(60), index=True)    # función: generar_rutina_ia, ...
+    origen: Mapped[str | None] = mapped_column(String(120))          # ruta HTTP o trabajo:<tipo>
+    modelo: Mapped[str] = mapped_column(String(60))
+    tipo: Mapped[str] = mapped_column(String(10))                    # chat | stream | imagen
+    usuario_id: Mapped[int | None] = mapped_column(Integer, index=True)
+    gimnasio_id: Mapped[int | None] = mapped_column(Integer, index=True)
+    tokens_entrada: Mapped[int | None] = mapped_column(Integer)
+    tokens_salida: Mapped[int | None] = mapped_column(Integer)
+    latencia_ms: Mapped[int] = mapped_column(Integer)                 # total: cola + reintentos + respuesta
+    reintentos: Mapped[int] = mapped_column(Integer, default=0)
+    ok: Mapped[bool] = mapped_column(Boolean, default=True)
+    error: Mapped[str | None] = mapped_column(String(200))
+    coste_usd: Mapped[float | None] = mapped_column(Float)
+
+
+class TrabajoIA(Base):
+    """Cola de trabajos de generación IA (rutinas, dietas, planes mixtos) que procesan los workers."""
+    __tablename__ = "trabajos_ia"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    usuario_id: Mapped[int] = mapped_column(ForeignKey("usuarios.id", ondelete="CASCADE"), index=True)
+    tipo: Mapped[str] = mapped_column(String(20))                       # 'entreno' | 'dieta' | 'mixto'
+    estado: Mapped[str] = mapped_column(String(20), default="pendiente", index=True)  # pendiente | en_curso | completado | error
+    payload: Mapped[dict] = mapped_column(JSONB)
+    resultado: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    progreso: Mapped[int] = mapped_column(Integer, default=0)           # 0..100
+    fase: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    intentos: Mapped[int] = mapped_column(Integer, default=0)
+    creado_en: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    iniciado_en: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    actualizado_en: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)  # latido del worker
+    terminado_en: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
 
 class PeticionPlan(Base):
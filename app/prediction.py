@@ -7,7 +7,8 @@ def suggest_next_load(sets, target_reps=(5,8), micro_step=2.5):
     if not sets:
         return None  # sin historial → pedir 1RM estimada o test de carga
     # usar últimos 3 sets
-    last = sorted(sets, key=lambda s: s.created_at)[-3:]
+    # las series de una misma sesión comparten created_at: el id desempata
+    last = sorted(sets, key=lambda s: (s.created_at, getattr(s, "id", 0) or 0))[-3:]
     e1rms = [e1rm_epley(s.weight, s.reps) for s in last]
     base_e1rm = mean(e1rms)
     # objetivo: 70–80% e1RM para 5–8 reps aprox
@@ -25,4 +26,83 @@ def suggest_next_load(sets, target_reps=(5,8), micro_step=2.5):
     # redondear a microcarga disponible
     def round_to_step(x, step):
         return round(x / step) * step
-    return round_to_step(proposed, micro_step)
\ No newline at end of file
+    return round_to_step(proposed, micro_step)
+
+# ===========================
+# Motor por lotes (gimnasio entero)
+# ===========================
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usa el bucle en Python
+    np = None
+
+RECENT = 3  # mismos sets que suggest_next_load
+
+
+def _adjust(proposed, last_reps, last_rir, target_reps):
+    low, high = target_reps
+    if last_reps > high and last_rir >= 2:
+        return proposed * 1.025
+    if last_reps < low or last_rir <= 0:
+        return proposed * 0.975
+    return proposed
+
+
+def _suggest_next_loads_py(group, weight, reps, rir, n_groups, target_reps, micro_step):
+    recent = [[] for _ in range(n_groups)]
+    for g, w, r, x in zip(group, weight, reps, rir):
+        if w > 0 and r > 0 and len(recent[g]) < RECENT:
+            recent[g].append((w, r, x))
+    loads, e1rms = [None] * n_groups, [None] * n_groups
+    for g, sets in enumerate(recent):
+        if not sets:
+            continue
+        e1rms[g] = mean(e1rm_epley(w, r) for w, r, _ in sets)
+        proposed = _adjust(e1rms[g] * 0.75, sets[0][1], sets[0][2], target_reps)
+        loads[g] = round(proposed / micro_step) * micro_step
+    return loads, e1rms
+
+
+def suggest_next_loads(group, weight, reps, rir, n_groups, target_reps=(5, 8), micro_step=2.5):
+    """
+    suggest_next_load para miles de pares (usuario, ejercicio) de una vez, con columnas:
+      group[i]  -> índice del par (0..n_groups-1) de la serie i
+      weight/reps/rir[i] -> la serie; dentro de cada par, de la más reciente a la más antigua
+    Devuelve (cargas, e1rms), listas de n_groups con None donde el par no tiene series válidas.
+    """
+    if np is None:
+        return _suggest_next_loads_py(group, weight, reps, rir, n_groups, target_reps, micro_step)
+    group = np.asarray(group, dtype=np.int64)
+    weight = np.asarray(weight, dtype=np.float64)
+    reps = np.asarray(reps, dtype=np.float64)
+    rir = np.asarray(rir, dtype=np.float64)
+
+    valid = (weight > 0) & (reps > 0)
+    group, weight, reps, rir = group[valid], weight[valid], reps[valid], rir[valid]
+    # posición de cada serie dentro de su par (0 = más reciente) sin perder el orden de entrada
+    order = np.argsort(group, kind="stable")
+    g = group[order]
+    rank = np.arange(len(g)) - np.searchsorted(g, g, side="left")
+    keep = order[rank < RECENT]
+
+    e1rm = weight[keep] * (1 + reps[keep] / 30)
+    counts = np.bincount(group[keep], minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        base = np.bincount(group[keep], weights=e1rm, minlength=n_groups) / counts
+
+    last = order[rank == 0]
+    last_reps = np.zeros(n_groups)
+    last_rir = np.full(n_groups, 2.0)
+    last_reps[group[last]] = reps[last]
+    last_rir[group[last]] = rir[last]
+
+    low, high = target_reps
+    factor = np.where((last_reps > high) & (last_rir >= 2), 1.025,
+                      np.where((last_reps < low) | (last_rir <= 0), 0.975, 1.0))
+    loads = np.round(base * 0.75 * factor / micro_step) * micro_step
+
+    has = counts > 0
+    return (
+        [float(x) if h else None for x, h in zip(loads, has)],
+        [float(x) if h else None for x, h in zip(base, has)],
+    )
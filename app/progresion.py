@@ -0,0 +1,102 @@
+# app/progresion.py
+"""
+Motor de progresión local: a partir de la semana 1 (microciclo base que genera la IA) construye
+las semanas 2..N de forma determinista, con el mismo formato de rutina_json que ya consumen
+ver_calendario_rutina y ver_dia_entreno.
+
+Esquema por bloques de `ciclo` semanas (4 por defecto, 5 para principiantes):
+  - semanas de acumulación: +1 serie cada semana (tope base + MAX_SERIES_EXTRA) y RIR objetivo
+    que baja de 3 a 1;
+  - última semana del bloque: descarga (~60 % de las series, RIR 4, mismas repeticiones);
+  - cada bloque nuevo sube la intensidad: el rango de repeticiones baja PASO_REPS_BLOQUE
+    (sin pasar de MIN_REPS) y vuelve a arrancar desde las series base.
+Los ejercicios por tiempo ("30s") suben 5 s por semana de acumulación.
+"""
+import copy
+import re
+
+MAX_SERIES_EXTRA = 2
+PASO_REPS_BLOQUE = 2
+MIN_REPS = 3
+RIR_ACUMULACION = [3, 2, 1, 1]
+RIR_DESCARGA = 4
+FACTOR_DESCARGA = 0.6
+
+_RE_RANGO = re.compile(r"^\s*(\d+)\s*[-–a]\s*(\d+)\s*$")
+_RE_NUM = re.compile(r"^\s*(\d+)\s*$")
+_RE_TIEMPO = re.compile(r"^\s*(\d+)\s*(s|seg|segundos|\")\s*$", re.IGNORECASE)
+
+
+def _ciclo_para(nivel: str | None) -> int:
+    return 5 if (nivel or "").strip().lower() in {"principiante", "bajo", "nulo", "ninguna"} else 4
+
+
+def _series(valor, semana_bloque: int, descarga: bool) -> int | str:
+    try:
+        base = int(valor)
+    except (TypeError, ValueError):
+        return valor  # "3-4", "AMRAP"...: se deja tal cual
+    if descarga:
+        return max(1, round(base * FACTOR_DESCARGA))
+    return base + min(semana_bloque, MAX_SERIES_EXTRA)
+
+
+def _repeticiones(valor, bloque: int, semana_bloque: int, descarga: bool):
+    """Baja el rango de repeticiones por bloque; los tiempos suben 5 s por semana."""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return max(MIN_REPS, int(valor) - PASO_REPS_BLOQUE * bloque)
+    if not isinstance(valor, str):
+        return valor
+    if m := _RE_NUM.match(valor):
+        return str(max(MIN_REPS, int(m.group(1)) - PASO_REPS_BLOQUE * bloque))
+    if m := _RE_RANGO.match(valor):
+        lo, hi = int(m.group(1)), int(m.group(2))
+        d = PASO_REPS_BLOQUE * bloque
+        lo, hi = max(MIN_REPS, lo - d), max(MIN_REPS, hi - d)
+        return f"{lo}-{hi}" if hi > lo else str(lo)
+    if m := _RE_TIEMPO.match(valor):
+        extra = 0 if descarga else 5 * (bloque + semana_bloque)
+        return f"{int(m.group(1)) + extra}s"
+    return valor
+
+
+def expandir_plan(rutina: dict, semanas: int, nivel: str | None = None) -> dict:
+    """
+    Devuelve una copia de `rutina` cuyo plan tiene `semanas` semanas derivadas de plan[0].
+    Si la IA devolvió más de una semana, se ignoran las demás (la progresión es solo local).
+    """
+    plan = rutina.get("plan") or []
+    if not plan:
+        return rutina
+    base = plan[0]
+    semanas = max(1, int(semanas or 1))
+    ciclo = _ciclo_para(nivel)
+
+    nuevo_plan = []
+    for i in range(semanas):
+        bloque, semana_bloque = divmod(i, ciclo)
+        # Descarga en la última semana de cada bloque completo (no al final si el bloque queda corto)
+        descarga = semanas >= ciclo and semana_bloque == ciclo - 1
+        semana = copy.deepcopy(base)
+        semana["semana"] = i + 1
+        semana["fase"] = "descarga" if descarga else "acumulación"
+        rir = RIR_DESCARGA if descarga else RIR_ACUMULACION[min(semana_bloque, len(RIR_ACUMULACION) - 1)]
+        for dia in semana.get("dias", []) or []:
+            for ej in dia.get("ejercicios", []) or []:
+                if i == 0:
+                    ej.setdefault("rir", rir)
+                    continue
+                if "series" in ej:
+                    ej["series"] = _series(ej["series"], semana_bloque, descarga)
+                if "repeticiones" in ej:
+                    ej["repeticiones"] = _repeticiones(ej["repeticiones"], bloque, semana_bloque, descarga)
+                ej["rir"] = rir
+            if descarga:
+                dia["consejo"] = "Semana de descarga: menos series y cargas cómodas (RIR 4) para recuperar."
+        nuevo_plan.append(semana)
+
+    resultado = dict(rutina)
+    resultado["plan"] = nuevo_plan
+    resultado["duracion"] = f"{semanas} semanas"
+    resultado["progresion"] = {"ciclo": ciclo, "generada": "local"}
+    return resultado
@@ -1,31 +1,109 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+# app/progress.py
+"""
+Router /progress: registro y lectura de series (workout_sets) por exercise_id del catálogo.
+
+  POST /progress/sets                      una serie o {"sets": [...]} en un único INSERT multi-fila
+  GET  /progress/sets?exercise_id=..       histórico paginado por clave (cursor), más recientes primero
+  GET  /progress/suggestion/{exercise_id}  carga sugerida (prediction.suggest_next_load)
+
+Se monta al final de app.main (de allí importa get_current_user).
+"""
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models, schemas
+from app.catalogo import resolver_ejercicios, slug_ejercicio
 from app.database import get_db
 from app.main import get_current_user
-from models import WorkoutSet
-from app.prediction import suggest_next_load
+from app.prediction import RECENT, suggest_next_load
+from app.records import actualizar_records
+from app.series import actualizar_estados, leer_cursor, pagina_series
 
 router = APIRouter(prefix="/progress", tags=["progress"])
 
+
+def _utc_naive(fecha: datetime | None) -> datetime | None:
+    # workout_sets.created_at es timestamp sin zona, en UTC
+    if fecha is None or fecha.tzinfo is None:
+        return fecha
+    return fecha.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _serie_out(ws: models.WorkoutSet) -> dict:
+    return {"id": ws.id, "exercise_id": ws.exercise_id, "weight": ws.weight, "reps": ws.reps, "rir": ws.rir,
+            "rest_sec": ws.rest_sec, "bodyweight": ws.bodyweight, "created_at": ws.created_at.isoformat()}
+
+
 @router.post("/sets")
-def create_set(payload: dict, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    ws = WorkoutSet(
-        user_id=user.id,
-        exercise_id=payload["exercise_id"],
-        weight=payload["weight"],
-        reps=payload["reps"],
-        rir=payload.get("rir", 2),
-        rest_sec=payload.get("rest_sec", 120),
-        bodyweight=payload.get("bodyweight")
-    )
-    db.add(ws); db.commit(); db.refresh(ws)
-    return {"ok": True, "set_id": ws.id}
+async def crear_series(
+    payload: schemas.WorkoutSetsIn | schemas.WorkoutSetIn,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    sets = payload.sets if isinstance(payload, schemas.WorkoutSetsIn) else [payload]
+
+    # exercise_id explícito (se comprueba que existe) o nombre libre resuelto en el catálogo
+    ids = {s.exercise_id for s in sets if s.exercise_id is not None}
+    if ids:
+        existentes = set((await db.execute(select(models.Exercise.id).where(models.Exercise.id.in_(ids)))).scalars())
+        if ids - existentes:
+            raise HTTPException(404, f"Ejercicios no encontrados: {sorted(ids - existentes)}")
+    por_nombre = await resolver_ejercicios(db, [s.ejercicio for s in sets if s.exercise_id is None and s.ejercicio])
+
+    ahora = datetime.utcnow()
+    filas = []
+    for s in sets:
+        exercise_id = s.exercise_id or por_nombre.get(slug_ejercicio(s.ejercicio))
+        if exercise_id is None:
+            raise HTTPException(400, "Cada serie necesita exercise_id o ejercicio")
+        filas.append(models.WorkoutSet(
+            user_id=user["id"], exercise_id=exercise_id, weight=s.weight, reps=s.reps, rir=s.rir,
+            rest_sec=s.rest_sec, bodyweight=s.bodyweight, created_at=_utc_naive(s.created_at) or ahora,
+        ))
+    enviadas = list(filas)  # orden de la petición (set_ids se devuelve en este orden)
+    # en orden cronológico: exercise_state toma la última como la más reciente
+    filas.sort(key=lambda f: f.created_at)
+    db.add_all(filas)
+    await db.flush()  # un INSERT multi-fila con RETURNING de los ids
+    await actualizar_estados(db, user["id"], filas)
+    records = await actualizar_records(db, user["id"], filas)
+    await db.commit()
+    return {"ok": True, "set_ids": [f.id for f in enviadas], "set_id": enviadas[0].id,
+            "records": [{k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in r.items()} for r in records]}
+
+
+@router.get("/sets")
+async def listar_series(
+    exercise_id: int,
+    limite: int = Query(50, ge=1, le=500),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    try:
+        antes = leer_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    series, siguiente = await pagina_series(db, user["id"], exercise_id, antes, limite)
+    return {"sets": [_serie_out(s) for s in series], "siguiente": siguiente}
+
 
 @router.get("/suggestion/{exercise_id}")
-def get_suggestion(exercise_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    sets = db.query(WorkoutSet).filter_by(user_id=user.id, exercise_id=exercise_id)\
-                               .order_by(WorkoutSet.created_at.desc()).limit(10).all()
-    load = suggest_next_load(sets)
+async def sugerencia_por_id(
+    exercise_id: int,
+    micro_step: float = Query(2.5, gt=0),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    W = models.WorkoutSet
+    sets = (await db.execute(
+        select(W).where(W.user_id == user["id"], W.exercise_id == exercise_id, W.weight > 0, W.reps > 0)
+        .order_by(W.created_at.desc(), W.id.desc()).limit(RECENT)
+    )).scalars().all()
+    load = suggest_next_load(sets, micro_step=micro_step)
     if load is None:
-        return {"suggested_load": None, "reason": "No history – run baseline test"}
-    return {"suggested_load": load}
\ No newline at end of file
+        return {"exercise_id": exercise_id, "suggested_load": None, "reason": "No history – run baseline test"}
+    return {"exercise_id": exercise_id, "suggested_load": load, "samples": [_serie_out(s) for s in sets]}
@@ -0,0 +1,179 @@
+# app/records.py
+"""
+Récords personales (tabla records_personales), mantenidos de forma incremental.
+
+Cada escritura de series (app.series.registrar_series, POST /progress/sets) llama a
+actualizar_records en la misma transacción: se calculan en memoria los candidatos del lote
+(mejor e1RM, más reps con cada peso, volumen del día) y se aplican con un único
+INSERT ... ON CONFLICT DO UPDATE ... WHERE valor < excluded.valor, así que una fila solo se
+reescribe cuando se supera y RETURNING dice exactamente qué récords han caído. Nunca se recorre
+el histórico completo; el feed de récords recientes es un range scan por (user_id, actualizado_en).
+
+Al batir un récord previo (no en la primera marca de un ejercicio) se deja una Notificacion
+tipo 'record' con el resumen del lote. El récord de volumen de un día que sigue creciendo serie a
+serie se actualiza en el sitio: conserva `anterior` (la mejor marca de otro día) y no avisa de nuevo.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, case, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.prediction import e1rm_epley
+
+TIPOS = ("e1rm", "reps", "volumen")
+AVISO_MAX_ANTIGUEDAD = timedelta(days=2)  # series importadas con fecha antigua: récord sí, aviso no
+
+
+def _candidatos(usuario_id: int, filas: list[models.WorkoutSet]) -> dict[tuple, dict]:
+    """Mejor marca del lote por (exercise_id, tipo, peso_ref) para e1rm y reps."""
+    mejores: dict[tuple, dict] = {}
+
+    def proponer(clave: tuple, valor: float, ws: models.WorkoutSet) -> None:
+        if clave not in mejores or valor > mejores[clave]["valor"]:
+            mejores[clave] = {
+                "user_id": usuario_id, "exercise_id": clave[0], "tipo": clave[1], "peso_ref": clave[2],
+                "valor": valor, "peso": float(ws.weight), "reps": int(ws.reps),
+                "workout_set_id": ws.id, "fecha": ws.created_at,
+            }
+
+    for ws in filas:
+        proponer((ws.exercise_id, "e1rm", 0.0), round(e1rm_epley(ws.weight, ws.reps), 2), ws)
+        proponer((ws.exercise_id, "reps", round(float(ws.weight), 2)), float(ws.reps), ws)
+    return mejores
+
+
+async def _volumen_del_dia(db: AsyncSession, usuario_id: int, filas: list[models.WorkoutSet]) -> list[dict]:
+    """Volumen (peso x reps) de cada día y ejercicio tocado por el lote, con las series ya guardadas de ese día."""
+    W = models.WorkoutSet
+    ultima: dict[tuple, datetime] = {}
+    for ws in filas:
+        clave = (ws.exercise_id, ws.created_at.date())
+        ultima[clave] = max(ultima.get(clave, ws.created_at), ws.created_at)
+    dias = [d for _, d in ultima]
+    dia = func.date(W.created_at)
+    res = await db.execute(
+        select(W.exercise_id, dia, func.sum(W.weight * W.reps))
+        .where(W.user_id == usuario_id, W.exercise_id.in_({e for e, _ in ultima}),
+               W.created_at >= datetime.combine(min(dias), datetime.min.time()),
+               W.created_at < datetime.combine(max(dias) + timedelta(days=1), datetime.min.time()),
+               W.weight > 0, W.reps > 0)
+        .group_by(W.exercise_id, dia)
+    )
+    mejores: dict[int, dict] = {}
+    for exercise_id, d, volumen in res.all():
+        if (exercise_id, d) not in ultima:  # día intermedio del rango que el lote no toca
+            continue
+        if exercise_id not in mejores or volumen > mejores[exercise_id]["valor"]:
+            mejores[exercise_id] = {
+                "user_id": usuario_id, "exercise_id": exercise_id, "tipo": "volumen", "peso_ref": 0.0,
+                "valor": round(float(volumen), 2), "peso": None, "reps": None, "workout_set_id": None,
+                "fecha": ultima[(exercise_id, d)],
+            }
+    return list(mejores.values())
+
+
+def _describir(r: dict, nombre: str) -> str:
+    if r["tipo"] == "e1rm":
+        return f"{nombre}: e1RM {r['valor']:g} kg ({r['peso']:g} kg x {r['reps']})"
+    if r["tipo"] == "reps":
+        return f"{nombre}: {int(r['valor'])} reps con {r['peso_ref']:g} kg"
+    return f"{nombre}: {r['valor']:g} kg de volumen en el día"
+
+
+async def _notificar(db: AsyncSession, usuario_id: int, batidos: list[dict]) -> None:
+    nombres = dict((await db.execute(
+        select(models.Exercise.id, models.Exercise.name).where(models.Exercise.id.in_({r["exercise_id"] for r in batidos}))
+    )).all())
+    lineas = [_describir(r, nombres.get(r["exercise_id"], "Ejercicio")) for r in batidos]
+    db.add(models.Notificacion(
+        usuario_id=usuario_id,
+        tipo="record",
+        contenido=("¡Nuevo récord! " + "; ".join(lineas))[:500],
+        fecha=datetime.utcnow(),
+        leida=False,
+        datos_extra={"records": [
+            {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in r.items()} for r in batidos
+        ]},
+    ))
+
+
+async def actualizar_records(db: AsyncSession, usuario_id: int, filas: list[models.WorkoutSet]) -> list[dict]:
+    """
+    Aplica las series recién insertadas (con id) a records_personales, sin commit.
+    Devuelve los récords que han batido una marca anterior (los que se notifican).
+    """
+    filas = [ws for ws in filas if ws.weight and ws.weight > 0 and ws.reps and ws.reps > 0]
+    if not filas:
+        return []
+    valores = list(_candidatos(usuario_id, filas).values()) + await _volumen_del_dia(db, usuario_id, filas)
+
+    R = models.RecordPersonal
+    # récords de volumen ya guardados de estos ejercicios: si son del mismo día que el lote, el
+    # volumen de ese día solo está creciendo serie a serie (no es un récord nuevo)
+    volumen_previo = dict((await db.execute(
+        select(R.exercise_id, R.fecha)
+        .where(R.user_id == usuario_id, R.tipo == "volumen",
+               R.exercise_id.in_({v["exercise_id"] for v in valores if v["tipo"] == "volumen"}))
+        .with_for_update()
+    )).all())
+
+    stmt = pg_insert(R).values(valores)
+    mismo_dia = func.date(R.fecha) == func.date(stmt.excluded.fecha)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[R.user_id, R.exercise_id, R.tipo, R.peso_ref],
+        set_={"anterior": case((and_(R.tipo == "volumen", mismo_dia), R.anterior), else_=R.valor),  # valores de la fila existente
+              **{k: stmt.excluded[k] for k in ("valor", "peso", "reps", "workout_set_id", "fecha")},
+              "actualizado_en": func.now()},
+        where=R.valor < stmt.excluded.valor,
+    ).returning(R.exercise_id, R.tipo, R.peso_ref, R.valor, R.anterior, R.peso, R.reps, R.fecha)
+    cambiados = [dict(r._mapping) for r in (await db.execute(stmt)).all()]
+
+    limite = datetime.utcnow() - AVISO_MAX_ANTIGUEDAD
+    batidos = [
+        r for r in cambiados
+        if r["anterior"] is not None and r["fecha"] >= limite
+        and not (r["tipo"] == "volumen" and r["exercise_id"] in volumen_previo
+                 and volumen_previo[r["exercise_id"]].date() == r["fecha"].date())
+    ]
+    if batidos:
+        await _notificar(db, usuario_id, batidos)
+    return batidos
+
+
+def _record_a_dict(r: models.RecordPersonal, nombre: str | None = None) -> dict:
+    return {
+        "exercise_id": r.exercise_id, "ejercicio": nombre, "tipo": r.tipo, "peso_ref": r.peso_ref,
+        "valor": r.valor, "anterior": r.anterior, "peso": r.peso, "reps": r.reps,
+        "fecha": r.fecha.isoformat() if r.fecha else None,
+    }
+
+
+async def records_recientes(db: AsyncSession, usuario_id: int, limite: int = 20, solo_batidos: bool = True) -> list[dict]:
+    """Últimos récords del usuario (más recientes primero); por defecto solo los que superan una marca previa."""
+    R = models.RecordPersonal
+    q = (
+        select(R, models.Exercise.name)
+        .join(models.Exercise, models.Exercise.id == R.exercise_id)
+        .where(R.user_id == usuario_id)
+    )
+    if solo_batidos:
+        q = q.where(R.anterior.is_not(None))
+    res = await db.execute(q.order_by(R.actualizado_en.desc()).limit(limite))
+    return [_record_a_dict(r, nombre) for r, nombre in res.all()]
+
+
+async def records_ejercicio(db: AsyncSession, usuario_id: int, exercise_id: int) -> dict:
+    """Insignias de un ejercicio: {"e1rm": {...}, "volumen": {...}, "reps": [{...} por peso, de más a menos]}."""
+    R = models.RecordPersonal
+    filas = (await db.execute(
+        select(R).where(R.user_id == usuario_id, R.exercise_id == exercise_id).order_by(R.peso_ref.desc())
+    )).scalars().all()
+    salida: dict = {"e1rm": None, "volumen": None, "reps": []}
+    for r in filas:
+        if r.tipo == "reps":
+            salida["reps"].append(_record_a_dict(r))
+        else:
+            salida[r.tipo] = _record_a_dict(r)
+    return salida
@@ -0,0 +1,181 @@
+# app/registro_ia.py
+"""
+Contabilidad de las llamadas a la IA (tabla ai_calls).
+
+app.gateway_ia anota cada llamada al terminar, con su modelo, los tokens de entrada y salida, la
+latencia total (cola + reintentos + respuesta), los reintentos y el coste estimado
+(settings.IA_PRECIOS). Quién la provocó sale de un contextvar:
+  - peticiones web: get_current_user fija usuario y ruta;
+  - worker: ejecutar_trabajo fija usuario y 'trabajo:<tipo>'.
+El gimnasio se resuelve al volcar, con el gimnasio principal del usuario.
+
+Las filas se acumulan en memoria y se insertan por lotes cada IA_REGISTRO_FLUSH_S segundos,
+así el registro nunca añade una ida a la BD a la llamada IA.
+
+Informe: /diag/ia-llamadas (p50/p95 de latencia, tokens y gasto por función, ruta y gimnasio).
+"""
+import asyncio
+import logging
+import time
+from contextvars import ContextVar, Token
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_contexto: ContextVar[dict | None] = ContextVar("contexto_ia", default=None)
+_pendientes: list[dict] = []
+_tarea: asyncio.Task | None = None
+
+
+def fijar_contexto(**valores) -> Token:
+    """Añade usuario_id / gimnasio_id / origen al contexto de las llamadas IA de esta tarea."""
+    actual = _contexto.get() or {}
+    return _contexto.set({**actual, **{k: v for k, v in valores.items() if v is not None}})
+
+
+def restablecer_contexto(token: Token) -> None:
+    _contexto.reset(token)
+
+
+def uso_de(respuesta) -> tuple[int | None, int | None]:
+    u = getattr(respuesta, "usage", None)
+    if u is None:
+        return None, None
+    entrada = getattr(u, "prompt_tokens", None) or getattr(u, "input_tokens", None)
+    salida = getattr(u, "completion_tokens", None) or getattr(u, "output_tokens", None)
+    return entrada, salida
+
+
+def _coste(modelo: str, tipo: str, entrada: int | None, salida: int | None) -> float | None:
+    precios = settings.IA_PRECIOS.get(modelo)
+    if entrada is None and salida is None:
+        return settings.IA_PRECIO_IMAGEN if tipo == "imagen" else None
+    if not precios:
+        return None
+    return round(((entrada or 0) * precios[0] + (salida or 0) * precios[1]) / 1_000_000, 6)
+
+
+def anotar(etiqueta: str | None, modelo: str, tipo: str, inicio: float, reintentos: int,
+           respuesta=None, error: Exception | None = None, uso: tuple | None = None) -> None:
+    """Registra una llamada terminada (bien o con error). `inicio` es time.perf_counter() al empezar."""
+    entrada, salida = uso if uso is not None else uso_de(respuesta)
+    latencia_ms = int((time.perf_counter() - inicio) * 1000)
+    ctx = _contexto.get() or {}
+    fila = {
+        "etiqueta": (etiqueta or "sin_etiqueta")[:60],
+        "origen": (ctx.get("origen") or "")[:120] or None,
+        "modelo": modelo[:60],
+        "tipo": tipo,
+        "usuario_id": ctx.get("usuario_id"),
+        "gimnasio_id": ctx.get("gimnasio_id"),
+        "tokens_entrada": entrada,
+        "tokens_salida": salida,
+        "latencia_ms": latencia_ms,
+        "reintentos": reintentos,
+        "ok": error is None,
+        "error": f"{type(error).__name__}: {error}"[:200] if error is not None else None,
+        "coste_usd": _coste(modelo, tipo, entrada, salida) if error is None else None,
+    }
+    logger.info(
+        f"[IA] {fila['etiqueta']} {modelo} {latencia_ms}ms tokens={entrada}/{salida} "
+        f"reintentos={reintentos}{'' if error is None else ' ERROR'}"
+    )
+    if not settings.IA_REGISTRO_ACTIVO:
+        return
+    _pendientes.append(fila)
+    _programar()
+
+
+def _programar() -> None:
+    global _tarea
+    if _tarea is not None and not _tarea.done():
+        return
+    try:
+        _tarea = asyncio.get_running_loop().create_task(_bucle())
+    except RuntimeError:  # sin loop (no debería pasar: el gateway es async)
+        pass
+
+
+async def _bucle() -> None:
+    while _pendientes:
+        await asyncio.sleep(settings.IA_REGISTRO_FLUSH_S)
+        await volcar()
+
+
+async def volcar() -> int:
+    """Inserta lo pendiente en un único INSERT multi-fila. Devuelve cuántas filas escribió."""
+    if not _pendientes:
+        return 0
+    lote = _pendientes[:]
+    del _pendientes[:len(lote)]
+    try:
+        async with SessionLocal() as db:
+            sin_gimnasio = {f["usuario_id"] for f in lote if f["usuario_id"] and not f["gimnasio_id"]}
+            if sin_gimnasio:
+                res = await db.execute(
+                    select(models.UsuarioGimnasio.usuario_id, models.UsuarioGimnasio.gimnasio_id)
+                    .where(models.UsuarioGimnasio.usuario_id.in_(list(sin_gimnasio)),
+                           models.UsuarioGimnasio.es_principal == True)
+                )
+                gimnasios = dict(res.all())
+                for f in lote:
+                    if not f["gimnasio_id"]:
+                        f["gimnasio_id"] = gimnasios.get(f["usuario_id"])
+            await db.execute(models.LlamadaIA.__table__.insert(), lote)
+            await db.commit()
+    except Exception as e:
+        logger.warning(f"[IA] no se pudo guardar el registro de {len(lote)} llamadas: {e}")
+        return 0
+    return len(lote)
+
+
+async def _agrupado(db: AsyncSession, columna, desde: datetime) -> list[dict]:
+    L = models.LlamadaIA
+    res = await db.execute(
+        select(
+            columna.label("clave"),
+            func.count(L.id),
+            func.count(L.id).filter(L.ok == False),
+            func.percentile_cont(0.5).within_group(L.latencia_ms),
+            func.percentile_cont(0.95).within_group(L.latencia_ms),
+            func.coalesce(func.sum(L.tokens_entrada), 0),
+            func.coalesce(func.sum(L.tokens_salida), 0),
+            func.coalesce(func.sum(L.coste_usd), 0.0),
+            func.coalesce(func.sum(L.reintentos), 0),
+        )
+        .where(L.creado_en >= desde)
+        .group_by(columna)
+        .order_by(desc(func.coalesce(func.sum(L.coste_usd), 0.0)))
+    )
+    return [
+        {"clave": clave, "llamadas": n, "errores": err, "p50_ms": round(p50 or 0), "p95_ms": round(p95 or 0),
+         "tokens_entrada": t_in, "tokens_salida": t_out, "coste_usd": round(coste, 4), "reintentos": reint}
+        for clave, n, err, p50, p95, t_in, t_out, coste, reint in res.all()
+    ]
+
+
+async def informe(db: AsyncSession, horas: int = 24) -> dict:
+    """Latencia (p50/p95), tokens y gasto de las últimas `horas`, por función, ruta y gimnasio."""
+    desde = datetime.now(timezone.utc) - timedelta(hours=horas)
+    por_gimnasio = await _agrupado(db, models.LlamadaIA.gimnasio_id, desde)
+    ids = [g["clave"] for g in por_gimnasio if g["clave"]]
+    if ids:
+        res = await db.execute(select(models.Gimnasio.id, models.Gimnasio.nombre).where(models.Gimnasio.id.in_(ids)))
+        nombres = dict(res.all())
+        for g in por_gimnasio:
+            g["gimnasio"] = nombres.get(g["clave"])
+    return {
+        "horas": horas,
+        "pendientes_en_memoria": len(_pendientes),
+        "por_etiqueta": await _agrupado(db, models.LlamadaIA.etiqueta, desde),
+        "por_origen": await _agrupado(db, models.LlamadaIA.origen, desde),
+        "por_modelo": await _agrupado(db, models.LlamadaIA.modelo, desde),
+        "por_gimnasio": por_gimnasio,
+    }
@@ -0,0 +1,225 @@
+# app/reparar_imagenes.py
+"""
+Reparación masiva de imágenes de ejercicios en las rutinas guardadas.
+
+Una imagen está rota si su imagen_url es remota (http/https: las URLs firmadas de la API caducan)
+o apunta a /static/uploads/ pero el fichero ya no existe. Para cada una, en este orden:
+  1) registro de imágenes (sin coste),
+  2) descarga de la URL remota con un ClientSession compartido,
+  3) regeneración con IA.
+
+Recorre las rutinas por lotes en orden de id (keyset), con concurrencia acotada y un checkpoint
+(último id procesado) tras cada lote, de modo que se puede reanudar tras una caída. Las
+regeneraciones con IA (de pago) tienen un presupuesto por ejecución (REPARAR_MAX_REGENERADAS):
+agotado, las imágenes que quedan se vacían para que el usuario las pida con "🪄".
+
+  python -m app.reparar_imagenes [--checkpoint fichero.json] [--concurrencia 8] [--lote 50] [--max-regeneradas 200]
+  POST /admin/reparar-imagenes   (encola un trabajo 'reparar_imagenes' en la cola de app.trabajos)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from pathlib import Path
+
+import aiohttp
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import flag_modified
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.imagenes import (
+    ESTILO_DEFECTO, _existe_local, _imagen_para_ejercicio, _safe_slug,
+    anotar_usos, buscar_imagenes, descargar_imagen_ia, registrar_imagenes,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def imagen_rota(url: str) -> bool:
+    url = (url or "").strip()
+    if url.startswith(("http://", "https://")):
+        return True
+    return url.startswith("/static/uploads/") and not _existe_local(url)
+
+
+def _ejercicios_rotos(plan: dict) -> list[dict]:
+    return [
+        ej
+        for semana in plan.get("plan", []) or []
+        for dia in semana.get("dias", []) or []
+        for ej in dia.get("ejercicios", []) or []
+        if (ej.get("nombre") or "").strip() and imagen_rota(ej.get("imagen_url"))
+    ]
+
+
+def _stats_vacias() -> dict:
+    return {"rutinas_revisadas": 0, "rutinas_modificadas": 0, "registro": 0,
+            "descargadas": 0, "regeneradas": 0, "fallidas": 0, "llamadas_ia": 0, "sin_presupuesto": 0}
+
+
+async def reparar_rutinas(
+    db: AsyncSession,
+    rutinas: list[models.Rutina],
+    session: aiohttp.ClientSession,
+    concurrencia: int,
+    stats: dict,
+    estilo: str = ESTILO_DEFECTO,
+    max_regeneradas: int | None = None,
+) -> None:
+    """
+    Repara un grupo de rutinas ya cargadas en `db`: un solo lookup al registro y trabajo en paralelo.
+    `max_regeneradas` acota stats["llamadas_ia"] (acumulado de la ejecución); None = sin tope.
+    """
+    rotos: dict[str, list[dict]] = {}  # slug -> apariciones
+    afectadas: dict[int, models.Rutina] = {}
+    for r in rutinas:
+        stats["rutinas_revisadas"] += 1
+        for ej in _ejercicios_rotos(r.rutina_json or {}):
+            rotos.setdefault(_safe_slug(ej["nombre"]), []).append(ej)
+            afectadas[r.id] = r
+    if not rotos:
+        return
+
+    en_registro = await buscar_imagenes(db, list(rotos), estilo)
+    for slug, url in en_registro.items():
+        for ej in rotos.pop(slug):
+            ej["imagen_url"] = url
+    stats["registro"] += len(en_registro)
+    await db.commit()  # sin transacción abierta durante descargas y regeneraciones
+
+    sem = asyncio.Semaphore(concurrencia)
+
+    async def _una(slug: str, apariciones: list[dict]) -> tuple[str, str | None]:
+        ej = apariciones[0]
+        remota = next((a["imagen_url"] for a in apariciones if str(a.get("imagen_url", "")).startswith("http")), None)
+        async with sem:
+            if remota:
+                local = await descargar_imagen_ia(remota, f"ia_{slug}_{uuid.uuid4().hex[:8]}.png", session)
+                if local:
+                    stats["descargadas"] += 1
+                    return slug, local
+            if max_regeneradas is not None and stats["llamadas_ia"] >= max_regeneradas:
+                stats["sin_presupuesto"] += 1
+                return slug, None
+            stats["llamadas_ia"] += 1  # se cobra aunque falle
+            try:
+                local = await asyncio.wait_for(
+                    _imagen_para_ejercicio(ej["nombre"], ej.get("motivo", ""), estilo), timeout=settings.IMG_TIMEOUT_S
+                )
+            except Exception as e:
+                logger.warning(f"[IMG-REPARAR] no se pudo regenerar '{ej['nombre']}': {e}")
+                local = None
+            if local:
+                stats["regeneradas"] += 1
+            else:
+                stats["fallidas"] += 1
+            return slug, local
+
+    resultados = await asyncio.gather(*(_una(s, a) for s, a in rotos.items()))
+    nuevas = {}
+    for slug, local in resultados:
+        for ej in rotos[slug]:
+            ej["imagen_url"] = local or ""  # vacía: el usuario puede pulsar "🪄"
+        if local:
+            nuevas[slug] = local
+    await anotar_usos(db, en_registro, estilo)
+    await registrar_imagenes(db, nuevas, estilo)
+
+    for r in afectadas.values():
+        flag_modified(r, "rutina_json")  # cambios in-place en JSONB
+    stats["rutinas_modificadas"] += len(afectadas)
+    await db.commit()
+
+
+async def reparar_todas(
+    db: AsyncSession,
+    desde_id: int = 0,
+    lote: int = 50,
+    concurrencia: int | None = None,
+    checkpoint=None,
+    stats: dict | None = None,
+    max_regeneradas: int | None = None,
+) -> dict:
+    """
+    Recorre todas las rutinas con id > desde_id. Tras cada lote llama a `await checkpoint(ultimo_id, stats)`.
+    Lote, concurrencia y regeneraciones IA se acotan con los topes REPARAR_MAX_* de la configuración.
+    Devuelve las estadísticas con duración y rendimiento.
+    """
+    concurrencia = min(max(1, concurrencia or settings.IMG_CONCURRENCIA), settings.REPARAR_MAX_CONCURRENCIA)
+    lote = min(max(1, lote), settings.REPARAR_MAX_LOTE)
+    max_regeneradas = min(max(0, settings.REPARAR_MAX_REGENERADAS if max_regeneradas is None else max_regeneradas),
+                          settings.REPARAR_MAX_REGENERADAS)
+    stats = {**_stats_vacias(), **(stats or {})}
+    inicio = time.perf_counter()
+    ultimo_id = desde_id
+
+    conector = aiohttp.TCPConnector(limit=concurrencia * 2)
+    async with aiohttp.ClientSession(connector=conector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+        while True:
+            res = await db.execute(
+                select(models.Rutina)
+                .where(models.Rutina.id > ultimo_id)
+                .order_by(models.Rutina.id)
+                .limit(lote)
+            )
+            rutinas = list(res.scalars())
+            if not rutinas:
+                break
+            await reparar_rutinas(db, rutinas, session, concurrencia, stats, max_regeneradas=max_regeneradas)
+            ultimo_id = rutinas[-1].id
+            db.expunge_all()  # no acumular todo el histórico en la sesión
+
+            segundos = time.perf_counter() - inicio
+            stats["segundos"] = round(segundos, 1)
+            stats["rutinas_por_s"] = round(stats["rutinas_revisadas"] / segundos, 2) if segundos else None
+            logger.info(f"[IMG-REPARAR] hasta rutina {ultimo_id}: {stats}")
+            if checkpoint is not None:
+                await checkpoint(ultimo_id, stats)
+
+    segundos = time.perf_counter() - inicio
+    imagenes = stats["registro"] + stats["descargadas"] + stats["regeneradas"]
+    stats.update(
+        ultimo_id=ultimo_id,
+        segundos=round(segundos, 1),
+        rutinas_por_s=round(stats["rutinas_revisadas"] / segundos, 2) if segundos else None,
+        imagenes_por_s=round(imagenes / segundos, 2) if segundos else None,
+    )
+    return stats
+
+
+async def contar_pendientes(db: AsyncSession, desde_id: int = 0) -> int:
+    return await db.scalar(select(func.count(models.Rutina.id)).where(models.Rutina.id > desde_id)) or 0
+
+
+async def _cli(args) -> None:
+    ruta = Path(args.checkpoint)
+    estado = json.loads(ruta.read_text()) if ruta.is_file() and not args.desde_cero else {}
+    desde = estado.get("ultimo_id", 0)
+    if desde:
+        print(f"Reanudando desde la rutina {desde}")
+
+    async def _guardar(ultimo_id: int, stats: dict):
+        tmp = ruta.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"ultimo_id": ultimo_id, "stats": stats}))
+        tmp.replace(ruta)  # escritura atómica
+
+    async with SessionLocal() as db:
+        stats = await reparar_todas(db, desde, args.lote, args.concurrencia, _guardar, estado.get("stats"),
+                                    args.max_regeneradas)
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    p = argparse.ArgumentParser(description="Repara las imágenes rotas de todas las rutinas")
+    p.add_argument("--checkpoint", default="reparar_imagenes.json")
+    p.add_argument("--desde-cero", action="store_true", help="ignora el checkpoint existente")
+    p.add_argument("--lote", type=int, default=50)
+    p.add_argument("--concurrencia", type=int, default=None)
+    p.add_argument("--max-regeneradas", type=int, default=None, help="tope de imágenes regeneradas con IA")
+    asyncio.run(_cli(p.parse_args()))
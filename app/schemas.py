@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import List
+from typing import List, Union
 from datetime import datetime
-from pydantic import BaseModel, Field, conint, confloat
+from pydantic import BaseModel, Field, conint, confloat, constr
 from datetime import date
 from typing import Optional
 
@@ -158,4 +158,30 @@ class ProgressDailyOut(ProgressDailyBase):
     id: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- Series (router /progress) ---
+
+class WorkoutSetIn(BaseModel):
+    exercise_id: Optional[int] = None
+    ejercicio: Optional[str] = Field(default=None, max_length=200)  # nombre libre si no hay exercise_id
+    weight: confloat(ge=0, le=1000)  # 0 = peso corporal (dominadas...); sugerencias y récords lo ignoran
+    reps: conint(gt=0, le=200)
+    rir: conint(ge=0, le=10) = 2
+    rest_sec: conint(ge=0, le=3600) = 120
+    bodyweight: Optional[confloat(ge=20, le=400)] = None
+    created_at: Optional[datetime] = None  # por defecto, ahora
+
+class WorkoutSetsIn(BaseModel):
+    sets: List[WorkoutSetIn] = Field(min_length=1, max_length=500)
+
+# --- Sugerencias de carga de un día (/api/sugerencia-carga/batch) ---
+
+class EjercicioSugerenciaIn(BaseModel):
+    nombre: str = Field(default="", max_length=200)
+    repeticiones: Optional[Union[int, str]] = None  # "8-10", "12" o 10
+    reps: Optional[Union[int, str]] = None
+
+class SugerenciasCargaIn(BaseModel):
+    ejercicios: List[Union[constr(max_length=200), EjercicioSugerenciaIn]] = Field(default_factory=list, max_length=50)
+    micro_step: Optional[confloat(gt=0, le=50)] = None  # por defecto 2.5
@@ -0,0 +1,374 @@
+# app/series.py
+"""
+Histórico estructurado de series (tabla workout_sets).
+
+Cada vez que se guarda una sesión, además del Progreso (JSON para la vista de progreso) se escribe
+una fila por serie con el exercise_id del catálogo. Las sugerencias de carga leen de aquí con un
+único range scan sobre el índice (user_id, exercise_id, created_at) en lugar de parsear los
+últimos Progreso y comparar nombres en Python.
+
+En la misma transacción se actualiza exercise_state (una fila por usuario y ejercicio: últimas 3
+series, e1RM medio, mejor serie, nº de sesiones), que es lo que leen las sugerencias de carga,
+y los récords personales (app.records).
+
+Formatos de sesión que se entienden (los que envían las plantillas):
+  /api/guardar-sesion           {"items": [{nombre, peso, reps, series}], "exercises": [{nombre, sets: [...]}]}
+  /mi-entreno/guardar-sesion    {"ejercicios_realizados": [{nombre, series: [{peso, repes, rpe}]}]}
+  antiguo                       {"ejercicios": [{nombre, peso, repes, rir}]}
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.catalogo import resolver_ejercicios, slug_ejercicio
+from app.prediction import e1rm_epley
+from app.records import actualizar_records
+
+RIR_DEFECTO = 2
+RECIENTES = 3  # series que guarda exercise_state (las que usa la sugerencia de carga)
+
+
+def _num(valor, tipo=float):
+    try:
+        return tipo(valor) if valor not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _rir(serie: dict) -> int:
+    rir = _num(serie.get("rir"), int)
+    if rir is not None:
+        return max(0, rir)
+    rpe = _num(serie.get("rpe"))
+    return max(0, round(10 - rpe)) if rpe else RIR_DEFECTO
+
+
+def extraer_series(detalle: dict) -> list[dict]:
+    """[{nombre, weight, reps, rir}] de un detalle de sesión, una entrada por serie hecha."""
+    salida: list[dict] = []
+    con_series: set[str] = set()
+
+    # 1) series registradas una a una (lo más fiable)
+    for ej in (detalle.get("exercises") or []) + (detalle.get("ejercicios_realizados") or []):
+        nombre = (ej.get("nombre") or "").strip()
+        lista = ej.get("sets") or ej.get("series")
+        for s in lista if isinstance(lista, list) else []:
+            if not isinstance(s, dict):
+                continue
+            peso, reps = _num(s.get("peso")), _num(s.get("repes") or s.get("reps"), int)
+            if nombre and peso and reps:
+                salida.append({"nombre": nombre, "weight": peso, "reps": reps, "rir": _rir(s)})
+                con_series.add(slug_ejercicio(nombre))
+
+    # 2) resumen por ejercicio (peso x reps x nº de series), si no hubo series sueltas
+    for ej in (detalle.get("items") or []) + (detalle.get("ejercicios") or []):
+        if not isinstance(ej, dict):
+            continue
+        nombre = (ej.get("nombre") or "").strip()
+        if not nombre or slug_ejercicio(nombre) in con_series:
+            continue
+        peso, reps = _num(ej.get("peso")), _num(ej.get("repes") or ej.get("reps"), int)
+        if not (peso and reps):
+            continue
+        n = max(1, min(_num(ej.get("series"), int) or 1, 20))
+        salida.extend({"nombre": nombre, "weight": peso, "reps": reps, "rir": _rir(ej)} for _ in range(n))
+    return salida
+
+
+async def registrar_series(
+    db: AsyncSession,
+    usuario_id: int,
+    detalle: dict,
+    progreso_id: int | None = None,
+    rutina_id: int | None = None,
+    fecha: datetime | None = None,
+) -> list[models.WorkoutSet]:
+    """Inserta las series de la sesión (sin commit: va en la transacción del Progreso)."""
+    series = extraer_series(detalle)
+    if not series:
+        return []
+    ids = await resolver_ejercicios(db, [s["nombre"] for s in series])
+    fecha = (fecha or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+    filas = [
+        models.WorkoutSet(
+            user_id=usuario_id, exercise_id=ids[slug_ejercicio(s["nombre"])],
+            weight=s["weight"], reps=s["reps"], rir=s["rir"],
+            created_at=fecha, progreso_id=progreso_id, rutina_id=rutina_id,
+        )
+        for s in series
+        if slug_ejercicio(s["nombre"]) in ids
+    ]
+    db.add_all(filas)
+    await db.flush()
+    await actualizar_estados(db, usuario_id, filas)
+    await actualizar_records(db, usuario_id, filas)
+    return filas
+
+
+def _a_dict(ws) -> dict:
+    return {"weight": float(ws.weight), "reps": int(ws.reps), "rir": ws.rir if ws.rir is not None else RIR_DEFECTO,
+            "fecha": ws.created_at.isoformat() if ws.created_at else ""}
+
+
+async def ultimos_sets(
+    db: AsyncSession,
+    usuario_id: int,
+    ejercicio_nombre: str | None = None,
+    exercise_id: int | None = None,
+    limite: int = 20,
+) -> list[dict]:
+    """Últimas series del usuario en un ejercicio (más recientes primero) en una sola consulta indexada."""
+    W = models.WorkoutSet
+    q = select(W.weight, W.reps, W.rir, W.created_at).where(W.user_id == usuario_id)
+    if exercise_id is not None:
+        q = q.where(W.exercise_id == exercise_id)
+    else:
+        slug = slug_ejercicio(ejercicio_nombre)
+        if not slug:
+            return []
+        q = q.join(models.ExerciseAlias, models.ExerciseAlias.exercise_id == W.exercise_id).where(
+            models.ExerciseAlias.alias_slug == slug
+        )
+    res = await db.execute(q.order_by(W.created_at.desc(), W.id.desc()).limit(limite))
+    return [_a_dict(r) for r in res.all()]
+
+
+def cursor_de(fecha: datetime, id_: int) -> str:
+    """Cursor opaco de paginación por clave (created_at, id)."""
+    return f"{fecha.isoformat()}~{id_}"
+
+
+def leer_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    if not cursor:
+        return None
+    try:
+        fecha, id_ = cursor.rsplit("~", 1)
+        return datetime.fromisoformat(fecha), int(id_)
+    except ValueError:
+        raise ValueError("Cursor no válido")
+
+
+def _filtro_historial(
+    usuario_id: int,
+    exercise_id: int,
+    antes: tuple[datetime, int] | None = None,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    reps_min: int | None = None,
+    reps_max: int | None = None,
+) -> list:
+    """Condiciones del histórico de (usuario, ejercicio): cursor por clave + filtros de fecha [desde, hasta) y reps."""
+    W = models.WorkoutSet
+    filtro = [W.user_id == usuario_id, W.exercise_id == exercise_id]
+    if antes is not None:
+        filtro.append(tuple_(W.created_at, W.id) < tuple_(*antes))
+    if desde is not None:
+        filtro.append(W.created_at >= desde)
+    if hasta is not None:
+        filtro.append(W.created_at < hasta)
+    if reps_min is not None:
+        filtro.append(W.reps >= reps_min)
+    if reps_max is not None:
+        filtro.append(W.reps <= reps_max)
+    return filtro
+
+
+async def pagina_series(
+    db: AsyncSession,
+    usuario_id: int,
+    exercise_id: int,
+    antes: tuple[datetime, int] | None = None,
+    limite: int = 50,
+    **filtros,
+) -> tuple[list[models.WorkoutSet], str | None]:
+    """
+    Una página del histórico (más recientes primero) paginando por clave (created_at, id):
+    cada página es un range scan del índice desde el cursor, sin OFFSET.
+    `filtros`: desde, hasta, reps_min, reps_max (ver _filtro_historial).
+    Devuelve (series, cursor de la página siguiente o None).
+    """
+    W = models.WorkoutSet
+    q = select(W).where(*_filtro_historial(usuario_id, exercise_id, antes, **filtros))
+    filas = (await db.execute(q.order_by(W.created_at.desc(), W.id.desc()).limit(limite + 1))).scalars().all()
+    siguiente = cursor_de(filas[limite - 1].created_at, filas[limite - 1].id) if len(filas) > limite else None
+    return filas[:limite], siguiente
+
+
+async def historial_columnar(
+    db: AsyncSession,
+    usuario_id: int,
+    exercise_id: int,
+    antes: tuple[datetime, int] | None = None,
+    limite: int = 500,
+    **filtros,
+) -> dict:
+    """
+    Como pagina_series pero solo con las columnas que pintan las gráficas y en arrays paralelos
+    (una clave por columna en vez de un objeto por serie):
+        {"id": [...], "fecha": [ms epoch], "peso": [...], "reps": [...], "rir": [...], "e1rm": [...],
+         "siguiente": cursor | None}
+    """
+    W = models.WorkoutSet
+    filas = (await db.execute(
+        select(W.id, W.created_at, W.weight, W.reps, W.rir)
+        .where(*_filtro_historial(usuario_id, exercise_id, antes, **filtros))
+        .order_by(W.created_at.desc(), W.id.desc()).limit(limite + 1)
+    )).all()
+    siguiente = cursor_de(filas[limite - 1].created_at, filas[limite - 1].id) if len(filas) > limite else None
+    filas = filas[:limite]
+    return {
+        "id": [f.id for f in filas],
+        # created_at es UTC sin zona
+        "fecha": [int(f.created_at.replace(tzinfo=timezone.utc).timestamp() * 1000) for f in filas],
+        "peso": [float(f.weight) for f in filas],
+        "reps": [int(f.reps) for f in filas],
+        "rir": [f.rir if f.rir is not None else RIR_DEFECTO for f in filas],
+        "e1rm": [round(e1rm_epley(f.weight, f.reps), 1) if f.weight and f.reps else None for f in filas],
+        "siguiente": siguiente,
+    }
+
+
+# ===========================
+# Estado por (usuario, ejercicio)
+# ===========================
+
+def _estado_vacio() -> dict:
+    return {"ultimas_series": [], "mejor_peso": None, "mejor_reps": None, "mejor_e1rm": None,
+            "sesiones": 0, "ultima_fecha": None}
+
+
+def _avanzar(estado: dict, nuevas: list[models.WorkoutSet]) -> dict:
+    """
+    Aplica series nuevas (en orden de escritura, ninguna anterior a ultima_fecha) sobre el estado.
+    `sesiones` cuenta días (UTC) con series, como _estado_desde_historial: da igual que lleguen de una
+    en una (/progress/sets, el canal en vivo) o con la sesión entera.
+    """
+    estado = {**estado, "ultimas_series": list(estado["ultimas_series"] or [])}
+    for ws in nuevas:
+        estado["ultimas_series"].insert(0, _a_dict(ws))
+        e1rm = e1rm_epley(ws.weight, ws.reps)
+        if estado["mejor_e1rm"] is None or e1rm > estado["mejor_e1rm"]:
+            estado.update(mejor_peso=float(ws.weight), mejor_reps=int(ws.reps), mejor_e1rm=round(e1rm, 2))
+    estado["ultimas_series"] = estado["ultimas_series"][:RECIENTES]
+    dias = {ws.created_at.date() for ws in nuevas}
+    if estado["ultima_fecha"]:
+        dias.discard(estado["ultima_fecha"].date())  # ese día ya está contado
+    estado["sesiones"] = (estado["sesiones"] or 0) + len(dias)
+    estado["ultima_fecha"] = max(ws.created_at for ws in nuevas)
+    return estado
+
+
+async def _estado_desde_historial(db: AsyncSession, usuario_id: int, exercise_id: int) -> dict:
+    """Recalcula el estado desde workout_sets (solo para escrituras fuera de orden, p.ej. fechas antiguas)."""
+    W = models.WorkoutSet
+    filtro = (W.user_id == usuario_id, W.exercise_id == exercise_id, W.weight > 0, W.reps > 0)
+    recientes = await db.execute(
+        select(W.weight, W.reps, W.rir, W.created_at).where(*filtro)
+        .order_by(W.created_at.desc(), W.id.desc()).limit(RECIENTES)
+    )
+    mejor = (await db.execute(
+        select(W.weight, W.reps).where(*filtro).order_by((W.weight * (1 + W.reps / 30.0)).desc()).limit(1)
+    )).first()
+    sesiones, ultima = (await db.execute(
+        select(func.count(func.distinct(func.date(W.created_at))), func.max(W.created_at)).where(*filtro)
+    )).one()
+    return {
+        "ultimas_series": [_a_dict(r) for r in recientes.all()],
+        "mejor_peso": float(mejor.weight) if mejor else None,
+        "mejor_reps": int(mejor.reps) if mejor else None,
+        "mejor_e1rm": round(e1rm_epley(mejor.weight, mejor.reps), 2) if mejor else None,
+        "sesiones": sesiones,
+        "ultima_fecha": ultima,
+    }
+
+
+async def actualizar_estados(db: AsyncSession, usuario_id: int, filas: list[models.WorkoutSet]) -> None:
+    """
+    Actualiza exercise_state con las series recién insertadas (sin commit: misma transacción).
+    Las filas se crean vacías si faltan (ON CONFLICT DO NOTHING) y se bloquean (FOR UPDATE) para que
+    dos guardados simultáneos, también el primero de un ejercicio, no se pisen.
+    """
+    por_ejercicio: dict[int, list[models.WorkoutSet]] = {}
+    for ws in filas:
+        if ws.weight and ws.weight > 0 and ws.reps and ws.reps > 0:
+            por_ejercicio.setdefault(ws.exercise_id, []).append(ws)
+    if not por_ejercicio:
+        return
+    E = models.EstadoEjercicio
+    await db.execute(
+        pg_insert(E)
+        .values([{"user_id": usuario_id, "exercise_id": i, "ultimas_series": [], "sesiones": 0}
+                 for i in sorted(por_ejercicio)])
+        .on_conflict_do_nothing()
+    )
+    res = await db.execute(
+        select(E).where(E.user_id == usuario_id, E.exercise_id.in_(list(por_ejercicio)))
+        .order_by(E.exercise_id).with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    actuales = {e.exercise_id: e for e in res.scalars().all()}
+
+    valores = []
+    for exercise_id, nuevas in por_ejercicio.items():
+        previo = actuales.get(exercise_id)
+        if previo is not None and previo.ultima_fecha and min(ws.created_at for ws in nuevas) < previo.ultima_fecha:
+            estado = await _estado_desde_historial(db, usuario_id, exercise_id)
+        else:
+            base = _estado_vacio() if previo is None else {k: getattr(previo, k) for k in _estado_vacio()}
+            estado = _avanzar(base, nuevas)
+        recientes = estado["ultimas_series"]
+        valores.append({
+            "user_id": usuario_id,
+            "exercise_id": exercise_id,
+            **estado,
+            "e1rm": round(sum(e1rm_epley(s["weight"], s["reps"]) for s in recientes) / len(recientes), 2)
+            if recientes else None,
+            "ultimas_reps": recientes[0]["reps"] if recientes else None,
+            "ultimo_rir": recientes[0]["rir"] if recientes else None,
+        })
+
+    stmt = pg_insert(E).values(valores)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[E.user_id, E.exercise_id],
+        set_={**{k: stmt.excluded[k] for k in valores[0] if k not in ("user_id", "exercise_id")},
+              "actualizado_en": func.now()},
+    )
+    await db.execute(stmt)
+    # las instancias bloqueadas arriba quedarían con los valores viejos en la sesión
+    for previo in actuales.values():
+        db.expire(previo)
+
+
+def _estado_a_dict(e) -> dict:
+    return {
+        "exercise_id": e.exercise_id,
+        "ultimas_series": e.ultimas_series or [],
+        "e1rm": e.e1rm,
+        "ultimas_reps": e.ultimas_reps,
+        "ultimo_rir": e.ultimo_rir,
+        "mejor_serie": {"weight": e.mejor_peso, "reps": e.mejor_reps, "e1rm": e.mejor_e1rm}
+        if e.mejor_peso is not None else None,
+        "sesiones": e.sesiones,
+        "ultima_fecha": e.ultima_fecha.isoformat() if e.ultima_fecha else None,
+    }
+
+
+async def estados_por_ejercicio(db: AsyncSession, usuario_id: int, nombres) -> dict[str, dict]:
+    """
+    {slug: estado} del usuario para los ejercicios dados: una consulta por clave
+    (alias_slug único -> exercise_id -> clave primaria de exercise_state).
+    Los ejercicios sin series registradas no aparecen.
+    """
+    slugs = list({s for s in (slug_ejercicio(n) for n in nombres) if s})
+    if not slugs:
+        return {}
+    E, A = models.EstadoEjercicio, models.ExerciseAlias
+    res = await db.execute(
+        select(A.alias_slug, E)
+        .join(E, (E.exercise_id == A.exercise_id) & (E.user_id == usuario_id))
+        .where(A.alias_slug.in_(slugs))
+    )
+    return {slug: _estado_a_dict(e) for slug, e in res.all()}
@@ -0,0 +1,157 @@
+# app/sesion_en_vivo.py
+"""
+Canal WebSocket de una sesión en vivo (/ws/sesion/{sesion}).
+
+Es otro transporte para el protocolo de app/sincronizacion.py: los mismos eventos con clave de
+idempotencia, pero por un único socket autenticado una vez al conectar, en lugar de una petición
+HTTP (cookie + get_current_user) por serie o descanso. Además:
+  - escrituras agrupadas: los eventos se acumulan y se vuelcan con sincronizar() cada
+    SESION_WS_FLUSH_S segundos o cada SESION_WS_FLUSH_EVENTOS eventos (al instante con
+    'sesion_fin'); el servidor responde {"tipo": "ack", "claves": [...], "cursor": ...} y el
+    cliente solo entonces los quita de su cola en localStorage;
+  - temporizadores de descanso en el servidor: {"tipo": "temporizador", "idx": 0, "segundos": 90}
+    -> {"tipo": "temporizador", "idx": 0, "fin": <ms epoch>} y, al acabar,
+    {"tipo": "temporizador_fin", "idx": 0}; segundos=0 lo cancela;
+  - sugerencia de carga para la siguiente serie al recibir cada 'serie', calculada en memoria
+    con las últimas series del ejercicio (exercise_state al saludar + lo registrado en la sesión):
+    {"tipo": "sugerencia", "idx": 0, "carga": 62.5, "e1rm": 80.1}.
+
+Mensajes de control del cliente (no se guardan): {"tipo": "hola", "ejercicios": [nombres]},
+{"tipo": "temporizador", ...}.
+"""
+import asyncio
+import logging
+import time
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.catalogo import slug_ejercicio
+from app.config import settings
+from app.database import SessionLocal
+from app.prediction import RECENT, suggest_next_loads
+from app.series import estados_por_ejercicio, extraer_series
+from app.sincronizacion import TIPOS, sincronizar
+
+logger = logging.getLogger(__name__)
+
+
+class CanalSesion:
+    def __init__(self, websocket: WebSocket, usuario_id: int, sesion: str, meta: dict):
+        self.ws = websocket
+        self.usuario_id = usuario_id
+        self.sesion = sesion
+        self.meta = meta
+        self.pendientes: list[dict] = []
+        self.recientes: dict[int, list[dict]] = {}    # idx -> series (más reciente primero)
+        self.temporizadores: dict[int, asyncio.Task] = {}
+        self._hay_datos = asyncio.Event()
+        self._lock = asyncio.Lock()         # un volcado a la vez
+        self._envio = asyncio.Lock()        # recepción, volcado y temporizadores escriben en el mismo socket
+
+    async def _enviar(self, mensaje: dict) -> None:
+        async with self._envio:
+            await self.ws.send_json(mensaje)
+
+    async def atender(self) -> None:
+        volcador = asyncio.create_task(self._bucle_volcado())
+        try:
+            while True:
+                msg = await self.ws.receive_json()
+                if isinstance(msg, dict):
+                    await self._recibir(msg)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.warning(f"[SESION-WS] {self.sesion} cerrada por error: {e}")
+        finally:
+            volcador.cancel()
+            for t in self.temporizadores.values():
+                t.cancel()
+            await self._volcar(enviar=False)  # lo que quede: el cliente lo reenviará si esto falla
+
+    async def _recibir(self, msg: dict) -> None:
+        tipo = msg.get("tipo")
+        if tipo == "hola":
+            await self._precargar(msg.get("ejercicios") or [])
+        elif tipo == "temporizador":
+            self._temporizador(msg)
+        elif tipo in TIPOS and msg.get("clave"):
+            self.pendientes.append(msg)
+            if tipo == "serie":
+                await self._sugerir(msg.get("datos") or {})
+            if tipo == "sesion_fin" or len(self.pendientes) >= settings.SESION_WS_FLUSH_EVENTOS:
+                await self._volcar()
+            else:
+                self._hay_datos.set()
+
+    # ---------- escrituras agrupadas ----------
+    async def _bucle_volcado(self) -> None:
+        while True:
+            await self._hay_datos.wait()
+            await asyncio.sleep(settings.SESION_WS_FLUSH_S)
+            await self._volcar()
+
+    async def _volcar(self, enviar: bool = True) -> None:
+        async with self._lock:
+            self._hay_datos.clear()
+            if not self.pendientes:
+                return
+            lote, self.pendientes = self.pendientes, []
+            try:
+                async with SessionLocal() as db:
+                    res = await sincronizar(db, self.usuario_id, self.sesion, lote, self.meta)
+            except Exception as e:
+                # sin ack: siguen en la cola del cliente, que los reenviará (idempotente)
+                logger.warning(f"[SESION-WS] no se pudieron guardar {len(lote)} eventos de {self.sesion}: {e}")
+                return
+            if enviar:
+                await self._enviar({"tipo": "ack", "claves": res["ack"], "cursor": res["cursor"],
+                                    "materializada": res["materializada"],
+                                    "error_materializacion": res["error_materializacion"]})
+
+    # ---------- temporizadores de descanso ----------
+    def _temporizador(self, msg: dict) -> None:
+        try:
+            idx, segundos = int(msg.get("idx") or 0), float(msg.get("segundos") or 0)
+        except (TypeError, ValueError):
+            return
+        previo = self.temporizadores.pop(idx, None)
+        if previo:
+            previo.cancel()
+        if segundos > 0:
+            segundos = min(segundos, 3600)
+            self.temporizadores[idx] = asyncio.create_task(self._avisar(idx, segundos))
+
+    async def _avisar(self, idx: int, segundos: float) -> None:
+        await self._enviar({"tipo": "temporizador", "idx": idx, "fin": int((time.time() + segundos) * 1000)})
+        await asyncio.sleep(segundos)
+        self.temporizadores.pop(idx, None)
+        await self._enviar({"tipo": "temporizador_fin", "idx": idx})
+
+    # ---------- sugerencia para la siguiente serie ----------
+    async def _precargar(self, nombres: list) -> None:
+        """Últimas series de cada ejercicio del día (exercise_state) en una consulta, al saludar."""
+        nombres = [str(n) for n in nombres[:60]]
+        async with SessionLocal() as db:
+            estados = await estados_por_ejercicio(db, self.usuario_id, nombres)
+        for idx, nombre in enumerate(nombres):
+            estado = estados.get(slug_ejercicio(nombre))
+            self.recientes[idx] = list(estado["ultimas_series"]) if estado else []
+
+    async def _sugerir(self, datos: dict) -> None:
+        try:
+            idx = int(datos.get("idx") or 0)
+        except (TypeError, ValueError):
+            return
+        serie = extraer_series({"exercises": [{"nombre": datos.get("nombre") or "-", "sets": [datos]}]})
+        if not serie:
+            return
+        recientes = self.recientes.setdefault(idx, [])
+        recientes.insert(0, serie[0])
+        del recientes[RECENT:]
+        cargas, e1rms = suggest_next_loads(
+            [0] * len(recientes), [s["weight"] for s in recientes], [s["reps"] for s in recientes],
+            [s["rir"] for s in recientes], 1,
+        )
+        await self._enviar({"tipo": "sugerencia", "idx": idx, "carga": cargas[0],
+                            "e1rm": round(e1rms[0], 1) if e1rms[0] is not None else None})
@@ -0,0 +1,291 @@
+# app/sesiones.py
+"""
+Ingesta de una sesión en vivo completa en las tablas detalladas:
+workout_sessions -> exercise_sessions -> set_records / rest_periods.
+
+Toda la sesión se escribe en una transacción con un INSERT multi-fila por tabla (cuatro idas a la
+BD, tenga la sesión 3 o 30 ejercicios) y los ids se recuperan con RETURNING. Las duraciones y
+totales (minutos activos, descansos, total_minutos, descanso_total_min) se calculan en SQL a
+partir de los instantes guardados, no se fían del cronómetro del cliente.
+
+Formato (el mismo `state` que construye mis_entrenos_dia.html; instantes en ms epoch o ISO):
+  {"rutina_id": 12, "dia": "Lunes", "semana": 1,
+   "timing": {"startedAt": 1700000000000, "endedAt": ...},
+   "restLog": [{"startedAt", "endedAt", "seconds"}],                 # descansos globales
+   "exercises": [{"nombre", "imagen_url", "startedAt", "endedAt", "notas",
+                  "sets": [{"set_index", "peso", "repes", "rpe", "savedAt"}],
+                  "restLog": [{"startedAt", "endedAt", "seconds"}]}]}
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, insert, update, func, case, Numeric
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.series import registrar_series
+
+MAX_EJERCICIOS = 60
+MAX_SERIES = 40      # por ejercicio
+MAX_DESCANSOS = 200  # por lista
+MAX_DURACION = timedelta(days=1)  # todos los instantes de una sesión caben en esta ventana
+MAX_MINUTOS = 99999.99            # lo que cabe en Numeric(7,2)
+
+# rangos admitidos (caben en las columnas Numeric/Integer de destino); fuera de rango -> ValueError (400)
+INSTANTE_MIN = datetime(2000, 1, 1, tzinfo=timezone.utc)
+RANGOS = {
+    "peso": (0, 1000), "repes": (0, 1000), "rpe": (0, 10), "rir": (0, 10),
+    "segundos": (0, MAX_DURACION.total_seconds()), "semana": (1, 1000), "set_index": (1, 1000),
+}
+
+
+def _instante(valor) -> datetime | None:
+    """
+    ms epoch (Date.now()), segundos epoch o ISO 8601 -> datetime con zona (UTC).
+    None si no se puede leer; ValueError si la fecha es anterior a 2000 o de más de un día en el futuro.
+    """
+    if valor in (None, ""):
+        return None
+    try:
+        if isinstance(valor, (int, float)):
+            fecha = datetime.fromtimestamp(valor / 1000 if valor > 1e11 else valor, tz=timezone.utc)
+        else:
+            fecha = datetime.fromisoformat(str(valor).replace("Z", "+00:00"))
+    except (ValueError, OverflowError, OSError):
+        return None
+    fecha = fecha if fecha.tzinfo else fecha.replace(tzinfo=timezone.utc)
+    if not INSTANTE_MIN <= fecha <= datetime.now(timezone.utc) + MAX_DURACION:
+        raise ValueError(f"Instante fuera de rango: {valor}")
+    return fecha
+
+
+def _num(valor, tipo=float, campo: str | None = None):
+    """Número o None si no se puede leer; con `campo`, ValueError si se sale de RANGOS[campo]."""
+    try:
+        numero = tipo(valor) if valor not in (None, "") else None
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if numero is not None and campo:
+        minimo, maximo = RANGOS[campo]
+        if not minimo <= numero <= maximo:  # también descarta nan/inf
+            raise ValueError(f"{campo} fuera de rango ({minimo}-{maximo:g}): {valor}")
+    return numero
+
+
+def _serie(s: dict) -> dict:
+    """Peso, repes, rpe y rir de una serie (o del resumen de un ejercicio), validados."""
+    return {
+        "peso": _num(s.get("peso"), campo="peso"),
+        "repes": _num(s.get("repes") or s.get("reps"), int, "repes"),
+        "rpe": _num(s.get("rpe"), campo="rpe"),
+        "rir": _num(s.get("rir"), int, "rir"),
+    }
+
+
+def _o_none(fn, *args):
+    try:
+        return fn(*args)
+    except ValueError:
+        return None
+
+
+def sanear(payload: dict) -> dict:
+    """
+    Copia del payload con los instantes y valores fuera de rango a None, para lo que no se puede
+    rechazar (una sesión sincronizada ya confirmada al cliente): se pierde ese dato, no la sesión.
+    """
+    def instante(v):
+        return v if _o_none(_instante, v) is not None else None
+
+    def valores(d: dict) -> dict:
+        campos = (("peso", "peso", float), ("repes", "repes", int), ("reps", "repes", int),
+                  ("rpe", "rpe", float), ("rir", "rir", int), ("set_index", "set_index", int))
+        limpio = {k: _o_none(_num, d[k], tipo, campo) for k, campo, tipo in campos if k in d}
+        return {**d, **limpio, **{k: instante(d[k]) for k in ("startedAt", "endedAt", "savedAt") if k in d}}
+
+    def descansos(lista) -> list:
+        return [
+            {"startedAt": instante(d.get("startedAt")), "endedAt": instante(d.get("endedAt")),
+             "seconds": _o_none(_num, d.get("seconds"), float, "segundos")}
+            for d in lista or [] if isinstance(d, dict)
+        ]
+
+    return {
+        **payload,
+        "semana": _o_none(_num, payload.get("semana"), int, "semana"),
+        "timing": valores(payload.get("timing") or {}),
+        "restLog": descansos(payload.get("restLog")),
+        "items": [valores(it) for it in payload.get("items") or [] if isinstance(it, dict)],
+        "exercises": [
+            {**valores(e), "sets": [valores(x) for x in e.get("sets") or [] if isinstance(x, dict)],
+             "restLog": descansos(e.get("restLog"))}
+            for e in payload.get("exercises") or [] if isinstance(e, dict)
+        ],
+    }
+
+
+def _ventana(instantes: list[datetime | None]) -> None:
+    """Los instantes de una sesión no pueden separarse más de MAX_DURACION (los minutos van a Numeric(7,2))."""
+    fechas = [f for f in instantes if f is not None]
+    if fechas and max(fechas) - min(fechas) > MAX_DURACION:
+        raise ValueError("Los instantes de la sesión abarcan más de un día")
+
+
+def _descansos(lista, workout_session_id: int, exercise_session_id: int | None, tipo: str) -> list[dict]:
+    filas = []
+    for d in (lista or [])[:MAX_DESCANSOS]:
+        inicio = _instante(d.get("startedAt")) if isinstance(d, dict) else None
+        if inicio is None:
+            continue
+        filas.append({
+            "workout_session_id": workout_session_id, "exercise_session_id": exercise_session_id,
+            "tipo": tipo, "started_at": inicio, "ended_at": _instante(d.get("endedAt")),
+            "duracion_s": None if d.get("endedAt") else _num(d.get("seconds"), campo="segundos"),  # con fin: se calcula en SQL
+        })
+    return filas
+
+
+def _minutos(inicio, fin):
+    """Minutos entre dos columnas timestamptz, en SQL (NULL si falta alguna), acotados a Numeric(7,2)."""
+    minutos = func.extract("epoch", fin - inicio) / 60.0
+    return func.least(func.greatest(minutos, -MAX_MINUTOS), MAX_MINUTOS).cast(Numeric(7, 2))
+
+
+async def _rutina_del_usuario(db: AsyncSession, usuario_id: int, rutina_id) -> int | None:
+    if not rutina_id:
+        return None
+    rutina_id = _num(rutina_id, int)
+    if rutina_id is None or not 0 < rutina_id < 2**31:
+        return None
+    return await db.scalar(
+        select(models.Rutina.id).where(models.Rutina.id == rutina_id, models.Rutina.usuario_id == usuario_id)
+    )
+
+
+async def guardar_sesion_detallada(
+    db: AsyncSession, usuario_id: int, payload: dict, progreso_id: int | None = None, estricto: bool = True
+) -> dict:
+    """
+    Escribe la sesión completa y sus series en workout_sets (sugerencias de carga). No hace commit:
+    todo va en la transacción de quien llama. Lanza ValueError si el payload no trae ejercicios o
+    trae instantes o valores fuera de rango (quien llama hace rollback y responde 400).
+    Con estricto=False (sesiones sincronizadas, ya saneadas con `sanear`) no se exige que la sesión
+    quepa en un día: una sesión reanudada al día siguiente se guarda igual.
+    """
+    ejercicios = [e for e in (payload.get("exercises") or []) if isinstance(e, dict) and (e.get("nombre") or "").strip()]
+    if not ejercicios:
+        raise ValueError("La sesión no tiene ejercicios")
+    ejercicios = ejercicios[:MAX_EJERCICIOS]
+    timing = payload.get("timing") or {}
+    rutina_id = await _rutina_del_usuario(db, usuario_id, payload.get("rutina_id"))
+    WS, ES, SR, RP = models.WorkoutSession, models.ExerciseSession, models.SetRecord, models.RestPeriod
+
+    inicio, fin = _instante(timing.get("startedAt")), _instante(timing.get("endedAt"))
+    semana = _num(payload.get("semana"), int, "semana") or 1
+    for it in payload.get("items") or []:
+        if isinstance(it, dict):
+            _serie(it)  # el resumen por ejercicio también acaba en workout_sets
+    sesion_id = await db.scalar(
+        insert(WS).values(
+            usuario_id=usuario_id, rutina_id=rutina_id, semana=semana,
+            dia_nombre=str(payload.get("dia") or ""), started_at=inicio, ended_at=fin,
+            estado="finalizada" if fin else "en_curso",
+            meta_json={"items": payload["items"]} if payload.get("items") else None,
+        ).returning(WS.id)
+    )
+
+    # 1) ejercicios: un INSERT multi-fila; orden_plan = posición en el plan (clave para casar los ids)
+    orden_real = sorted(
+        (i for i, e in enumerate(ejercicios) if _instante(e.get("startedAt"))),
+        key=lambda i: _instante(ejercicios[i].get("startedAt")),
+    )
+    res = await db.execute(
+        insert(ES).values([
+            {
+                "workout_session_id": sesion_id,
+                "nombre_ejercicio": e["nombre"].strip(),
+                "imagen_url": e.get("imagen_url") or None,
+                "orden_plan": i,
+                "orden_real": orden_real.index(i) + 1 if i in orden_real else None,
+                "started_at": _instante(e.get("startedAt")),
+                "ended_at": _instante(e.get("endedAt")),
+                "completado": bool(e.get("endedAt")),
+                "notas": (e.get("notas") or None),
+            }
+            for i, e in enumerate(ejercicios)
+        ]).returning(ES.id, ES.orden_plan)
+    )
+    id_por_orden = {orden: id_ for id_, orden in res.all()}
+
+    # 2) series y descansos: un INSERT multi-fila por tabla
+    series, descansos = [], _descansos(payload.get("restLog"), sesion_id, None, "entre_ejercicios")
+    for i, e in enumerate(ejercicios):
+        es_id = id_por_orden[i]
+        for n, s in enumerate((e.get("sets") or [])[:MAX_SERIES], start=1):
+            if not isinstance(s, dict):
+                continue
+            valores = _serie(s)
+            series.append({
+                "exercise_session_id": es_id, "set_index": _num(s.get("set_index"), int, "set_index") or n,
+                "peso": valores["peso"], "repes": valores["repes"],
+                "rpe": valores["rpe"], "ended_at": _instante(s.get("savedAt")),
+                "descanso_posterior_s": _num(s.get("descanso_s"), campo="segundos"),
+                "extra_json": {"rir": s["rir"]} if s.get("rir") is not None else None,
+            })
+        descansos += _descansos(e.get("restLog"), sesion_id, es_id, "entre_series")
+    if estricto:
+        _ventana(
+            [inicio, fin] + [_instante(e.get(k)) for e in ejercicios for k in ("startedAt", "endedAt")]
+            + [s["ended_at"] for s in series] + [d[k] for d in descansos for k in ("started_at", "ended_at")]
+        )
+    ids_series = (await db.execute(insert(SR).values(series).returning(SR.id))).scalars().all() if series else []
+    ids_descansos = (await db.execute(insert(RP).values(descansos).returning(RP.id))).scalars().all() if descansos else []
+
+    # 3) duraciones y totales en SQL
+    await db.execute(
+        update(RP).where(RP.workout_session_id == sesion_id, RP.ended_at.is_not(None))
+        .values(duracion_s=func.extract("epoch", RP.ended_at - RP.started_at))
+    )
+    tope_min = MAX_DURACION.total_seconds() / 60  # descansos solapados no pueden desbordar Numeric(7,2)
+    descanso_ej = (
+        select(func.least(func.coalesce(func.sum(RP.duracion_s), 0) / 60.0, tope_min))
+        .where(RP.exercise_session_id == ES.id).scalar_subquery()
+    )
+    await db.execute(
+        update(ES).where(ES.workout_session_id == sesion_id)
+        .values(minutos_activo=_minutos(ES.started_at, ES.ended_at), descanso_minutos=descanso_ej.cast(Numeric(7, 2)))
+    )
+    # los descansos por ejercicio también encienden el global en la UI: si hay globales, solo cuentan esos
+    descanso_total = (
+        select(func.least(func.coalesce(
+            func.sum(RP.duracion_s).filter(RP.exercise_session_id.is_(None)), func.sum(RP.duracion_s), 0
+        ) / 60.0, tope_min))
+        .where(RP.workout_session_id == WS.id).scalar_subquery()
+    )
+    primero = select(func.min(ES.started_at)).where(ES.workout_session_id == WS.id).scalar_subquery()
+    ultimo = select(func.max(ES.ended_at)).where(ES.workout_session_id == WS.id).scalar_subquery()
+    totales = (await db.execute(
+        update(WS).where(WS.id == sesion_id)
+        .values(
+            started_at=func.coalesce(WS.started_at, primero),
+            ended_at=func.coalesce(WS.ended_at, ultimo),
+            total_minutos=_minutos(func.coalesce(WS.started_at, primero), func.coalesce(WS.ended_at, ultimo)),
+            descanso_total_min=descanso_total.cast(Numeric(7, 2)),
+            estado=case((func.coalesce(WS.ended_at, ultimo).is_(None), "en_curso"), else_="finalizada"),
+        )
+        .returning(WS.total_minutos, WS.descanso_total_min, WS.estado)
+    )).one()
+
+    # histórico plano + exercise_state (sugerencias de carga); `items` cubre los ejercicios sin series sueltas
+    await registrar_series(
+        db, usuario_id, {"exercises": ejercicios, "items": payload.get("items") or []},
+        progreso_id=progreso_id, rutina_id=rutina_id, fecha=inicio,
+    )
+    return {
+        "sesion_id": sesion_id,
+        "ejercicios": len(id_por_orden),
+        "series": len(ids_series),
+        "descansos": len(ids_descansos),
+        "total_minutos": float(totales.total_minutos) if totales.total_minutos is not None else None,
+        "descanso_total_min": float(totales.descanso_total_min or 0),
+        "estado": totales.estado,
+    }
@@ -0,0 +1,249 @@
+# app/sincronizacion.py
+"""
+Sincronización offline-first del registro de series en el gimnasio (POST /api/sync).
+
+El cliente (mis_entrenos_dia.html) no espera al final para enviar la sesión: cada acción
+(inicio/fin de sesión y de ejercicio, serie guardada, descanso) es un evento con una clave de
+idempotencia (uuid) que se encola en localStorage y se envía por lotes cuando hay conexión.
+El servidor:
+  - guarda los eventos con un INSERT multi-fila ON CONFLICT DO NOTHING sobre
+    (sesion_sync_id, clave): reenviar un lote es inofensivo;
+  - confirma (ack) todas las claves que ya tiene, nuevas o repetidas; el cliente borra de la
+    cola solo lo confirmado y reenvía el resto;
+  - devuelve el cursor (id del último evento guardado de la sesión), con el que otro dispositivo
+    o una recarga pueden pedir lo que les falta (GET /api/sync/{sesion}?desde=cursor);
+  - cuando llega el evento 'sesion_fin', materializa la sesión una sola vez (Progreso para la
+    vista de progreso + tablas detalladas + workout_sets) con app.sesiones. Los eventos ya están
+    guardados (commit previo). El Progreso se escribe siempre; las tablas detalladas van en su propio
+    savepoint con el payload saneado (valores fuera de rango a None) y, si aun así fallan, la sesión
+    queda cerrada solo con el Progreso y la respuesta trae error_materializacion. Si no se llega a
+    escribir ni el Progreso, el 'sesion_fin' no se confirma: el cliente lo reenvía y se reintenta.
+
+Eventos (tipo -> datos):
+  sesion_inicio    {startedAt}
+  ejercicio_inicio {idx, nombre, imagen_url, startedAt}
+  ejercicio_fin    {idx, endedAt}
+  serie            {idx, nombre, set_index, peso, repes, rpe, savedAt}
+  descanso         {idx | null, startedAt, endedAt, seconds}      idx null = descanso global
+  sesion_fin       {endedAt, items}
+"""
+import json
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.sesiones import guardar_sesion_detallada, sanear, _instante
+
+TIPOS = {"sesion_inicio", "ejercicio_inicio", "ejercicio_fin", "serie", "descanso", "sesion_fin"}
+MAX_LOTE = 200
+
+logger = logging.getLogger(__name__)
+
+
+def _validos(eventos) -> tuple[list[dict], list[str]]:
+    """
+    (eventos aceptables, claves rechazadas). Los rechazados también se confirman: no tiene sentido
+    reenviarlos. Un evento sin clave se confirma como "" (el cliente lo quita de la cola igual).
+    """
+    validos, rechazados, vistas = [], [], set()
+    for ev in (eventos or [])[:MAX_LOTE]:
+        if not isinstance(ev, dict):
+            continue
+        clave = str(ev.get("clave") or "")
+        if not clave or len(clave) > 64 or ev.get("tipo") not in TIPOS or not isinstance(ev.get("datos"), dict):
+            rechazados.append(clave)
+        elif clave not in vistas:
+            vistas.add(clave)
+            validos.append(ev)
+    return validos, rechazados
+
+
+def _idx(valor) -> int:
+    try:
+        return int(valor or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _ts(valor) -> datetime | None:
+    """Hora del cliente del evento; un reloj desajustado no debe hacer perder el evento."""
+    try:
+        return _instante(valor)
+    except ValueError:
+        return None
+
+
+async def _sesion_sync(db: AsyncSession, usuario_id: int, sesion: str, meta: dict) -> models.SesionSync:
+    """La fila de la sesión (creada si no existe), bloqueada para que dos lotes no materialicen a la vez."""
+    await db.execute(
+        pg_insert(models.SesionSync)
+        .values(usuario_id=usuario_id, sesion=sesion, rutina_id=meta.get("rutina_id"),
+                dia=meta.get("dia"), semana=meta.get("semana"), cursor=0)
+        .on_conflict_do_nothing()
+    )
+    return (await db.execute(
+        select(models.SesionSync)
+        .where(models.SesionSync.usuario_id == usuario_id, models.SesionSync.sesion == sesion)
+        .with_for_update()
+        .execution_options(populate_existing=True)  # releída tras el commit de los eventos
+    )).scalar_one()
+
+
+def _payload_desde_eventos(sync: models.SesionSync, eventos: list[models.EventoSesion]) -> dict:
+    """Reconstruye el payload de /api/sesiones a partir del log de eventos (en orden de llegada)."""
+    timing, rest_log, items = {}, [], []
+    ejercicios: dict[int, dict] = {}
+
+    def ejercicio(datos: dict) -> dict:
+        return ejercicios.setdefault(_idx(datos.get("idx")), {"nombre": "", "sets": [], "restLog": []})
+
+    for ev in eventos:
+        d = ev.datos
+        if ev.tipo == "sesion_inicio":
+            timing.setdefault("startedAt", d.get("startedAt"))  # tras recargar la página se reanuda la misma sesión
+        elif ev.tipo == "sesion_fin":
+            timing["endedAt"] = d.get("endedAt")
+            items = d.get("items") or items
+        elif ev.tipo == "ejercicio_inicio":
+            ej = ejercicio(d)
+            ej.update(nombre=d.get("nombre") or ej["nombre"], imagen_url=d.get("imagen_url"), startedAt=d.get("startedAt"))
+        elif ev.tipo == "ejercicio_fin":
+            ejercicio(d)["endedAt"] = d.get("endedAt")
+        elif ev.tipo == "serie":
+            ej = ejercicio(d)
+            ej["nombre"] = ej["nombre"] or d.get("nombre") or ""
+            ej["sets"].append({k: d.get(k) for k in ("set_index", "peso", "repes", "rpe", "rir", "savedAt")})
+        elif ev.tipo == "descanso":
+            descanso = {k: d.get(k) for k in ("startedAt", "endedAt", "seconds")}
+            if d.get("idx") is None:
+                rest_log.append(descanso)
+            else:
+                ejercicio(d)["restLog"].append(descanso)
+
+    # ejercicios sin eventos propios pero con resumen (peso x reps x series) en el cierre
+    for n, it in enumerate(items):
+        if isinstance(it, dict) and it.get("nombre"):
+            ejercicios.setdefault(_idx(it.get("idx", n)), {"nombre": it["nombre"], "sets": [], "restLog": []})
+    return {
+        "rutina_id": sync.rutina_id, "dia": sync.dia, "semana": sync.semana,
+        "timing": timing, "restLog": rest_log, "items": items,
+        "exercises": [ejercicios[i] for i in sorted(ejercicios)],
+    }
+
+
+async def _materializar(db: AsyncSession, usuario_id: int, sync: models.SesionSync) -> str | None:
+    """Cierra la sesión (Progreso + tablas detalladas). Devuelve el error de las tablas detalladas, si lo hubo."""
+    eventos = (await db.execute(
+        select(models.EventoSesion).where(models.EventoSesion.sesion_sync_id == sync.id).order_by(models.EventoSesion.id)
+    )).scalars().all()
+    payload = _payload_desde_eventos(sync, eventos)
+    # Progreso con el mismo detalle que /api/guardar-sesion (lo que lee la vista de progreso)
+    fin = _ts(payload["timing"].get("endedAt")) or datetime.now(timezone.utc)
+    prog = models.Progreso(
+        usuario_id=usuario_id,
+        plan_id=sync.rutina_id,
+        fecha=fin.date(),
+        progreso_detallado=json.dumps({
+            "rutina_id": sync.rutina_id, "dia": sync.dia, "ejercicios": payload["items"],
+            "timing": payload["timing"], "rest_log": payload["restLog"], "exercises": payload["exercises"],
+            "fecha": fin.isoformat(), "sesion_sync": sync.sesion,
+        }),
+    )
+    db.add(prog)
+    await db.flush()
+    sync.progreso_id = prog.id
+    await db.flush()
+    if not payload["exercises"]:  # una sesión cerrada sin ejercicios se queda solo en Progreso
+        return None
+    try:
+        async with db.begin_nested():
+            resultado = await guardar_sesion_detallada(
+                db, usuario_id, sanear(payload), progreso_id=prog.id, estricto=False
+            )
+    except Exception as e:
+        logger.warning(f"[SYNC] sesión {sync.sesion} guardada sin el detalle: {e}")
+        await db.refresh(sync)
+        return f"{type(e).__name__}: {e}"
+    sync.workout_session_id = resultado["sesion_id"]
+    return None
+
+
+async def sincronizar(db: AsyncSession, usuario_id: int, sesion: str, eventos, meta: dict | None = None) -> dict:
+    """Aplica un lote de eventos de la sesión `sesion` (uuid del cliente) y confirma lo guardado."""
+    sesion = (sesion or "").strip()
+    if not sesion or len(sesion) > 64:
+        raise ValueError("Falta el identificador de sesión")
+    validos, rechazados = _validos(eventos)
+    sync = await _sesion_sync(db, usuario_id, sesion, meta or {})
+
+    nuevos = []
+    if validos:
+        nuevos = (await db.execute(
+            pg_insert(models.EventoSesion)
+            .values([
+                {"sesion_sync_id": sync.id, "clave": ev["clave"], "tipo": ev["tipo"], "datos": ev["datos"],
+                 "ts_cliente": _ts(ev.get("ts"))}
+                for ev in validos
+            ])
+            .on_conflict_do_nothing(index_elements=["sesion_sync_id", "clave"])
+            .returning(models.EventoSesion.clave)
+        )).scalars().all()
+    sync.cursor = await db.scalar(
+        select(func.coalesce(func.max(models.EventoSesion.id), 0)).where(models.EventoSesion.sesion_sync_id == sync.id)
+    )
+    # los eventos se guardan antes de materializar: un fallo al cerrar la sesión no debe perderlos
+    await db.commit()
+
+    error = None
+    sync = await _sesion_sync(db, usuario_id, sesion, meta or {})
+    if sync.workout_session_id is None and sync.progreso_id is None:
+        cerrada = await db.scalar(
+            select(models.EventoSesion.id)
+            .where(models.EventoSesion.sesion_sync_id == sync.id, models.EventoSesion.tipo == "sesion_fin")
+            .limit(1)
+        )
+        if cerrada:
+            try:
+                async with db.begin_nested():
+                    error = await _materializar(db, usuario_id, sync)
+            except Exception as e:
+                logger.warning(f"[SYNC] no se pudo materializar la sesión {sesion}: {e}")
+                error = f"{type(e).__name__}: {e}"
+                await db.refresh(sync)
+    await db.commit()
+    ack = [ev["clave"] for ev in validos]
+    if sync.progreso_id is None:  # sin cerrar: el cliente conserva su 'sesion_fin' y lo reenvía
+        ack = [ev["clave"] for ev in validos if ev["tipo"] != "sesion_fin"]
+    return {
+        "ack": ack + rechazados,
+        "nuevos": len(nuevos),
+        "duplicados": len(validos) - len(nuevos),
+        "rechazados": rechazados,
+        "cursor": sync.cursor,
+        "materializada": sync.progreso_id is not None,
+        "workout_session_id": sync.workout_session_id,
+        "error_materializacion": error,
+    }
+
+
+async def eventos_desde(db: AsyncSession, usuario_id: int, sesion: str, desde: int = 0, limite: int = 500) -> dict:
+    """Eventos de la sesión posteriores al cursor `desde` (para reanudar en otro dispositivo o tras recargar)."""
+    sync = await db.scalar(
+        select(models.SesionSync).where(models.SesionSync.usuario_id == usuario_id, models.SesionSync.sesion == sesion)
+    )
+    if sync is None:
+        return {"eventos": [], "cursor": 0, "materializada": False}
+    filas = (await db.execute(
+        select(models.EventoSesion)
+        .where(models.EventoSesion.sesion_sync_id == sync.id, models.EventoSesion.id > desde)
+        .order_by(models.EventoSesion.id).limit(limite)
+    )).scalars().all()
+    return {
+        "eventos": [{"clave": e.clave, "tipo": e.tipo, "datos": e.datos, "cursor": e.id} for e in filas],
+        "cursor": filas[-1].id if filas else max(desde, 0),
+        "materializada": sync.progreso_id is not None,
+    }
@@ -0,0 +1,457 @@
+# app/trabajos.py
+"""
+Cola de trabajos IA respaldada por Postgres (tabla trabajos_ia).
+
+Los endpoints encolan con `encolar_trabajo()` y devuelven 202 + id; uno o varios procesos worker
+(`python -m app.trabajos`) reclaman trabajos con SELECT ... FOR UPDATE SKIP LOCKED, generan el
+contenido con la IA y guardan el resultado. Así la latencia web no depende de la del LLM.
+
+Mientras corre el handler, una tarea de latido renueva actualizado_en (el lease). Todas las
+escrituras del worker sobre el trabajo llevan WHERE intentos = <su intento> AND estado = 'en_curso',
+y los handlers bloquean la fila y la dan por completada (completar_trabajo) en la misma transacción
+que guarda el resultado: un worker que perdió el trabajo no puede guardar una segunda rutina ni
+pisar al nuevo dueño, y un fallo tras ese commit no devuelve el trabajo a la cola. Si aun así un
+intento encuentra en resultado lo que guardó otro anterior (rutina_id, dieta_id...), lo reutiliza.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, models, registro_ia
+from app.config import settings
+from app.database import SessionLocal
+from app.cache_planes import guardar_plan, huella_formulario, personalizar, plan_reutilizable
+from app.catalogo import vincular_plan
+from app.imagenes import generar_imagenes_plan
+from app.progresion import expandir_plan
+from app.generador_local import generar_rutina_local
+from app.reparar_imagenes import reparar_todas, contar_pendientes
+from app.utils import generar_rutina_ia_stream, generar_dieta_ia, generar_plan_mixto_ia
+
+logger = logging.getLogger(__name__)
+
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ===========================
+#  API para los endpoints
+# ===========================
+async def encolar_trabajo(db: AsyncSession, usuario_id: int, tipo: str, payload: dict) -> models.TrabajoIA:
+    if tipo not in HANDLERS:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+    trabajo = models.TrabajoIA(usuario_id=usuario_id, tipo=tipo, estado="pendiente", payload=payload, progreso=0)
+    db.add(trabajo)
+    await db.commit()
+    await db.refresh(trabajo)
+    return trabajo
+
+
+def trabajo_a_dict(t: models.TrabajoIA) -> dict:
+    return {
+        "id": t.id,
+        "tipo": t.tipo,
+        "estado": t.estado,
+        "progreso": t.progreso,
+        "fase": t.fase,
+        "resultado": t.resultado,
+        "error": t.error,
+        "intentos": t.intentos,
+        "creado_en": t.creado_en.isoformat() if t.creado_en else None,
+        "terminado_en": t.terminado_en.isoformat() if t.terminado_en else None,
+    }
+
+
+# ===========================
+#  Worker
+# ===========================
+async def reclamar_trabajo(db: AsyncSession) -> models.TrabajoIA | None:
+    """
+    Reclama el trabajo pendiente más antiguo (o uno 'en_curso' cuyo worker dejó de dar latido).
+    SKIP LOCKED permite que varios workers consulten a la vez sin pisarse.
+    """
+    limite = _ahora() - timedelta(seconds=settings.TRABAJOS_LEASE_S)
+    while True:
+        res = await db.execute(
+            select(models.TrabajoIA)
+            .where(or_(
+                models.TrabajoIA.estado == "pendiente",
+                and_(models.TrabajoIA.estado == "en_curso", models.TrabajoIA.actualizado_en < limite),
+            ))
+            .order_by(models.TrabajoIA.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        trabajo = res.scalar_one_or_none()
+        if not trabajo:
+            await db.rollback()
+            return None
+
+        if trabajo.intentos >= settings.TRABAJOS_MAX_INTENTOS:
+            # huérfano que ya agotó reintentos: se cierra y se busca otro
+            trabajo.estado = "error"
+            trabajo.error = trabajo.error or "Sin respuesta del worker (reintentos agotados)"
+            trabajo.terminado_en = _ahora()
+            await db.commit()
+            continue
+
+        ahora = _ahora()
+        trabajo.estado = "en_curso"
+        trabajo.intentos = (trabajo.intentos or 0) + 1
+        trabajo.iniciado_en = ahora
+        trabajo.actualizado_en = ahora
+        trabajo.fase = "Iniciando"
+        await db.commit()
+        return trabajo
+
+
+class TrabajoPerdido(Exception):
+    """El trabajo ya no es de este worker (reclamado por otro tras perder el lease, o cancelado)."""
+
+
+def _es_mio(trabajo_id: int, intento: int):
+    return (models.TrabajoIA.id == trabajo_id, models.TrabajoIA.intentos == intento,
+            models.TrabajoIA.estado == "en_curso")
+
+
+async def _avance(trabajo_id: int, intento: int, progreso: int, fase: str, parcial: dict | None = None) -> bool:
+    """
+    Actualiza progreso/fase (y el latido) en una sesión propia para que el cliente lo vea ya.
+    `parcial` se guarda en resultado mientras el trabajo sigue en curso (p.ej. semanas ya generadas).
+    Devuelve False si el trabajo ya no pertenece a este intento.
+    """
+    valores = dict(progreso=progreso, fase=fase, actualizado_en=_ahora())
+    if parcial is not None:
+        valores["resultado"] = parcial
+    try:
+        async with SessionLocal() as db:
+            res = await db.execute(update(models.TrabajoIA).where(*_es_mio(trabajo_id, intento)).values(**valores))
+            await db.commit()
+            return res.rowcount > 0
+    except Exception as e:
+        logger.warning(f"[TRABAJOS] no se pudo actualizar avance de {trabajo_id}: {e}")
+        return True  # sin saberlo no se aborta: el latido y la escritura final también comprueban
+
+
+async def _latido(trabajo_id: int, intento: int) -> None:
+    """Renueva el lease durante todo el handler (llamadas IA largas, fase de imágenes...)."""
+    while True:
+        await asyncio.sleep(max(5.0, settings.TRABAJOS_LEASE_S / 4))
+        try:
+            async with SessionLocal() as db:
+                await db.execute(
+                    update(models.TrabajoIA).where(*_es_mio(trabajo_id, intento)).values(actualizado_en=_ahora())
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"[TRABAJOS] latido de {trabajo_id} fallido: {e}")
+
+
+async def completar_trabajo(db: AsyncSession, trabajo: models.TrabajoIA, resultado: dict) -> dict:
+    """
+    Bloquea la fila del trabajo en la transacción de `db` y la deja completada con `resultado`
+    (p.ej. {"rutina_id": 7}); el handler hace commit a la vez que guarda lo generado. Si otro worker
+    lo reclamó (o se sustituyó por el borrador local) lanza TrabajoPerdido y no se llega al commit.
+    """
+    fila = await db.scalar(
+        select(models.TrabajoIA).where(*_es_mio(trabajo.id, trabajo.intentos)).with_for_update()
+    )
+    if fila is None:
+        raise TrabajoPerdido(f"Trabajo {trabajo.id} reclamado por otro worker o cancelado")
+    ahora = _ahora()
+    fila.estado, fila.resultado, fila.progreso, fila.fase = "completado", resultado, 100, "Completado"
+    fila.error, fila.terminado_en, fila.actualizado_en = None, ahora, ahora
+    trabajo.estado = "completado"  # ejecutar_trabajo ya no tiene nada que escribir
+    return resultado
+
+
+async def _reutilizar(db: AsyncSession, trabajo: models.TrabajoIA, clave: str) -> dict | None:
+    """Resultado que dejó guardado un intento anterior (rutina_id, dieta_id...): se completa con él."""
+    previo = trabajo.resultado or {}
+    if not previo.get(clave):
+        return None
+    logger.info(f"[TRABAJOS] #{trabajo.id}: {clave}={previo[clave]} ya guardado por un intento anterior")
+    resultado = await completar_trabajo(db, trabajo, {k: v for k, v in previo.items() if k != "semanas"})
+    await db.commit()
+    return resultado
+
+
+async def ejecutar_trabajo(trabajo: models.TrabajoIA) -> None:
+    handler = HANDLERS.get(trabajo.tipo)
+    intento = trabajo.intentos
+
+    async def avance(progreso: int, fase: str, parcial: dict | None = None):
+        if not await _avance(trabajo.id, intento, progreso, fase, parcial):
+            raise TrabajoPerdido(f"Trabajo {trabajo.id} reclamado por otro worker o cancelado")
+
+    logger.info(f"[TRABAJOS] #{trabajo.id} ({trabajo.tipo}) intento {intento}")
+    contexto = registro_ia.fijar_contexto(usuario_id=trabajo.usuario_id, origen=f"trabajo:{trabajo.tipo}")
+    latido = asyncio.create_task(_latido(trabajo.id, intento))
+    valores: dict
+    try:
+        if handler is None:
+            raise ValueError(f"Tipo de trabajo desconocido: {trabajo.tipo}")
+        async with SessionLocal() as db:
+            resultado = await handler(db, trabajo, avance)
+        if trabajo.estado == "completado":  # el handler lo completó con su commit
+            return
+        valores = dict(estado="completado", resultado=resultado, progreso=100, fase="Completado",
+                       error=None, terminado_en=_ahora())
+    except TrabajoPerdido as e:
+        logger.warning(f"[TRABAJOS] #{trabajo.id} intento {intento} descartado: {e}")
+        return
+    except Exception as e:
+        if trabajo.estado == "completado":  # el resultado ya está guardado: no se reintenta
+            logger.warning(f"[TRABAJOS] #{trabajo.id} completado, pero falló después del commit: {e}")
+            return
+        logger.exception(f"[TRABAJOS] #{trabajo.id} falló")
+        if intento < settings.TRABAJOS_MAX_INTENTOS:
+            valores = dict(estado="pendiente", fase="Reintentando", error=f"{type(e).__name__}: {e}")
+        else:
+            valores = dict(estado="error", fase="Error", error=f"{type(e).__name__}: {e}", terminado_en=_ahora())
+    finally:
+        latido.cancel()
+        registro_ia.restablecer_contexto(contexto)
+
+    async with SessionLocal() as db:
+        res = await db.execute(
+            update(models.TrabajoIA)
+            .where(*_es_mio(trabajo.id, intento))
+            .values(actualizado_en=_ahora(), **valores)
+        )
+        await db.commit()
+    if res.rowcount == 0:
+        logger.warning(f"[TRABAJOS] #{trabajo.id} intento {intento}: ya no es de este worker, resultado descartado")
+
+
+async def worker(concurrencia: int | None = None) -> None:
+    concurrencia = max(1, concurrencia or settings.TRABAJOS_CONCURRENCIA)
+
+    async def _bucle(n: int):
+        while True:
+            try:
+                async with SessionLocal() as db:
+                    trabajo = await reclamar_trabajo(db)
+            except Exception as e:
+                logger.warning(f"[TRABAJOS] worker {n}: error reclamando trabajo: {e}")
+                trabajo = None
+            if trabajo is None:
+                await asyncio.sleep(settings.TRABAJOS_POLL_S)
+                continue
+            await ejecutar_trabajo(trabajo)
+
+    logger.info(f"[TRABAJOS] worker arrancado (concurrencia={concurrencia})")
+    await asyncio.gather(*(_bucle(i) for i in range(concurrencia)))
+
+
+# ===========================
+#  Handlers por tipo
+# ===========================
+async def _rutina_ia(form_data: dict, equipamiento: str, total: int, avance) -> dict:
+    # La IA solo genera la semana 1 (microciclo base) en streaming; en cuanto llega se publica
+    # en resultado["semanas"] para que /api/trabajos/{id}/eventos la empuje al navegador.
+    # Las semanas 2..N las calcula el motor de progresión local.
+    await avance(10, "Generando semana base con IA")
+    base: dict = {}
+    async for tipo, dato in generar_rutina_ia_stream(form_data, equipamiento, "", "", microciclo=True):
+        if tipo == "semana":
+            if not base:
+                await avance(50, "Semana base generada", {"semanas": [dato]})
+        else:
+            base = dato
+    if not base.get("plan"):
+        raise RuntimeError(base.get("error") or "La IA no devolvió ningún plan")
+
+    rutina = expandir_plan(base, total, form_data.get("experiencia_entrenamiento"))
+    await avance(55, f"Progresión de {total} semanas calculada", {"semanas": rutina["plan"]})
+    return rutina
+
+
+async def _trabajo_entreno(db: AsyncSession, trabajo: models.TrabajoIA, avance) -> dict:
+    form_data = trabajo.payload["form_data"]
+    if previo := await _reutilizar(db, trabajo, "rutina_id"):
+        return previo
+
+    await avance(5, "Leyendo equipamiento del gimnasio", {})  # descarta semanas de un intento anterior
+    equipamiento = await crud.get_equipamiento_principal(db, trabajo.usuario_id)
+
+    total = max(1, int(form_data.get("semanas") or 1))
+    rutina = None
+    huella, campos = huella_formulario(form_data, equipamiento)
+    if not settings.RUTINA_SOLO_LOCAL:
+        base = await plan_reutilizable(db, huella)
+        if base:
+            rutina = personalizar(base, form_data, total)
+            await avance(55, "Rutina adaptada de un plan similar", {"semanas": rutina["plan"]})
+    if rutina is None and not settings.RUTINA_SOLO_LOCAL:
+        try:
+            rutina = await _rutina_ia(form_data, equipamiento, total, avance)
+        except Exception as e:
+            # En el último intento no dejamos al usuario sin rutina: respaldo local por reglas
+            if trabajo.intentos < settings.TRABAJOS_MAX_INTENTOS:
+                raise
+            logger.warning(f"[TRABAJOS] #{trabajo.id}: IA no disponible ({e}); se usa el generador local")
+    if rutina is None:
+        rutina = generar_rutina_local(form_data, equipamiento, total)
+        await avance(55, "Rutina generada sin IA", {"semanas": rutina["plan"]})
+
+    await avance(60, "Generando imágenes de los ejercicios")
+    stats_img = await generar_imagenes_plan(rutina, db)
+
+    await avance(95, "Guardando rutina")
+    await vincular_plan(db, rutina)  # exercise_id del catálogo en cada ejercicio
+    rutina_obj = models.Rutina(
+        usuario_id=trabajo.usuario_id,
+        nombre="Rutina personalizada",
+        descripcion=("Rutina generada automáticamente según tus preferencias" if rutina.get("generada") == "local"
+                     else "Rutina generada por IA según tus preferencias"),
+        rutina_json=rutina,
+        semanas=form_data.get("semanas"),
+        fecha_creacion=datetime.now(),
+    )
+    db.add(rutina_obj)
+    await db.flush()
+    resultado = await completar_trabajo(db, trabajo, {
+        "rutina_id": rutina_obj.id, "imagenes": stats_img, "reutilizada": bool(rutina.get("reutilizada")),
+    })
+    await db.commit()
+    if rutina.get("generada") != "local" and not rutina.get("reutilizada"):
+        await guardar_plan(db, huella, campos, rutina)  # ya guardada sin errores: plan validado
+    return resultado
+
+
+async def _trabajo_dieta(db: AsyncSession, trabajo: models.TrabajoIA, avance) -> dict:
+    datos = trabajo.payload["datos"]
+    if previo := await _reutilizar(db, trabajo, "dieta_id"):
+        return previo
+    formulario = {
+        **datos,
+        "objetivos": [s.strip() for s in str(datos.get("objetivos") or "").split(",") if s.strip()],
+        "semanas": datos.get("duracion_dieta"),
+    }
+
+    await avance(10, "Generando dieta con IA")
+    dieta = await generar_dieta_ia(formulario, otros_datos=datos.get("otros_datos") or "")
+
+    await avance(90, "Guardando dieta")
+    nueva_dieta = models.DietaGenerada(
+        usuario_id=trabajo.usuario_id,
+        datos_entrada=json.dumps(datos),
+        dieta_json=json.dumps(dieta, ensure_ascii=False),
+    )
+    db.add(nueva_dieta)
+    await db.flush()
+    resultado = await completar_trabajo(db, trabajo, {"dieta_id": nueva_dieta.id, "dieta": dieta})
+    await db.commit()
+    return resultado
+
+
+def _calorias(dieta: dict) -> int | None:
+    objetivos = dieta.get("objetivos_nutricionales") or {}
+    valor = dieta.get("calorias_totales") or (objetivos.get("calorias") if isinstance(objetivos, dict) else None)
+    try:
+        return int(float(valor)) if valor is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+async def _trabajo_mixto(db: AsyncSession, trabajo: models.TrabajoIA, avance) -> dict:
+    form_data = trabajo.payload["form_data"]
+    otros_datos = trabajo.payload.get("otros_datos", "")
+    if previo := await _reutilizar(db, trabajo, "plan_mixto_id"):
+        return previo
+
+    await avance(10, "Generando plan mixto con IA")
+    contenido = await generar_plan_mixto_ia(form_data, otros_datos)
+
+    await avance(90, "Guardando plan")
+    entrenamiento = contenido.get("entrenamiento")
+    if isinstance(entrenamiento, dict) and entrenamiento.get("plan"):
+        await vincular_plan(db, entrenamiento)
+    nuevo_plan = models.PlanMixtoGenerado(
+        usuario_id=trabajo.usuario_id,
+        contenido_json=json.dumps(contenido, ensure_ascii=False),
+    )
+    db.add(nuevo_plan)
+
+    rutina_obj = None
+    if isinstance(entrenamiento, dict) and entrenamiento.get("plan"):
+        rutina_obj = models.Rutina(
+            usuario_id=trabajo.usuario_id,
+            nombre="Rutina Mixta IA",
+            descripcion="Entrenamiento generado por IA desde formulario mixto",
+            rutina_json=entrenamiento,
+            semanas=len(entrenamiento["plan"]),
+            fecha_creacion=datetime.now(),
+        )
+        db.add(rutina_obj)
+
+    # la parte de dieta, visible en /mis-dietas: un Plan tipo 'dieta' con el JSON y su Dieta
+    dieta_obj = None
+    dieta = contenido.get("dieta")
+    if isinstance(dieta, dict) and dieta:
+        plan_dieta = models.Plan(
+            usuario_id=trabajo.usuario_id,
+            creado_por=trabajo.usuario_id,
+            nombre="Dieta Mixta IA",
+            descripcion="Dieta generada por IA desde formulario mixto",
+            tipo="dieta",
+            rutina_json=dieta,
+        )
+        db.add(plan_dieta)
+        await db.flush()
+        dieta_obj = models.Dieta(
+            usuario_id=trabajo.usuario_id,
+            plan_id=plan_dieta.id,
+            nombre="Dieta Mixta IA",
+            descripcion="Dieta generada por IA desde formulario mixto",
+            calorias_totales=_calorias(dieta),
+            fecha_creacion=datetime.now(),
+        )
+        db.add(dieta_obj)
+
+    await db.flush()
+    resultado = await completar_trabajo(db, trabajo, {
+        "plan_mixto_id": nuevo_plan.id,
+        "rutina_id": rutina_obj.id if rutina_obj else None,
+        "dieta_id": dieta_obj.id if dieta_obj else None,
+    })
+    await db.commit()
+    return resultado
+
+
+async def _trabajo_reparar_imagenes(db: AsyncSession, trabajo: models.TrabajoIA, avance) -> dict:
+    # El checkpoint va en resultado: si el worker cae, el reintento sigue desde el último lote
+    previo = trabajo.resultado or {}
+    desde = previo.get("ultimo_id", 0)
+    pendientes = await contar_pendientes(db, desde)
+    revisadas_previas = (previo.get("stats") or {}).get("rutinas_revisadas", 0)
+
+    async def _checkpoint(ultimo_id: int, stats: dict):
+        hechas = stats["rutinas_revisadas"] - revisadas_previas
+        progreso = min(99, 100 * hechas // max(1, pendientes))
+        await avance(progreso, f"Rutinas revisadas hasta la #{ultimo_id}", {"ultimo_id": ultimo_id, "stats": stats})
+
+    payload = trabajo.payload or {}
+    return await reparar_todas(
+        db, desde, payload.get("lote", 50), payload.get("concurrencia"), _checkpoint, previo.get("stats"),
+        payload.get("max_regeneradas"),
+    )
+
+
+HANDLERS = {
+    "entreno": _trabajo_entreno,
+    "dieta": _trabajo_dieta,
+    "mixto": _trabajo_mixto,
+    "reparar_imagenes": _trabajo_reparar_imagenes,
+}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(worker())
@@ -1,19 +1,19 @@
 # app/utils.py
 import os
 import json
+import unicodedata
 import logging  # <-- AÑADIR ESTO
-from .config import settings
 from typing import List, Optional
 from openai import AsyncOpenAI
 from openai import AsyncOpenAI, BadRequestError, AuthenticationError
 from fastapi import HTTPException
-from .config import settings
 import os
 from typing import Optional
 from jose import jwt, JWTError
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import crud
+from app import gateway_ia
 
 # AÑADIR ESTO - Configurar logger para utils.py
 logger = logging.getLogger(__name__)
@@ -24,7 +24,6 @@ logger = logging.getLogger(__name__)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY", "akejngklaengkangkñ")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
-_openai_client: Optional[AsyncOpenAI] = AsyncOpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
 async def get_current_user_from_token(token: str, db: AsyncSession) -> Optional[dict]:
     """
     Decodifica el JWT y devuelve {id, email, rol} si es válido.
@@ -46,15 +45,40 @@ async def get_current_user_from_token(token: str, db: AsyncSession) -> Optional[
 
     return {"id": usuario.id, "email": email, "rol": rol}
 
+def normalizar_texto(s: str | None) -> str:
+    """Minúsculas, sin tildes y con espacios colapsados ('  Press  Banca ' -> 'press banca')."""
+    s = unicodedata.normalize("NFKD", s or "")
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return " ".join(s.lower().split())
+
 def _get_client(api_key: str | None = None) -> AsyncOpenAI:
-    key = (api_key or settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY") or "").strip()
-    if not key:
-        # Lanza 401 controlado en vez de RuntimeError que se traduce en 500 genérico
-        from fastapi import HTTPException
-        raise HTTPException(status_code=401, detail="OPENAI_API_KEY no está configurada")
-    return AsyncOpenAI(api_key=key)
-
-def construir_prompt(form_data, equipamiento, limitaciones, otros_datos):
+    # Cliente compartido del proceso (pool HTTP persistente); ver app/gateway_ia.py
+    return gateway_ia.cliente(api_key)
+
+def construir_prompt(form_data, equipamiento, limitaciones, otros_datos, microciclo: bool = False):
+    """
+    microciclo=True: se pide SOLO la semana 1 (microciclo base); las semanas 2..N las calcula
+    app.progresion.expandir_plan. Reduce los tokens de salida a ~1/N.
+    """
+    if microciclo:
+        requisito = """Diseña SOLO la SEMANA 1 (microciclo base) de la rutina; la progresión de las semanas
+siguientes (volumen, intensidad y descargas) se calculará aparte a partir de ella. Incluye:
+- Todos los días de entrenamiento de esa semana.
+- Tipo de entrenamiento diario.
+- Ejercicios concretos, series, repeticiones/duración (usa números o rangos como "8-10"; para ejercicios por tiempo "30s").
+- Motivo para cada ejercicio.
+- Consejos y advertencias.
+- Adapta si hay objetivo deportivo o limitaciones.
+- "plan" debe contener exactamente UNA semana."""
+    else:
+        requisito = """Diseña una rutina COMPLETA para la duración especificada. Incluye:
+- Plan estructurado por semanas y días.
+- Tipo de entrenamiento diario.
+- Ejercicios concretos, series, repeticiones/duración.
+- Motivo para cada ejercicio.
+- Consejos y advertencias.
+- Adapta si hay objetivo deportivo o limitaciones.
+- Variedad y progresión."""
     prompt = f"""
 Eres un entrenador personal experto y fisioterapeuta, especializado en crear rutinas de ejercicio personalizadas, variadas y basadas en evidencia científica para obtener los mejores resultados de cada usuario. Genera una rutina detallada y adaptada para el siguiente usuario:
 
@@ -74,14 +98,7 @@ Eres un entrenador personal experto y fisioterapeuta, especializado en crear rut
 - Duración total de la rutina: {form_data['semanas']} semanas
 
 **REQUISITO**
-Diseña una rutina COMPLETA para la duración especificada. Incluye:
-- Plan estructurado por semanas y días.
-- Tipo de entrenamiento diario.
-- Ejercicios concretos, series, repeticiones/duración.
-- Motivo para cada ejercicio.
-- Consejos y advertencias.
-- Adapta si hay objetivo deportivo o limitaciones.
-- Variedad y progresión.
+{requisito}
 
 **FORMATO DE RESPUESTA (JSON):**
 {{
@@ -112,12 +129,13 @@ Diseña una rutina COMPLETA para la duración especificada. Incluye:
 """
     return prompt
 
-def construir_prompt_alternativas(ejercicio, grupo_muscular=None):
+def construir_prompt_alternativas(ejercicio, grupo_muscular=None, criterio=None):
     prompt = f"""
 Eres un entrenador personal experto en biomecánica y fisioterapia.
 
 Sugiere **exactamente tres alternativas de ejercicio** para sustituir el ejercicio "{ejercicio}"{f" (grupo muscular principal: {grupo_muscular})" if grupo_muscular else ""}.
 Cada alternativa debe trabajar el mismo grupo muscular o cumplir la misma función principal, pero variar en ejecución, equipamiento o dificultad.
+{f"Prioriza este criterio al elegirlas: {criterio}." if criterio else ""}
 
 Por cada alternativa, incluye:
 - nombre
@@ -227,11 +245,11 @@ def _normalize_size(s: str | None) -> str:
 # app/utils.py
 # app/utils.py
 async def generar_imagen_ejercicio(nombre: str, motivo: str, size: str | None = None) -> str:
-    client = _get_client()
     prompt = f"Ejercicio: {nombre}. Motivo: {motivo}"
     size = _normalize_size(size)
     try:
-        resp = await client.images.generate(
+        resp = await gateway_ia.imagen(
+            etiqueta="generar_imagen_ejercicio",
             model="gpt-image-1",
             prompt=prompt,
             size=size,
@@ -260,9 +278,10 @@ async def generar_alternativas_ia(ejercicio: str, grupo_muscular: str = "", crit
     Devuelve una lista de alternativas para un ejercicio (strings).
     Acepta que el modelo devuelva lista de strings o de objetos con 'nombre'.
     """
-    client = _get_client(api_key)
-    prompt = construir_prompt_alternativas(ejercicio, grupo_muscular)
-    r = await client.chat.completions.create(
+    prompt = construir_prompt_alternativas(ejercicio, grupo_muscular, criterio)
+    r = await gateway_ia.chat(
+        etiqueta="generar_alternativas_ia",
+        api_key=api_key,
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3,
@@ -288,13 +307,15 @@ async def generar_alternativas_ia(ejercicio: str, grupo_muscular: str = "", crit
     alts = [line.strip("-• ").strip() for line in txt.splitlines() if line.strip()]
     return [a for a in alts if a and a.lower() != ejercicio.lower()][:5]
 
-async def generar_rutina_ia(form_data, equipamiento: str = "", limitaciones: str = "", otros_datos: str = "", api_key: Optional[str] = None):
+async def generar_rutina_ia(form_data, equipamiento: str = "", limitaciones: str = "", otros_datos: str = "", api_key: Optional[str] = None, microciclo: bool = False):
     """
     Genera rutina en formato dict (parseado).
+    Con microciclo=True solo trae la semana 1 (ver app.progresion.expandir_plan).
     """
-    client = _get_client(api_key)
-    prompt = construir_prompt(form_data, equipamiento, limitaciones, otros_datos)
-    r = await client.chat.completions.create(
+    prompt = construir_prompt(form_data, equipamiento, limitaciones, otros_datos, microciclo)
+    r = await gateway_ia.chat(
+        etiqueta="generar_rutina_ia",
+        api_key=api_key,
         model="gpt-4o",
         messages=[
             {"role": "system", "content": "Responde ÚNICAMENTE con JSON válido."},
@@ -313,13 +334,104 @@ async def generar_rutina_ia(form_data, equipamiento: str = "", limitaciones: str
         # estructura mínima para no romper el flujo
         return {"duracion": "", "plan": [], "error": "Formato inesperado"}
 
-async def generar_dieta_ia(formulario, api_key: Optional[str] = None):
+class ExtractorSemanas:
+    """
+    Parser incremental del JSON de una rutina: se le van pasando fragmentos de texto y devuelve
+    cada objeto de "plan": [...] en cuanto se cierra su llave, sin esperar al resto del documento.
+    Solo lleva la cuenta de llaves/corchetes y de si está dentro de una cadena.
+    """
+
+    def __init__(self):
+        self.texto = ""
+        self._pos = 0
+        self._pila: list[str] = []
+        self._en_cadena = False
+        self._escape = False
+        self._inicio_cadena = 0
+        self._ultima_cadena = ""
+        self._nivel_plan: int | None = None   # profundidad de la pila dentro del array "plan"
+        self._inicio_semana: int | None = None
+
+    def alimentar(self, fragmento: str) -> list[dict]:
+        self.texto += fragmento
+        semanas = []
+        t = self.texto
+        for i in range(self._pos, len(t)):
+            c = t[i]
+            if self._en_cadena:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._en_cadena = False
+                    self._ultima_cadena = t[self._inicio_cadena:i]
+                continue
+            if c == '"':
+                self._en_cadena = True
+                self._inicio_cadena = i + 1
+            elif c in "{[":
+                if c == "[" and self._nivel_plan is None and self._pila == ["{"] and self._ultima_cadena == "plan":
+                    self._nivel_plan = len(self._pila) + 1
+                elif c == "{" and self._nivel_plan is not None and len(self._pila) == self._nivel_plan:
+                    self._inicio_semana = i
+                self._pila.append(c)
+            elif c in "}]":
+                if self._pila:
+                    self._pila.pop()
+                if self._nivel_plan is not None:
+                    if c == "}" and self._inicio_semana is not None and len(self._pila) == self._nivel_plan:
+                        try:
+                            semanas.append(json.loads(t[self._inicio_semana:i + 1]))
+                        except Exception:
+                            logger.warning("[RUTINA-STREAM] semana con JSON inválido, se omite")
+                        self._inicio_semana = None
+                    elif c == "]" and len(self._pila) < self._nivel_plan:
+                        self._nivel_plan = -1  # el array "plan" ya se cerró
+        self._pos = len(t)
+        return semanas
+
+
+async def generar_rutina_ia_stream(form_data, equipamiento: str = "", limitaciones: str = "", otros_datos: str = "", api_key: Optional[str] = None, microciclo: bool = False):
+    """
+    Versión en streaming de generar_rutina_ia. Es un generador asíncrono que produce:
+      ("semana", {...})  cada vez que se completa un elemento de plan[]
+      ("rutina", {...})  al final, con el documento completo (o la estructura mínima de error)
+    """
+    prompt = construir_prompt(form_data, equipamiento, limitaciones, otros_datos, microciclo)
+    extractor = ExtractorSemanas()
+    semanas = []
+    async for fragmento in gateway_ia.chat_stream(
+        etiqueta="generar_rutina_ia_stream",
+        api_key=api_key,
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": "Responde ÚNICAMENTE con JSON válido."},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.6,
+    ):
+        for semana in extractor.alimentar(fragmento):
+            semanas.append(semana)
+            yield "semana", semana
+
+    txt = extractor.texto.strip()
+    try:
+        start = txt.index("{")
+        end = txt.rindex("}") + 1
+        yield "rutina", json.loads(txt[start:end])
+    except Exception:
+        # Si el cierre del documento llegó roto, al menos conservamos las semanas completas
+        yield "rutina", {"duracion": "", "plan": semanas, **({} if semanas else {"error": "Formato inesperado"})}
+
+async def generar_dieta_ia(formulario, api_key: Optional[str] = None, otros_datos: str = ""):
     """
     Genera dieta en formato dict (parseado).
     """
-    client = _get_client(api_key)
-    prompt = construir_prompt_dieta(formulario)
-    r = await client.chat.completions.create(
+    prompt = construir_prompt_dieta(formulario, otros_datos)
+    r = await gateway_ia.chat(
+        etiqueta="generar_dieta_ia",
+        api_key=api_key,
         model="gpt-4o",
         messages=[
             {"role": "system", "content": "Responde ÚNICAMENTE con JSON válido."},
@@ -336,19 +448,43 @@ async def generar_dieta_ia(formulario, api_key: Optional[str] = None):
     except Exception:
         return {"duracion": "", "plan": [], "error": "Formato inesperado"}
 
+async def generar_plan_mixto_ia(form_data, otros_datos: str = "", api_key: Optional[str] = None):
+    """
+    Genera plan combinado (entreno + dieta) en formato dict (parseado).
+    """
+    prompt = construir_prompt_mixto(form_data, otros_datos)
+    r = await gateway_ia.chat(
+        etiqueta="generar_plan_mixto_ia",
+        api_key=api_key,
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": "Responde ÚNICAMENTE con JSON válido."},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.5,
+    )
+    txt = (r.choices[0].message.content or "").strip()
+    try:
+        start = txt.index("{")
+        end = txt.rindex("}") + 1
+        return json.loads(txt[start:end])
+    except Exception:
+        return {"error": "Formato inesperado"}
+
 async def ajustar_rutina_ia(progreso_dia, api_key: Optional[str] = None):
     """
     Dado el progreso (sets/pesos/tiempos), devuelve lista de sugerencias por ejercicio:
       [ {"nombre": "...", "peso_sugerido": ..., "repeticiones_sugeridas": ...}, ... ]
     """
-    client = _get_client(api_key)
     prompt = (
         "Eres entrenador personal. Con el siguiente progreso del usuario, sugiere el peso y "
         "repeticiones recomendadas por ejercicio para la próxima sesión. Devuelve SOLO un JSON válido "
         "con una lista de objetos con las claves 'nombre', 'peso_sugerido', 'repeticiones_sugeridas'.\n\n"
         f"{json.dumps(progreso_dia, ensure_ascii=False, indent=2)}"
     )
-    r = await client.chat.completions.create(
+    r = await gateway_ia.chat(
+        etiqueta="ajustar_rutina_ia",
+        api_key=api_key,
         model="gpt-4o",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.4,
@@ -367,8 +503,6 @@ async def analizar_nutricion_imagen(imagen_url: str, descripcion: str = "") -> d
     Analiza una imagen de comida usando IA para estimar nutrición
     Devuelve: {calorias, proteinas_g, carbohidratos_g, grasas_g, fibra_g, azucar_g}
     """
-    client = _get_client()
-
     prompt = f"""
     Eres un nutricionista experto. Analiza esta imagen de comida y estima su valor nutricional.
     {"Descripción proporcionada: " + descripcion if descripcion else ""}
@@ -389,7 +523,8 @@ async def analizar_nutricion_imagen(imagen_url: str, descripcion: str = "") -> d
         # Como nuestras imágenes están en local, las servimos via /static/uploads/
         image_url = f"http://localhost:8000{imagen_url}"  # Ajusta según tu dominio
 
-        response = await client.chat.completions.create(
+        response = await gateway_ia.chat(
+            etiqueta="analizar_nutricion_imagen",
             model="gpt-4o",  # o gpt-4-vision-preview
             messages=[
                 {
@@ -426,7 +561,7 @@ async def analizar_nutricion_imagen(imagen_url: str, descripcion: str = "") -> d
     Analiza una imagen de comida usando IA para estimar nutrición
     """
     try:
-        client = _get_client()
+        _get_client()
     except HTTPException:
         # Si no hay API key configurada
         logger.warning("OPENAI_API_KEY no configurada para análisis nutricional")
@@ -463,7 +598,8 @@ async def analizar_nutricion_imagen(imagen_url: str, descripcion: str = "") -> d
         # En producción necesitarías la URL absoluta
         image_url = f"http://localhost:8000{imagen_url}"
 
-        response = await client.chat.completions.create(
+        response = await gateway_ia.chat(
+            etiqueta="analizar_nutricion_imagen",
             model="gpt-4o",
             messages=[
                 {